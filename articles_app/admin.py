@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 from articles_app.models import Article
+from articles_app.pagination import EstimatedCountPaginator
+from articles_app.search import get_search_engine
 
 
 User = get_user_model()
@@ -27,6 +29,12 @@ class UserAdmin(BaseUserAdmin):
         ),
         (_("Important dates"), {"fields": ("last_login", "date_joined")}),
     )
+    # Prefix lookups served by the upper() pattern indexes on PostgreSQL.
+    search_fields = ('^email', '^username')
+    ordering = ('email',)
+    autocomplete_fields = ('subscribers',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Article)
@@ -35,3 +43,14 @@ class ArticleAdmin(admin.ModelAdmin):
         'id', 'author', 'title', 'public',
         'created_at', 'updated_at'
     )
+    list_select_related = ('author',)
+    search_fields = ('title', 'text')
+    autocomplete_fields = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+
+        return get_search_engine().search(queryset, search_term), False
@@ -0,0 +1,239 @@
+"""
+Read-through cache for hot reads with request coalescing.
+
+Concurrent misses for a key inside a process wait for one computation
+(SingleFlight). With ARTICLES_CACHE_SHARED_LOCK set, misses in other
+processes wait on a lock in the shared cache as well. Entries outlive
+their freshness by ARTICLES_CACHE_STALE_TTL: a stale entry is refreshed
+by the one request that claims its lock while all others keep serving it.
+
+Invalidation replaces the generation stored next to each key, entries
+carry the generation read before their value was computed and readers
+ignore entries of another generation. A computation that raced an
+invalidation therefore cannot bring an old value back. Invalidation only
+reaches other worker processes through a shared cache backend, with the
+per-process LocMemCache values that can change are not cached unless
+ARTICLES_CACHE_ALLOW_LOCAL is set for a single process deployment.
+"""
+
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from articles_app.models import Article
+from articles_app.serializers import ArticleSerializer
+from articles_app import metrics, sharding
+
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs one computation per key at a time, callers arriving meanwhile
+    wait for it and share its result or exception.
+    """
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, func):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+        return call.result
+
+
+flights = SingleFlight()
+
+
+def acquire(key):
+    return cache.add(f'{key}:lock', 1, settings.ARTICLES_CACHE_LOCK_TIMEOUT)
+
+
+def release(key):
+    cache.delete(f'{key}:lock')
+
+
+def is_shared():
+    return settings.ARTICLES_CACHE_ALLOW_LOCAL or not isinstance(caches['default'], LocMemCache)
+
+
+def generation_key(key):
+    return f'{key}:generation'
+
+
+def make_entry(value, generation):
+    return value, time.time() + settings.ARTICLES_CACHE_TTL, generation
+
+
+def entry_timeout():
+    return settings.ARTICLES_CACHE_TTL + settings.ARTICLES_CACHE_STALE_TTL
+
+
+def store(key, value, generation=None):
+    if value is not None:
+        cache.set(key, make_entry(value, generation), entry_timeout())
+    return value
+
+
+def get_entry(key):
+    """
+    The entry of key and the current generation, None for an entry of
+    another generation.
+    """
+    values = cache.get_many([key, generation_key(key)])
+    entry, generation = values.get(key), values.get(generation_key(key))
+    if entry is not None and entry[2] != generation:
+        entry = None
+    return entry, generation
+
+
+def fill(key, compute, generation):
+    if not settings.ARTICLES_CACHE_SHARED_LOCK:
+        return store(key, compute(), generation)
+
+    deadline = time.monotonic() + settings.ARTICLES_CACHE_LOCK_TIMEOUT
+    while not acquire(key):
+        # Another process is computing, wait for its entry.
+        time.sleep(0.01)
+        entry, _ = get_entry(key)
+        if entry is not None:
+            return entry[0]
+        if time.monotonic() >= deadline:
+            # The holder died or is too slow, its lock expires on its own.
+            return store(key, compute(), generation)
+
+    try:
+        return store(key, compute(), generation)
+    finally:
+        release(key)
+
+
+def get_or_compute(name, key, compute, immutable=False):
+    """
+    Return the cached value of key, computing it on a miss. None results
+    are not cached. name labels the cache in metrics. Immutable values,
+    keyed by their content, are never invalidated and skip generations.
+    """
+    if not immutable and not is_shared():
+        return flights.do(key, compute)
+
+    if immutable:
+        entry, generation = cache.get(key), None
+    else:
+        entry, generation = get_entry(key)
+    if entry is None:
+        metrics.record_cache(name, hit=False)
+        return flights.do(key, lambda: fill(key, compute, generation))
+
+    metrics.record_cache(name, hit=True)
+    value, fresh_until, _ = entry
+    if fresh_until > time.time() or not acquire(key):
+        return value
+
+    try:
+        return store(key, compute(), generation)
+    finally:
+        release(key)
+
+
+def refresh(key, compute):
+    """
+    Compute and cache the value of key, unless key is invalidated meanwhile.
+    """
+    generation = cache.get(generation_key(key))
+    return store(key, compute(), generation)
+
+
+def article_key(article_id):
+    return f'articles:article:{article_id}'
+
+
+def subscriptions_key(user_id):
+    return f'articles:subscriptions:{user_id}'
+
+
+def get_article_data(article_id):
+    """
+    Serialized article, visibility is checked by the caller.
+    """
+    def compute():
+        article = sharding.get_first(Article.objects.filter(pk=article_id))
+        return None if article is None else dict(ArticleSerializer(article).data)
+
+    return get_or_compute('article', article_key(article_id), compute)
+
+
+def warm_articles(article_ids):
+    """
+    Cache the given articles read in bulk, returns their number.
+    Generations are read before the articles, as on a miss.
+    """
+    if not article_ids:
+        return 0
+
+    generations = cache.get_many([generation_key(article_key(pk)) for pk in article_ids])
+    articles = [
+        article for rows in sharding.scatter(Article.objects.filter(pk__in=article_ids)) for article in rows
+    ]
+    entries = {
+        article_key(article.pk): make_entry(
+            dict(ArticleSerializer(article).data), generations.get(generation_key(article_key(article.pk)))
+        )
+        for article in articles
+    }
+    cache.set_many(entries, entry_timeout())
+    return len(entries)
+
+
+def get_subscription_ids(user):
+    return get_or_compute(
+        'subscriptions', subscriptions_key(user.pk),
+        lambda: sharding.get_subscription_ids(user.pk)
+    )
+
+
+def invalidate(keys):
+    def bump():
+        # Outlives every entry computed under an older generation.
+        cache.set_many({generation_key(key): uuid.uuid4().hex for key in keys}, 2 * entry_timeout())
+        cache.delete_many(keys)
+
+    bump()
+    # Again on commit, a read racing the transaction may have cached old rows.
+    transaction.on_commit(bump)
+
+
+def invalidate_articles(article_ids):
+    invalidate([article_key(pk) for pk in article_ids])
+
+
+def invalidate_subscriptions(user_ids):
+    invalidate([subscriptions_key(pk) for pk in user_ids])
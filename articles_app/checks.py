@@ -0,0 +1,17 @@
+from django.core.checks import Tags, Warning, register
+from articles_app import caching
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if caching.is_shared():
+        return []
+
+    return [
+        Warning(
+            'The default cache is local to each process, articles and subscriptions are not cached.',
+            hint='Set CACHE_BACKEND to a shared backend such as django.core.cache.backends.redis.RedisCache, '
+                 'or ARTICLES_CACHE_ALLOW_LOCAL=1 when running a single worker process.',
+            id='articles_app.W001',
+        )
+    ]
@@ -0,0 +1,156 @@
+"""
+Response body compression negotiated by Accept-Encoding.
+
+gzip is always available, brotli and zstd when the brotli or zstandard
+package is installed. Among the encodings a client accepts, the first of
+ARTICLES_COMPRESSION_ENCODINGS wins. Streams are compressed chunk by
+chunk and flushed after every chunk, so clients get data as it is
+produced.
+"""
+
+import hashlib
+import zlib
+from functools import lru_cache
+from importlib.util import find_spec
+from django.conf import settings
+from articles_app.caching import get_or_compute
+
+
+class GzipCodec:
+    LEVEL = 6
+
+    def compress(self, data):
+        # wbits 31 writes the gzip header and trailer.
+        compressor = zlib.compressobj(self.LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self, chunks):
+        compressor = zlib.compressobj(self.LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class BrotliCodec:
+    # Quality 11 is meant for static files, far too slow per request.
+    QUALITY = 5
+
+    def compress(self, data):
+        import brotli
+
+        return brotli.compress(data, quality=self.QUALITY)
+
+    def stream(self, chunks):
+        import brotli
+
+        compressor = brotli.Compressor(quality=self.QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class ZstdCodec:
+    LEVEL = 3
+
+    def compress(self, data):
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=self.LEVEL).compress(data)
+
+    def stream(self, chunks):
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor(level=self.LEVEL).compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+CODECS = {
+    'gzip': (GzipCodec(), 'zlib'),
+    'br': (BrotliCodec(), 'brotli'),
+    'zstd': (ZstdCodec(), 'zstandard'),
+}
+
+
+@lru_cache(maxsize=None)
+def is_available(encoding):
+    return encoding in CODECS and find_spec(CODECS[encoding][1]) is not None
+
+
+def get_codec(encoding):
+    return CODECS[encoding][0]
+
+
+def parse_accept_encoding(header):
+    """
+    Map of accepted encodings to their quality, "*" stands for all others.
+    """
+    accepted = {}
+    for item in header.split(','):
+        encoding, _, params = item.partition(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding] = quality
+    return accepted
+
+
+def negotiate(header):
+    """
+    The preferred available encoding the client accepts, None for identity.
+    """
+    accepted = parse_accept_encoding(header)
+    for encoding in settings.ARTICLES_COMPRESSION_ENCODINGS:
+        if is_available(encoding) and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    return get_codec(encoding).compress(data)
+
+
+def compress_stream(chunks, encoding):
+    return get_codec(encoding).stream(chunks)
+
+
+def encode_etag(etag, encoding):
+    """
+    Strong ETag of the body of etag compressed with encoding, weak tags
+    already cover every encoding of the body.
+    """
+    if not etag.startswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def get_encoded_etags(etag):
+    return {etag} | {encode_etag(etag, encoding) for encoding in settings.ARTICLES_COMPRESSION_ENCODINGS}
+
+
+def compress_cached(data, encoding):
+    """
+    compress() for bodies served repeatedly, keyed by their content, so
+    each distinct body is compressed once per encoding.
+    """
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return get_or_compute(
+        'compressed', f'articles:compressed:{encoding}:{digest}',
+        lambda: compress(data, encoding), immutable=True
+    )
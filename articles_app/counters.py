@@ -0,0 +1,111 @@
+import atexit
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import Case, F, Min, PositiveBigIntegerField, Value, When
+from articles_app.models import Article, PopularArticle
+from articles_app.sharding import get_shards
+
+
+class ViewCounter:
+    """
+    Aggregates article views in memory and hands them to a background job
+    at most once per flush interval, so reads never write article rows.
+    A timer flushes views of a worker that stops receiving requests, no
+    view waits longer than one interval, which bounds the views lost when
+    the process is killed.
+    """
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.timer = None
+
+    def increment(self, article_id):
+        interval = settings.ARTICLES_VIEWS_FLUSH_INTERVAL
+        with self.lock:
+            self.counts[article_id] += 1
+            due = time.monotonic() - self.last_flush >= interval
+            if not due and self.timer is None:
+                self.timer = threading.Timer(interval, self.flush_in_background)
+                self.timer.daemon = True
+                self.timer.start()
+
+        if due:
+            self.flush()
+
+    def drain(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.last_flush = time.monotonic()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        return counts
+
+    def flush(self):
+        from articles_app.jobs import enqueue
+
+        counts = self.drain()
+        if counts:
+            # JSON object keys are strings.
+            enqueue('flush_views', counts={str(pk): n for pk, n in counts.items()})
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread owns its connection.
+            connection.close()
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
+
+
+def add_views(counts):
+    """
+    Apply aggregated view counts with a single UPDATE per shard and refresh
+    the rankings. All shards commit together at the end, a failure on one
+    leaves every shard unchanged for the retry.
+    """
+    with ExitStack() as stack:
+        for alias in get_shards():
+            stack.enter_context(transaction.atomic(using=alias))
+            Article.objects.using(alias).filter(pk__in=counts).update(
+                views=F('views') + Case(
+                    *[When(pk=pk, then=Value(n)) for pk, n in counts.items()],
+                    default=Value(0), output_field=PositiveBigIntegerField()
+                )
+            )
+            refresh_popular(counts.keys(), alias)
+
+
+def refresh_popular(article_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Merge changed articles into the ranking table of the using database,
+    only those that can enter the top are considered, and rows pushed out
+    of the top are removed. Each shard ranks its own articles.
+    """
+    size = settings.ARTICLES_POPULAR_SIZE
+    popular = PopularArticle.objects.using(using)
+    threshold = 0
+    if popular.count() >= size:
+        threshold = popular.order_by('-views')[:size].aggregate(Min('views'))['views__min']
+
+    candidates = [
+        PopularArticle(article_id=pk, views=views) for pk, views in
+        Article.objects.using(using).filter(pk__in=article_ids, views__gte=threshold).values_list('pk', 'views')
+    ]
+    if not candidates:
+        return
+
+    popular.bulk_create(
+        candidates, update_conflicts=True,
+        unique_fields=['article'], update_fields=['views']
+    )
+    outside = popular.order_by('-views', '-article_id').values_list('pk', flat=True)[size:]
+    popular.filter(pk__in=list(outside)).delete()
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from articles_app.models import Article, CustomUser, PopularArticle
+from articles_app.caching import invalidate_articles
+from articles_app.sharding import get_shards, shard_for_author
+from articles_app import recommendations, stats
+
+STATUS_SALT = 'articles_app.deletion.status'
+
+
+def raw_delete(queryset):
+    """
+    DELETE without the collector, callers remove dependent rows first.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_in_batches(queryset, delete):
+    """
+    Call delete with the ids and database of queryset's rows, a batch at a time.
+    """
+    batch_size = settings.ARTICLES_DELETION_BATCH_SIZE
+    total = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+
+        # A transaction per batch keeps locks short.
+        with transaction.atomic(using=queryset.db):
+            total += delete(ids, queryset.db)
+
+
+def delete_articles(ids, using=DEFAULT_DB_ALIAS):
+    raw_delete(PopularArticle.objects.using(using).filter(article_id__in=ids))
+    deleted = raw_delete(Article.objects.using(using).filter(pk__in=ids))
+    invalidate_articles(ids)
+    return deleted
+
+
+def get_status_token(user_id):
+    """
+    Token of the deletion status URL, the deactivated user cannot log in
+    to read it.
+    """
+    return signing.dumps(user_id, salt=STATUS_SALT)
+
+
+def is_status_token_valid(token, user_id):
+    try:
+        return token is not None and str(signing.loads(token, salt=STATUS_SALT)) == str(user_id)
+    except signing.BadSignature:
+        return False
+
+
+def delete_user(user_id):
+    """
+    Remove a user's articles and subscriptions in small batches, then the
+    user itself, whose remaining relations are few. Articles and subscribers
+    are on the user's shard, subscriptions on the shards of their authors.
+    """
+    Subscription = CustomUser.subscribers.through
+
+    def delete_subscriptions(ids, using):
+        subscriptions = Subscription.objects.using(using).filter(pk__in=ids)
+        author_ids = set(
+            subscriptions.filter(to_customuser_id=user_id).values_list('from_customuser_id', flat=True)
+        )
+        deleted = raw_delete(subscriptions)
+        # Raw deletes send no m2m_changed.
+        recommendations.record_subscriptions(user_id, author_ids, -1, using)
+        for author_id in author_ids:
+            stats.record(author_id, subscribers_lost=1)
+        return deleted
+
+    delete_in_batches(Article.objects.using(shard_for_author(user_id)).filter(author_id=user_id), delete_articles)
+    for alias in get_shards():
+        delete_in_batches(
+            Subscription.objects.using(alias).filter(Q(from_customuser_id=user_id) | Q(to_customuser_id=user_id)),
+            delete_subscriptions
+        )
+    # The replicas left on the shards have no rows to cascade to.
+    CustomUser.objects.filter(pk=user_id).delete()
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class SubscriptionOverflow(Exception):
+    pass
+
+
+class Subscription:
+    """
+    Bounded queue of events for one stream consumer. Lives on the event loop
+    of the connection, a consumer that falls behind is closed rather than
+    buffering without limit, clients resume with Last-Event-ID.
+    """
+    def __init__(self, author_ids, max_queue_size, loop):
+        self.author_ids = frozenset(author_ids)
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.loop = loop
+        self.overflowed = False
+
+    def wants(self, event):
+        return event['author'] in self.author_ids
+
+    def put(self, event):
+        if self.overflowed:
+            return
+
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # Wake up the consumer so it can notice the overflow.
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        event = await self.queue.get()
+        if event is None and self.overflowed:
+            raise SubscriptionOverflow
+        return event
+
+
+class InProcessBroker:
+    """
+    Publishes events to stream subscribers of the current process.
+    Publishing is thread safe, so it can be called from sync signal handlers.
+    """
+    def __init__(self):
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self, author_ids):
+        subscription = Subscription(
+            author_ids, settings.ARTICLES_STREAM_QUEUE_SIZE,
+            asyncio.get_running_loop()
+        )
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event):
+        with self.lock:
+            subscriptions = [s for s in self.subscriptions if s.wants(event)]
+
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.ARTICLES_EVENT_BROKER)()
+    return _broker
+
+
+def article_event(article):
+    from articles_app.serializers import ArticleSerializer
+
+    return ArticleSerializer(article).data
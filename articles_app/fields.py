@@ -0,0 +1,71 @@
+"""
+Text stored zlib compressed in a companion binary column.
+
+With ARTICLES_COMPRESS_TEXT set, values of at least
+ARTICLES_COMPRESS_MIN_LENGTH bytes are written compressed to the
+companion column and the text column is left empty. Reads decompress on
+first access of the attribute only, rows that are listed without their
+text never pay for it. Existing rows are converted by
+`python manage.py repack_article_texts`.
+"""
+
+import zlib
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+
+def pack(text):
+    """
+    Return the values of the text and compressed columns for text.
+    """
+    data = text.encode()
+    if settings.ARTICLES_COMPRESS_TEXT and len(data) >= settings.ARTICLES_COMPRESS_MIN_LENGTH:
+        compressed = zlib.compress(data, settings.ARTICLES_COMPRESS_LEVEL)
+        if len(compressed) < len(data):
+            return '', compressed
+    return text, None
+
+
+def unpack(compressed):
+    return zlib.decompress(compressed).decode()
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        value = super().__get__(instance, cls)
+        if value == '':
+            compressed = getattr(instance, self.field.compressed_field)
+            if compressed is not None:
+                value = instance.__dict__[self.field.attname] = unpack(compressed)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField that keeps long values in the binary compressed_field of the
+    same model, which must be declared alongside and not editable.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def __init__(self, *args, compressed_field, **kwargs):
+        self.compressed_field = compressed_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['compressed_field'] = self.compressed_field
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        # Fields are saved in declaration order, the compressed field
+        # after this one picks up the value set here.
+        text, compressed = pack(getattr(model_instance, self.attname))
+        model_instance.__dict__[self.compressed_field] = compressed
+        return text
@@ -0,0 +1,206 @@
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from articles_app.models import Job
+
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class JobHandler:
+    def __init__(self, func, name, batch, max_attempts, atomic):
+        self.func = func
+        self.name = name
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.atomic = atomic
+
+    def run(self, payloads):
+        if self.batch:
+            self.func(payloads)
+        else:
+            for payload in payloads:
+                self.func(**payload)
+
+
+def job(name, batch=False, max_attempts=None, atomic=True):
+    """
+    Register a job handler. Batch handlers receive the payloads of all
+    claimed jobs with the same name at once, others are called per job.
+    Atomic handlers run in one transaction with marking their jobs done,
+    so a retry never applies a failed attempt twice. Handlers that commit
+    in steps of their own must be safe to run again.
+    """
+    def decorator(func):
+        registry[name] = JobHandler(
+            func, name, batch,
+            max_attempts or settings.ARTICLES_JOBS_MAX_ATTEMPTS, atomic
+        )
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    if name not in registry:
+        raise ValueError(f'Unknown job {name}.')
+
+    if settings.ARTICLES_JOBS_EAGER:
+        registry[name].run([payload])
+        return None
+
+    return Job.objects.create(name=name, payload=payload)
+
+
+def enqueue_on_commit(name, **payload):
+    transaction.on_commit(lambda: enqueue(name, **payload))
+
+
+def claim(batch_size):
+    """
+    Claim due jobs, concurrent workers skip rows already locked by others.
+    Jobs left running by a crashed worker are claimed again once their
+    lease, renewed while they run, is older than the timeout.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.ARTICLES_JOBS_TIMEOUT)
+
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=Job.PENDING, run_at__lte=now) | Q(status=Job.RUNNING, updated_at__lt=stale))
+            .order_by('run_at')[:batch_size]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[j.pk for j in jobs]).update(
+                status=Job.RUNNING, attempts=F('attempts') + 1, updated_at=now
+            )
+
+    for j in jobs:
+        j.attempts += 1
+    return jobs
+
+
+def retry_or_fail(jobs, handler, error):
+    now = timezone.now()
+    for j in jobs:
+        if handler is not None and j.attempts < handler.max_attempts:
+            j.status = Job.PENDING
+            j.run_at = now + timedelta(seconds=settings.ARTICLES_JOBS_RETRY_DELAY * 2 ** (j.attempts - 1))
+        else:
+            j.status = Job.FAILED
+        j.last_error = error
+        j.updated_at = now
+
+    Job.objects.bulk_update(jobs, ['status', 'run_at', 'last_error', 'updated_at'])
+
+
+class Lease:
+    """
+    Renews updated_at of running jobs every ARTICLES_JOBS_HEARTBEAT seconds
+    from a thread of its own, so that long jobs are not claimed again.
+    """
+    def __init__(self, jobs):
+        self.ids = [j.pk for j in jobs]
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.renew, name='job-lease', daemon=True)
+
+    def renew(self):
+        try:
+            while not self.stopped.wait(settings.ARTICLES_JOBS_HEARTBEAT):
+                try:
+                    Job.objects.filter(pk__in=self.ids, status=Job.RUNNING).update(updated_at=timezone.now())
+                except DatabaseError:
+                    logger.exception('Renewing the lease of jobs %s failed.', self.ids)
+        finally:
+            # The thread owns its connection.
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+def complete(group):
+    """
+    Mark jobs done unless another worker claimed them in the meantime.
+    """
+    claimed = Q()
+    for j in group:
+        claimed |= Q(pk=j.pk, attempts=j.attempts)
+    done = Job.objects.filter(claimed, status=Job.RUNNING).update(
+        status=Job.DONE, last_error='', updated_at=timezone.now()
+    )
+    if done != len(group):
+        raise LeaseLost(f'{len(group) - done} jobs were claimed by another worker.')
+
+
+def run_group(handler, group):
+    with Lease(group):
+        if not handler.atomic:
+            handler.run([j.payload for j in group])
+            complete(group)
+            return
+
+        with transaction.atomic():
+            handler.run([j.payload for j in group])
+            complete(group)
+
+
+def run_jobs(jobs):
+    groups = {}
+    for j in jobs:
+        groups.setdefault(j.name, []).append(j)
+
+    for name, group in groups.items():
+        handler = registry.get(name)
+        if handler is None:
+            retry_or_fail(group, None, f'Unknown job {name}.')
+            continue
+
+        try:
+            run_group(handler, group)
+        except LeaseLost:
+            # The other worker owns the jobs now, their state is its to set.
+            logger.warning('Jobs %s lost their lease.', name, exc_info=True)
+        except Exception as exc:
+            logger.exception('Job %s failed.', name)
+            retry_or_fail(group, handler, repr(exc))
+
+
+def purge(retention, batch_size=1000):
+    """
+    Delete jobs done more than retention ago in batches, return their number.
+    """
+    cutoff = timezone.now() - retention
+    total = 0
+    while True:
+        ids = list(
+            Job.objects.filter(status=Job.DONE, updated_at__lt=cutoff).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        total += Job.objects.filter(pk__in=ids).delete()[0]
+
+
+def work(batch_size):
+    """
+    Claim and run one batch, return the number of claimed jobs.
+    """
+    jobs = claim(batch_size)
+    if jobs:
+        run_jobs(jobs)
+    return len(jobs)
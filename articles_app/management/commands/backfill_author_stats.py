@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from articles_app.models import CustomUser
+from articles_app import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily author statistics from articles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Authors per batch.')
+        parser.add_argument(
+            '--subscribers', action='store_true',
+            help='Record current subscribers as gained today, to set a baseline.'
+        )
+
+    def handle(self, *args, **options):
+        authors = CustomUser.objects.filter(role=CustomUser.AUTHOR).order_by('pk')
+        last_id = 0
+        total = 0
+
+        while True:
+            ids = list(authors.filter(pk__gt=last_id).values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+
+            stats.backfill(ids, subscribers=options['subscribers'])
+            last_id = ids[-1]
+            total += len(ids)
+
+        self.stdout.write(f'Backfilled statistics of {total} authors.')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from articles_app import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly article partitions and detach old ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Partition the article table first.')
+        parser.add_argument('--ahead', type=int, default=3, help='Months of partitions to create ahead.')
+        parser.add_argument('--retain', type=int, help='Detach partitions older than this many months.')
+        parser.add_argument('--archive-schema', help='Move detached partitions into this schema.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Article partitioning requires PostgreSQL.')
+
+        if options['convert'] and partitions.convert(options['ahead']):
+            self.stdout.write('Article table partitioned.')
+
+        with connection.cursor() as cursor:
+            if not partitions.is_partitioned(cursor):
+                raise CommandError('Article table is not partitioned, run with --convert.')
+
+        for name in partitions.create_future_partitions(options['ahead']):
+            self.stdout.write(f'Created {name}.')
+
+        if options['retain'] is not None:
+            for name in partitions.detach_old_partitions(options['retain'], options['archive_schema']):
+                self.stdout.write(f'Detached {name}.')
@@ -0,0 +1,37 @@
+import io
+from django.core.management.base import BaseCommand, CommandError
+from articles_app.profiling import get_profile_store
+
+
+class Command(BaseCommand):
+    help = 'List stored request profiles or show one of them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?')
+        parser.add_argument('--sort', default='cumulative', help='pstats sort key.')
+        parser.add_argument('--limit', type=int, default=30)
+
+    def handle(self, *args, **options):
+        store = get_profile_store()
+
+        if options['profile_id'] is None:
+            for profile_id in store.list():
+                meta, _ = store.load(profile_id)
+                self.stdout.write(
+                    f"{profile_id}  {meta['method']} {meta['path']}  {meta['status']}  "
+                    f"{meta['time'] * 1000:.1f} ms  {len(meta['queries'])} queries"
+                )
+            return
+
+        if options['profile_id'] not in store.list():
+            raise CommandError(f"Profile {options['profile_id']} not found.")
+
+        meta, stats = store.load(options['profile_id'])
+        self.stdout.write(f"{meta['method']} {meta['path']}  {meta['status']}  {meta['time'] * 1000:.1f} ms")
+        self.stdout.write(f"\n{len(meta['queries'])} queries, slowest first:")
+        for query in sorted(meta['queries'], key=lambda q: q['time'], reverse=True)[:options['limit']]:
+            self.stdout.write(f"{query['time'] * 1000:8.2f} ms  {query['sql']}")
+
+        stats.stream = io.StringIO()
+        stats.sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(stats.stream.getvalue())
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from articles_app.models import Article
+from articles_app.search import get_search_engine
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the article search index in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        engine = get_search_engine()
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+
+        while True:
+            ids = list(
+                Article.objects.filter(pk__gt=last_id)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            engine.index(ids)
+            last_id = ids[-1]
+            total += len(ids)
+
+        self.stdout.write(f'Indexed {total} articles.')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from articles_app.fields import pack
+from articles_app.models import Article
+from articles_app.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = 'Compress or decompress stored article texts according to ARTICLES_COMPRESS_* settings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+
+        for alias in get_shards():
+            articles = Article.objects.using(alias).order_by('pk').only('text', 'text_compressed')
+            last_id = 0
+
+            while True:
+                batch = list(articles.filter(pk__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+
+                with transaction.atomic(using=alias):
+                    for article in batch:
+                        was_compressed = article.text_compressed is not None
+                        text, compressed = pack(article.text)
+                        if was_compressed != (compressed is not None):
+                            # Raw update, save() would bump updated_at.
+                            Article.objects.using(alias).filter(pk=article.pk) \
+                                .update(text=text, text_compressed=compressed)
+                            total += 1
+                last_id = batch[-1].pk
+
+        self.stdout.write(f'Repacked {total} articles.')
@@ -0,0 +1,63 @@
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from articles_app import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+        parser.add_argument(
+            '--purge-interval', type=float, default=3600,
+            help='Seconds between purges of jobs done more than ARTICLES_JOBS_RETENTION_DAYS ago.'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        workers = [
+            threading.Thread(target=self.work, args=(options,), daemon=True)
+            for _ in range(options['concurrency'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        next_purge = time.monotonic()
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    if time.monotonic() >= next_purge:
+                        self.purge()
+                        next_purge = time.monotonic() + options['purge_interval']
+                    worker.join(0.5)
+        except KeyboardInterrupt:
+            self.stopping.set()
+            for worker in workers:
+                worker.join()
+
+    def purge(self):
+        close_old_connections()
+        purged = jobs.purge(timedelta(days=settings.ARTICLES_JOBS_RETENTION_DAYS))
+        if purged:
+            self.stdout.write(f'Purged {purged} done jobs.')
+
+    def work(self, options):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                claimed = jobs.work(options['batch_size'])
+                if claimed:
+                    self.stdout.write(f'Processed {claimed} jobs.')
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['sleep'])
+        finally:
+            connection.close()
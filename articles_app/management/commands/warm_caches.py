@@ -0,0 +1,42 @@
+import time
+from functools import partial
+from django.core.management.base import BaseCommand, CommandError
+from articles_app import caching, warming
+
+
+class Command(BaseCommand):
+    help = 'Warm article and subscription caches for hot authors, recent articles and active feeds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=100, help='Most subscribed authors to warm.')
+        parser.add_argument('--articles', type=int, default=500, help='Recent public articles to warm.')
+        parser.add_argument('--users', type=int, default=200, help='Recently active users whose feeds to warm.')
+        parser.add_argument('--active-days', type=int, default=7, help='Logins within this many days are active.')
+        parser.add_argument('--per-feed', type=int, default=20, help='Latest articles warmed per author or feed.')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--max-qps', type=float, default=50, help='Database queries per second.')
+
+    def handle(self, *args, **options):
+        if not caching.is_shared():
+            raise CommandError('The default cache is local to each process, there is nothing to warm.')
+
+        start = time.perf_counter()
+        per_feed = options['per_feed']
+
+        tasks = [partial(warming.warm_recent_articles, options['articles'])]
+        tasks += [
+            partial(warming.warm_author, author_id, per_feed)
+            for author_id in warming.get_top_author_ids(options['authors'])
+        ]
+        tasks += [
+            partial(warming.warm_feed, user_id, per_feed)
+            for user_id in warming.get_active_user_ids(options['users'], options['active_days'])
+        ]
+
+        warmer = warming.Warmer(options['workers'], options['max_qps'])
+        warmer.run(tasks)
+
+        self.stdout.write(
+            f'Warmed {warmer.keys} keys in {len(tasks)} tasks with {warmer.queries} queries '
+            f'in {time.perf_counter() - start:.1f} s.'
+        )
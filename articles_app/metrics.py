@@ -0,0 +1,169 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Each process counts into its own registry under a lock. With
+ARTICLES_METRICS_DIR set, processes also write snapshots there and a
+scrape sums the snapshots of all processes of a multi-process deployment.
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from django.conf import settings
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DESCRIPTIONS = {
+    'http_requests_total': ('counter', 'HTTP requests by route, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by route and method.'),
+    'db_queries_total': ('counter', 'Database queries by route.'),
+    'db_query_duration_seconds_total': ('counter', 'Time spent in database queries by route.'),
+    'cache_requests_total': ('counter', 'Cache lookups by cache and result.'),
+    'auth_failures_total': ('counter', 'Failed authentication attempts.'),
+    'requests_throttled_total': ('counter', 'Requests rejected by throttling by action.'),
+    'requests_shed_total': ('counter', 'Requests rejected by load shedding by reason.'),
+}
+
+
+class Registry:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        index = bisect.bisect_left(BUCKETS, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, labels, list(buckets), total, count]
+                    for (name, labels), (buckets, total, count) in self.histograms.items()
+                ],
+            }
+
+
+registry = Registry()
+last_write = 0.0
+
+
+def inc(name, labels=(), value=1):
+    registry.inc(name, labels, value)
+
+
+def observe(name, labels, value):
+    registry.observe(name, labels, value)
+
+
+def record_cache(cache, hit):
+    registry.inc('cache_requests_total', (('cache', cache), ('result', 'hit' if hit else 'miss')))
+
+
+def snapshot_path():
+    return os.path.join(settings.ARTICLES_METRICS_DIR, f'{os.getpid()}.json')
+
+
+def write_snapshot():
+    global last_write
+
+    last_write = time.monotonic()
+    if not settings.ARTICLES_METRICS_DIR:
+        return
+
+    os.makedirs(settings.ARTICLES_METRICS_DIR, exist_ok=True)
+    path = snapshot_path()
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(registry.snapshot(), file)
+    os.replace(f'{path}.tmp', path)
+
+
+def write_snapshot_if_due():
+    if settings.ARTICLES_METRICS_DIR and \
+            time.monotonic() - last_write >= settings.ARTICLES_METRICS_WRITE_INTERVAL:
+        write_snapshot()
+
+
+atexit.register(write_snapshot)
+
+
+def collect():
+    """
+    Sum the live registry with the snapshots of the other processes.
+    """
+    snapshots = [registry.snapshot()]
+    if settings.ARTICLES_METRICS_DIR and os.path.isdir(settings.ARTICLES_METRICS_DIR):
+        own = os.path.basename(snapshot_path())
+        for filename in os.listdir(settings.ARTICLES_METRICS_DIR):
+            if filename.endswith('.json') and filename != own:
+                try:
+                    with open(os.path.join(settings.ARTICLES_METRICS_DIR, filename)) as file:
+                        snapshots.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def render():
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, description) in DESCRIPTIONS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+        else:
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS + ('+Inf',), buckets):
+                    cumulative += bucket
+                    lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,280 @@
+import hmac
+import random
+import threading
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connection, connections
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from articles_app import compression, metrics
+from articles_app.profiling import get_profile_store
+from articles_app.slow_queries import SlowQueryWrapper, slow_query_log
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql, 'params': repr(params)[:500],
+                'time': time.perf_counter() - start
+            })
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """
+    Count requests, latency and database work per route.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        route = (('route', match.route if match else 'unmatched'),)
+        method = (('method', request.method),)
+        metrics.inc('http_requests_total', route + method + (('status', str(response.status_code)),))
+        metrics.observe('http_request_duration_seconds', route + method, duration)
+        if counter.count:
+            metrics.inc('db_queries_total', route, counter.count)
+            metrics.inc('db_query_duration_seconds_total', route, counter.time)
+        metrics.write_snapshot_if_due()
+
+        return response
+
+
+class LatencyTracker:
+    """
+    Exponentially weighted moving average of a latency in seconds.
+    """
+    def __init__(self, weight=0.1):
+        self.weight = weight
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, sample):
+        with self.lock:
+            self.value += self.weight * (sample - self.value)
+
+
+db_latency = LatencyTracker()
+
+
+def parse_request_start(value):
+    """
+    Seconds since the epoch from an X-Request-Start header set by the proxy,
+    given as t=<seconds>, milliseconds or microseconds.
+    """
+    try:
+        start = float(value[2:] if value.startswith('t=') else value)
+    except ValueError:
+        return None
+
+    if start > 1e14:
+        return start / 1e6
+    if start > 1e11:
+        return start / 1e3
+    return start
+
+
+class LoadSheddingMiddleware:
+    """
+    Answer 503 before doing any work when the request queued in front of
+    the worker for longer than ARTICLES_SHED_QUEUE_TIME, or, with a
+    probability growing with the excess, while the average database query
+    is slower than ARTICLES_SHED_DB_LATENCY. Admitted requests keep the
+    latency average current, so shedding stops as the database recovers.
+    """
+    # Share of requests admitted however slow the database is.
+    MIN_ADMITTED = 0.1
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path.startswith(tuple(settings.ARTICLES_SHED_EXEMPT_PATHS)):
+            return self.get_response(request)
+
+        reason = self.get_shed_reason(request)
+        if reason is not None:
+            metrics.inc('requests_shed_total', (('reason', reason),))
+            response = JsonResponse({'detail': 'Service is overloaded, retry later.'}, status=503)
+            response['Retry-After'] = str(settings.ARTICLES_SHED_RETRY_AFTER)
+            return response
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        if counter.count:
+            db_latency.observe(counter.time / counter.count)
+
+        return response
+
+    def get_shed_reason(self, request):
+        queue_limit = settings.ARTICLES_SHED_QUEUE_TIME / 1000
+        start = parse_request_start(request.META.get('HTTP_X_REQUEST_START', ''))
+        if queue_limit and start is not None and time.time() - start > queue_limit:
+            return 'queue_time'
+
+        latency_limit = settings.ARTICLES_SHED_DB_LATENCY / 1000
+        if latency_limit and db_latency.value > latency_limit:
+            probability = min(db_latency.value / latency_limit - 1, 1 - self.MIN_ADMITTED)
+            if random.random() < probability:
+                return 'db_latency'
+
+        return None
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies of ARTICLES_COMPRESSION_CONTENT_TYPES with the
+    encoding negotiated from Accept-Encoding. Bodies shorter than
+    ARTICLES_COMPRESSION_MIN_LENGTH are sent as they are, streams are always
+    compressed. Views mark responses they serve repeatedly with
+    compress_cached, their compressed bodies are kept in the cache.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compression.compress_stream(response.streaming_content, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            content = response.content
+            if getattr(response, 'compress_cached', False):
+                body = compression.compress_cached(content, encoding)
+            else:
+                body = compression.compress(content, encoding)
+            if len(body) >= len(content):
+                return response
+            response.content = body
+            response.headers['Content-Length'] = str(len(body))
+
+        # The body differs per encoding, a strong validator must too.
+        if response.has_header('ETag'):
+            response.headers['ETag'] = compression.encode_etag(response['ETag'], encoding)
+        response.headers['Content-Encoding'] = encoding
+
+        return response
+
+    def is_compressible(self, response):
+        if response.has_header('Content-Encoding'):
+            return False
+
+        # Only types without secrets next to reflected input, see BREACH.
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in settings.ARTICLES_COMPRESSION_CONTENT_TYPES:
+            return False
+
+        return response.streaming or len(response.content) >= settings.ARTICLES_COMPRESSION_MIN_LENGTH
+
+
+class ProfilingMiddleware:
+    """
+    Profile a single request sent with an X-Profile header or a profile
+    query parameter, when the header holds ARTICLES_PROFILER_TOKEN or the
+    request comes from a staff session of the admin. Others are not
+    profiled at all, requests without the trigger only pay for the check.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_allowed(self, request):
+        token = settings.ARTICLES_PROFILER_TOKEN
+        header = request.META.get('HTTP_X_PROFILE')
+        if token and header is not None and hmac.compare_digest(header.encode(), token.encode()):
+            return True
+
+        # Basic authentication happens in the views, only sessions are known here.
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def __call__(self, request):
+        if not settings.ARTICLES_PROFILER_ENABLED or not (
+            'HTTP_X_PROFILE' in request.META or 'profile' in request.GET
+        ) or not self.is_allowed(request):
+            return self.get_response(request)
+
+        # Imported on the first profiled request, most workers never see one.
+        import cProfile
+
+        profiler = cProfile.Profile()
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        user = getattr(request, 'user', None)
+        response['X-Profile-Id'] = get_profile_store().save(profiler, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': user.pk if user is not None else None,
+            'status': response.status_code,
+            'time': duration,
+            'queries': recorder.queries,
+        })
+
+        return response
+
+
+class SlowQueryMiddleware:
+    """
+    Log queries slower than ARTICLES_SLOW_QUERY_THRESHOLD milliseconds with
+    the view that ran them, aggregated by fingerprint.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.ARTICLES_SLOW_QUERY_THRESHOLD is None:
+            return self.get_response(request)
+
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(SlowQueryWrapper(request, conn)))
+            response = self.get_response(request)
+
+        slow_query_log.report_if_due()
+        return response
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(
+        'CREATE INDEX articles_app_article_search_vector_gin '
+        'ON articles_app_article USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        "UPDATE articles_app_article SET search_vector = "
+        "setweight(to_tsvector(%s, coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector(%s, coalesce(text, '')), 'B')",
+        params=[settings.ARTICLES_SEARCH_CONFIG] * 2
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('DROP INDEX IF EXISTS articles_app_article_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0002_alter_customuser_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='search_vector',
+            field=SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
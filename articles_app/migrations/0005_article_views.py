@@ -0,0 +1,26 @@
+# Generated by Django 4.1.5 on 2026-10-19 06:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0004_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularArticle',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='articles_app.article')),
+                ('views', models.PositiveBigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='views',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+INDEXES = (
+    ('articles_app_customuser_email_upper_like', 'articles_app_customuser', 'email'),
+    ('articles_app_customuser_username_upper_like', 'articles_app_customuser', 'username'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    # Matches UPPER("column"::text) LIKE UPPER('term%') from istartswith lookups.
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX {name} ON {table} (UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for name, table, column in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0005_article_views'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
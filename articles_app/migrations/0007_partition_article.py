@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition_article(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql' or \
+            not settings.ARTICLES_PARTITION_BY_CREATED_AT:
+        return
+
+    from articles_app.partitions import convert
+    convert()
+
+
+class Migration(migrations.Migration):
+    # The conversion manages its own transaction.
+    atomic = False
+
+    dependencies = [
+        ('articles_app', '0006_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_article, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.5 on 2026-10-19 06:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0007_partition_article'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('articles', models.IntegerField(default=0)),
+                ('public_articles', models.IntegerField(default=0)),
+                ('subscribers_gained', models.IntegerField(default=0)),
+                ('subscribers_lost', models.IntegerField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='authordailystats',
+            constraint=models.UniqueConstraint(fields=('author', 'day'), name='articles_app_author_day_unique'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.5 on 2026-10-19 07:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0008_author_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subscribers', models.IntegerField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_subscriptions', to=settings.AUTH_USER_MODEL)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cosubscription',
+            index=models.Index(fields=['author', '-subscribers'], name='articles_app_cosub_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cosubscription',
+            constraint=models.UniqueConstraint(fields=('author', 'other'), name='articles_app_co_subscription_unique'),
+        ),
+    ]
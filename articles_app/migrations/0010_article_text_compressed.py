@@ -0,0 +1,24 @@
+# Generated by Django 4.1.5 on 2026-10-19 07:09
+
+import articles_app.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0009_co_subscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='text_compressed',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='text',
+            field=articles_app.fields.CompressedTextField(compressed_field='text_compressed'),
+        ),
+    ]
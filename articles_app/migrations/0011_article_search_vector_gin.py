@@ -0,0 +1,59 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+LEGACY_NAME = 'articles_app_article_search_vector_gin'
+
+
+def rename_legacy_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    # The index created by 0003 is kept under the name the model declares.
+    schema_editor.execute(f'ALTER INDEX IF EXISTS {LEGACY_NAME} RENAME TO articles_app_article_sv_gin')
+
+
+def restore_legacy_name(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(f'ALTER INDEX IF EXISTS articles_app_article_sv_gin RENAME TO {LEGACY_NAME}')
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """
+    Builds the index without blocking writes on PostgreSQL, unless it
+    exists already, e.g. created by 0003 or the partitioning in 0007. Other
+    databases only record it in the migration state.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != 'postgresql':
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s)', [self.index.name])
+            if cursor.fetchone()[0] is not None:
+                return
+        super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('articles_app', '0010_article_text_compressed'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_legacy_index, restore_legacy_name),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='article',
+            index=GinIndex(fields=['search_vector'], name='articles_app_article_sv_gin'),
+        ),
+    ]
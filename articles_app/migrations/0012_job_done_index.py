@@ -0,0 +1,17 @@
+# Generated by Django 4.1.5 on 2026-10-19 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0011_article_search_vector_gin'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('status', 3)), fields=['updated_at'], name='articles_app_job_done_idx'),
+        ),
+    ]
@@ -1,9 +1,13 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import BaseUserManager
 from django.contrib.auth.models import UnicodeUsernameValidator
 from collections.abc import Iterable
+from articles_app.fields import CompressedTextField
 
 
 class CustomUserManager(BaseUserManager):
@@ -94,13 +98,148 @@ class CustomUser(AbstractUser):
     REQUIRED_FIELDS = ('username', 'password')
 
 
+class ArticleQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        # Without an explicit database save() lets the router pick the author's shard.
+        article = self.model(**kwargs)
+        article.save(force_insert=True, using=self._db)
+        return article
+
+
 class Article(models.Model):
     author = models.ForeignKey(CustomUser, related_name='articles', on_delete=models.CASCADE)
     title = models.CharField(max_length=500)
-    text = models.TextField()
+    text = CompressedTextField(compressed_field='text_compressed')
     public = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    views = models.PositiveBigIntegerField(default=0, editable=False)
+    # Filled by the search engine on save, GIN indexed on PostgreSQL.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Long text when stored compressed, see articles_app.fields.
+    text_compressed = models.BinaryField(null=True, editable=False)
+
+    objects = ArticleQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Created on PostgreSQL only, see migration 0011.
+            GinIndex(fields=['search_vector'], name='articles_app_article_sv_gin'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets signal handlers see visibility changes without another query.
+        instance._loaded_public = instance.__dict__.get('public')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if 'text' in self.__dict__:
+            # Text is written together with its compressed copy, which may
+            # be deferred, a raw text has none.
+            self.text = self.text
+            self.__dict__.setdefault('text_compressed', None)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'text' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'text_compressed'}
+
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.pk}. {self.author.email}. {self.title}.'
+
+
+class PopularArticle(models.Model):
+    """
+    Precomputed top of articles by views, refreshed as view counts are flushed.
+    """
+    article = models.OneToOneField(
+        Article, related_name='popularity', on_delete=models.CASCADE, primary_key=True
+    )
+    views = models.PositiveBigIntegerField(db_index=True)
+
+
+class Sequence(models.Model):
+    """
+    Last value handed out per name, ids allocated from the default database
+    stay unique across article shards.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField()
+
+
+class Job(models.Model):
+    PENDING = 1
+    RUNNING = 2
+    DONE = 3
+    FAILED = 4
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['run_at'], condition=models.Q(status=1),
+                name='articles_app_job_pending_idx'
+            ),
+            models.Index(
+                fields=['updated_at'], condition=models.Q(status=3),
+                name='articles_app_job_done_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.pk}. {self.name}. {self.get_status_display()}.'
+
+
+class AuthorDailyStats(models.Model):
+    """
+    Daily rollup per author, maintained incrementally by background jobs.
+    """
+    author = models.ForeignKey(CustomUser, related_name='daily_stats', on_delete=models.CASCADE)
+    day = models.DateField()
+    articles = models.IntegerField(default=0)
+    public_articles = models.IntegerField(default=0)
+    subscribers_gained = models.IntegerField(default=0)
+    subscribers_lost = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'day'], name='articles_app_author_day_unique'),
+        ]
+
+    @property
+    def private_articles(self):
+        return self.articles - self.public_articles
+
+
+class CoSubscription(models.Model):
+    """
+    Number of users subscribed to both author and other, maintained
+    incrementally by background jobs, one row per direction of a pair.
+    """
+    author = models.ForeignKey(CustomUser, related_name='co_subscriptions', on_delete=models.CASCADE)
+    other = models.ForeignKey(CustomUser, related_name='+', on_delete=models.CASCADE)
+    subscribers = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'other'], name='articles_app_co_subscription_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['author', '-subscribers'], name='articles_app_cosub_top_idx'),
+        ]
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+
+
+class ArticleSearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator that reads the planner row estimate for unfiltered
+    querysets of large PostgreSQL tables instead of running COUNT(*),
+    summed over the partitions of a partitioned table.
+    """
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if connection.vendor == 'postgresql' and not query.where:
+            with connection.cursor() as cursor:
+                # A partitioned table has no rows of its own, its partitions have.
+                cursor.execute(
+                    'SELECT CASE WHEN t.relkind = %s THEN ('
+                    '    SELECT coalesce(sum(greatest(p.reltuples, 0)), 0) FROM pg_inherits i'
+                    '    JOIN pg_class p ON p.oid = i.inhrelid WHERE i.inhparent = t.oid'
+                    ') ELSE t.reltuples END FROM pg_class t WHERE t.oid = %s::regclass',
+                    ['p', self.object_list.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+
+            if row and row[0] >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+
+        return super().count
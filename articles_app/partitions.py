@@ -0,0 +1,155 @@
+"""
+Monthly range partitioning of the article table by created_at, PostgreSQL only.
+
+The partitioned table keeps the column layout, so the ORM is unaffected.
+Its primary key becomes (id, created_at), ids stay unique through the
+sequence, foreign keys pointing at articles are dropped since PostgreSQL
+can only reference a key that includes the partition column.
+"""
+
+from datetime import date
+from django.db import connection, transaction
+
+
+TABLE = 'articles_app_article'
+SEQUENCE = 'articles_app_article_id_seq'
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month.year}_{month.month:02d}'
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE]
+    )
+    return cursor.fetchone() is not None
+
+
+def create_partition(cursor, month):
+    name = partition_name(month)
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} '
+        'FOR VALUES FROM (%s) TO (%s)',
+        [month.isoformat(), add_months(month, 1).isoformat()]
+    )
+    return name
+
+
+def convert(ahead=3):
+    """
+    Replace the article table with a partitioned copy of it.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return False
+
+        cursor.execute(
+            'SELECT conrelid::regclass::text, conname FROM pg_constraint '
+            'WHERE confrelid = %s::regclass AND contype = %s',
+            [TABLE, 'f']
+        )
+        for table, constraint in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {constraint}')
+
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old')
+        # The old sequence and indexes keep their names, which the new
+        # table reuses, so they move out of the way first.
+        cursor.execute(f'ALTER TABLE {TABLE}_old ALTER COLUMN id DROP IDENTITY IF EXISTS')
+        cursor.execute(f'ALTER SEQUENCE IF EXISTS {SEQUENCE} RENAME TO {TABLE}_old_id_seq')
+        cursor.execute(
+            'SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass ORDER BY 1',
+            [f'{TABLE}_old']
+        )
+        for i, (index,) in enumerate(cursor.fetchall()):
+            cursor.execute(f'ALTER INDEX {index} RENAME TO {TABLE}_old_{i}')
+        cursor.execute(
+            f'SELECT coalesce(max(id), 0) + 1, min(created_at)::date FROM {TABLE}_old'
+        )
+        next_id, first_day = cursor.fetchone()
+
+        cursor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f'CREATE SEQUENCE {SEQUENCE} START %s OWNED BY {TABLE}.id', [next_id])
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)')
+        cursor.execute(
+            f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_author_id_fk '
+            'FOREIGN KEY (author_id) REFERENCES articles_app_customuser (id) '
+            'DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(f'CREATE INDEX {TABLE}_author_id_idx ON {TABLE} (author_id)')
+        cursor.execute(f'CREATE INDEX {TABLE}_created_at_idx ON {TABLE} (created_at)')
+        cursor.execute(
+            f'CREATE INDEX {TABLE}_sv_gin ON {TABLE} USING gin (search_vector)'
+        )
+
+        month = add_months(first_day or date.today(), 0)
+        last = add_months(date.today(), ahead)
+        while month <= last:
+            create_partition(cursor, month)
+            month = add_months(month, 1)
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_old')
+        cursor.execute(f'DROP TABLE {TABLE}_old')
+
+    return True
+
+
+def list_partitions(cursor):
+    """
+    Return (name, month) of the monthly partitions, oldest first.
+    """
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+        [TABLE]
+    )
+    partitions = []
+    for name, in cursor.fetchall():
+        suffix = name[len(TABLE) + 2:]
+        if name.startswith(f'{TABLE}_p') and len(suffix) == 7:
+            partitions.append((name, date(int(suffix[:4]), int(suffix[5:]), 1)))
+    return partitions
+
+
+def create_future_partitions(ahead):
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = {name for name, _ in list_partitions(cursor)}
+        for i in range(ahead + 1):
+            month = add_months(date.today(), i)
+            if partition_name(month) not in existing:
+                created.append(create_partition(cursor, month))
+    return created
+
+
+def detach_old_partitions(retain, archive_schema=None):
+    """
+    Detach partitions older than `retain` months, optionally moving them
+    into an archive schema, the data stays available for export.
+    """
+    detached = []
+    oldest_kept = add_months(date.today(), -retain)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if archive_schema:
+            archive_schema = connection.ops.quote_name(archive_schema)
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {archive_schema}')
+
+        for name, month in list_partitions(cursor):
+            if month >= oldest_kept:
+                continue
+
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            if archive_schema:
+                cursor.execute(f'ALTER TABLE {name} SET SCHEMA {archive_schema}')
+            detached.append(name)
+    return detached
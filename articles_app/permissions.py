@@ -1,12 +1,15 @@
 from rest_framework import permissions
+from articles_app.deletion import is_status_token_valid
 from articles_app.models import CustomUser
+from articles_app.sharding import is_subscribed
 
 
 class UserPermission(permissions.BasePermission):
+    # Whether the subscription exists is checked by the view's single
+    # insert or delete, a separate read would race with concurrent requests.
     def has_subscribe_permission(self, subscriber, author):
         if author.role != CustomUser.AUTHOR or \
                 subscriber.role != CustomUser.SUBSCRIBER or \
-                author in subscriber.subscriptions.all() or \
                 author == subscriber:
             return False
 
@@ -14,8 +17,7 @@ class UserPermission(permissions.BasePermission):
 
     def has_unsubscribe_permission(self, subscriber, author):
         if subscriber.role != CustomUser.SUBSCRIBER or \
-                author.role != CustomUser.AUTHOR or \
-                author not in subscriber.subscriptions.all():
+                author.role != CustomUser.AUTHOR:
             return False
 
         return True
@@ -24,6 +26,11 @@ class UserPermission(permissions.BasePermission):
         if view.action == 'create':
             return not request.user.is_authenticated or request.user.is_superuser
 
+        if view.action == 'deletion':
+            pk = str(view.kwargs['pk'])
+            return request.user.is_staff or str(request.user.pk) == pk or \
+                is_status_token_valid(request.query_params.get('token'), pk)
+
         return True
 
     def has_object_permission(self, request, view, obj):
@@ -33,7 +40,7 @@ class UserPermission(permissions.BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        if view.action in ('update', 'partial_update', 'destroy'):
+        if view.action in ('update', 'partial_update', 'destroy', 'stats'):
             return obj == request.user or request.user.is_superuser
         elif view.action == 'subscribe':
             return self.has_subscribe_permission(request.user, obj)
@@ -59,6 +66,6 @@ class ArticlePermission(permissions.BasePermission):
             return False
 
         if view.action == 'retrieve':
-            return request.user in obj.author.subscribers.all()
+            return is_subscribed(obj.author_id, request.user.pk)
         elif view.action in ('update', 'partial_update', 'destroy'):
-            return obj.author == request.user or request.user.is_superuser
+            return obj.author_id == request.user.pk or request.user.is_superuser
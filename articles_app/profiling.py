@@ -0,0 +1,54 @@
+import json
+import marshal
+import os
+import time
+import uuid
+from pathlib import Path
+from django.conf import settings
+
+
+class ProfileStore:
+    """
+    Directory of request profiles, the oldest are removed beyond max_profiles.
+    Each profile is a pstats dump and a JSON file with request details and SQL.
+    """
+    def __init__(self, path, max_profiles):
+        self.path = Path(path)
+        self.max_profiles = max_profiles
+
+    def save(self, profiler, meta):
+        self.path.mkdir(parents=True, exist_ok=True)
+        profile_id = f'{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}'
+
+        profiler.create_stats()
+        with open(self.path / f'{profile_id}.prof', 'wb') as file:
+            marshal.dump(profiler.stats, file)
+        with open(self.path / f'{profile_id}.json', 'w') as file:
+            json.dump(meta, file)
+
+        self.prune()
+        return profile_id
+
+    def prune(self):
+        for profile_id in self.list()[:-self.max_profiles or None]:
+            for suffix in ('.prof', '.json'):
+                try:
+                    os.remove(self.path / f'{profile_id}{suffix}')
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        if not self.path.exists():
+            return []
+        return sorted(path.stem for path in self.path.glob('*.json'))
+
+    def load(self, profile_id):
+        import pstats
+
+        with open(self.path / f'{profile_id}.json') as file:
+            meta = json.load(file)
+        return meta, pstats.Stats(str(self.path / f'{profile_id}.prof'))
+
+
+def get_profile_store():
+    return ProfileStore(settings.ARTICLES_PROFILER_DIR, settings.ARTICLES_PROFILER_MAX_PROFILES)
@@ -0,0 +1,140 @@
+"""
+Author recommendations from the co-subscription graph.
+
+CoSubscription keeps, for every pair of authors, the number of users
+subscribed to both, only pairs with common subscribers have a row. The
+counts follow subscriptions through background jobs and are rebuilt from
+the subscription table in chunks of authors. Two subscriptions of one
+user committed at the same moment may count their pair twice, a rebuild
+corrects such drift.
+"""
+
+from collections import Counter
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+from articles_app.jobs import enqueue, enqueue_on_commit
+from articles_app.models import CoSubscription, CustomUser
+from articles_app.sharding import Subscription, get_subscription_ids, scatter
+
+
+def record(author_ids, other_ids, sign):
+    """
+    Count a subscriber gained (sign 1) or lost (sign -1) by author_ids,
+    who also follows other_ids.
+    """
+    if author_ids:
+        enqueue_on_commit(
+            'co_subscriptions', author_ids=sorted(author_ids), other_ids=sorted(other_ids), sign=sign
+        )
+
+
+def record_subscriptions(subscriber_id, author_ids, sign, using=DEFAULT_DB_ALIAS):
+    """
+    Count subscriptions of subscriber_id to author_ids added or removed in
+    the current transaction on the using database.
+    """
+    if not author_ids:
+        return
+
+    author_ids = sorted(author_ids)
+
+    def enqueue_record():
+        # Read once committed, the shards are queried on other connections.
+        others = get_subscription_ids(subscriber_id) - set(author_ids)
+        enqueue('co_subscriptions', author_ids=author_ids, other_ids=sorted(others), sign=sign)
+
+    transaction.on_commit(enqueue_record, using=using)
+
+
+def get_deltas(payloads):
+    deltas = Counter()
+    for payload in payloads:
+        authors, others, sign = payload['author_ids'], payload['other_ids'], payload['sign']
+        for author_id in authors:
+            for other_id in authors:
+                if other_id != author_id:
+                    deltas[author_id, other_id] += sign
+            for other_id in others:
+                deltas[author_id, other_id] += sign
+                deltas[other_id, author_id] += sign
+    return deltas
+
+
+def apply(payloads):
+    """
+    Apply the summed deltas of all payloads with one UPDATE per delta value.
+    """
+    deltas = {pair: delta for pair, delta in get_deltas(payloads).items() if delta}
+    if not deltas:
+        return
+
+    user_ids = {pk for pair in deltas for pk in pair}
+    existing = set(CustomUser.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    deltas = {pair: delta for pair, delta in deltas.items() if existing.issuperset(pair)}
+
+    CoSubscription.objects.bulk_create(
+        [
+            CoSubscription(author_id=author_id, other_id=other_id, subscribers=0)
+            for (author_id, other_id), delta in deltas.items() if delta > 0
+        ],
+        ignore_conflicts=True
+    )
+
+    groups = {}
+    for (author_id, other_id), delta in deltas.items():
+        groups.setdefault(delta, {}).setdefault(author_id, []).append(other_id)
+    for delta, others in groups.items():
+        condition = Q()
+        for author_id, other_ids in others.items():
+            condition |= Q(author_id=author_id, other_id__in=other_ids)
+        CoSubscription.objects.filter(condition).update(subscribers=F('subscribers') + delta)
+
+    authors = {author_id for author_id, _ in deltas}
+    CoSubscription.objects.filter(author__in=authors, subscribers__lte=0).delete()
+
+
+def count_pairs(author_ids):
+    """
+    Co-subscription counts of the given authors with all other authors,
+    reading the subscriptions of their subscribers in chunks.
+    """
+    subscriptions = Subscription.objects.values_list('to_customuser_id', 'from_customuser_id')
+
+    followed = {}
+    for rows in scatter(subscriptions.filter(from_customuser_id__in=author_ids)):
+        for subscriber_id, author_id in rows:
+            followed.setdefault(subscriber_id, []).append(author_id)
+
+    counts = Counter()
+    subscriber_ids = sorted(followed)
+    chunk_size = settings.ARTICLES_RECOMMENDATIONS_CHUNK_SIZE
+    for start in range(0, len(subscriber_ids), chunk_size):
+        chunk = subscriber_ids[start:start + chunk_size]
+        for rows in scatter(subscriptions.filter(to_customuser_id__in=chunk)):
+            for subscriber_id, other_id in rows:
+                for author_id in followed[subscriber_id]:
+                    if author_id != other_id:
+                        counts[author_id, other_id] += 1
+    return counts
+
+
+def rebuild(author_ids):
+    """
+    Replace the co-subscription rows of the given authors.
+    """
+    counts = count_pairs(author_ids)
+    with transaction.atomic():
+        CoSubscription.objects.filter(author__in=author_ids).delete()
+        CoSubscription.objects.bulk_create(
+            [
+                CoSubscription(author_id=author_id, other_id=other_id, subscribers=count)
+                for (author_id, other_id), count in counts.items()
+            ],
+            batch_size=1000
+        )
+
+
+def get_recommendations(author_id):
+    return CoSubscription.objects.filter(author_id=author_id).select_related('other') \
+        .order_by('-subscribers', 'other_id')[:settings.ARTICLES_RECOMMENDATIONS_SIZE]
@@ -0,0 +1,119 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, TextField, Value, When
+from django.utils.module_loading import import_string
+from articles_app.fields import unpack
+
+
+class BaseSearchEngine(ABC):
+    @abstractmethod
+    def index(self, article_ids):
+        """
+        Update the search data of the given articles after they changed.
+        """
+
+    @abstractmethod
+    def search(self, queryset, query):
+        """
+        Articles of queryset matching query, best matches first.
+        """
+
+
+class PostgresSearchEngine(BaseSearchEngine):
+    """
+    Ranked full-text search over the stored, GIN indexed search_vector column.
+    """
+    # Compressed texts inlined into one UPDATE.
+    CHUNK_SIZE = 100
+
+    def __init__(self):
+        self.config = settings.ARTICLES_SEARCH_CONFIG
+
+    def get_vector(self, text='text'):
+        from django.contrib.postgres.search import SearchVector
+
+        return (
+            SearchVector('title', weight='A', config=self.config) +
+            SearchVector(text, weight='B', config=self.config)
+        )
+
+    def index(self, article_ids):
+        from articles_app.models import Article
+        from articles_app.sharding import get_shards
+
+        for alias in get_shards():
+            articles = Article.objects.using(alias).filter(pk__in=article_ids)
+            articles.filter(text_compressed__isnull=True).update(search_vector=self.get_vector())
+            # Compressed texts are not in the text column, pass them in, a
+            # bounded chunk of texts per statement.
+            compressed_ids = list(articles.filter(text_compressed__isnull=False).values_list('pk', flat=True))
+            for start in range(0, len(compressed_ids), self.CHUNK_SIZE):
+                chunk = articles.filter(pk__in=compressed_ids[start:start + self.CHUNK_SIZE])
+                vectors = [
+                    When(pk=pk, then=self.get_vector(Value(unpack(data), output_field=TextField())))
+                    for pk, data in chunk.values_list('pk', 'text_compressed')
+                ]
+                if vectors:
+                    chunk.update(search_vector=Case(*vectors))
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(query, search_type='websearch', config=self.config)
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-id')
+
+
+class SimpleSearchEngine(BaseSearchEngine):
+    """
+    Fallback for databases without full-text search, e.g. SQLite in tests.
+    Every term must match title or text, title matches are ranked first.
+    Compressed texts are decompressed and matched in the process, each
+    search reads all compressed articles of the queryset.
+    """
+    def index(self, article_ids):
+        pass
+
+    def search(self, queryset, query):
+        terms = query.split()
+        matches = Q()
+        for term in terms:
+            matches &= Q(title__icontains=term) | Q(text__icontains=term)
+        queryset = queryset.filter(matches | Q(pk__in=self.match_compressed(queryset, terms)))
+
+        return queryset.annotate(
+            rank=Case(
+                When(title__icontains=query, then=Value(2)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('-rank', '-id')
+
+    def match_compressed(self, queryset, terms):
+        terms = [term.lower() for term in terms]
+        rows = queryset.filter(text_compressed__isnull=False).values_list('pk', 'title', 'text_compressed')
+        matched = []
+        for pk, title, compressed in rows.iterator():
+            title, text = title.lower(), unpack(compressed).lower()
+            if all(term in title or term in text for term in terms):
+                matched.append(pk)
+        return matched
+
+
+@lru_cache(maxsize=None)
+def load_search_engine(path):
+    return import_string(path)()
+
+
+def get_search_engine():
+    path = settings.ARTICLES_SEARCH_ENGINE
+    if path is None:
+        if connection.vendor == 'postgresql':
+            path = 'articles_app.search.PostgresSearchEngine'
+        else:
+            path = 'articles_app.search.SimpleSearchEngine'
+
+    return load_search_engine(path)
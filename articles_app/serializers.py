@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from articles_app.models import CustomUser, Article
+from articles_app.models import CustomUser, Article, AuthorDailyStats, CoSubscription
 from django.contrib.auth.password_validation import validate_password
 
 
@@ -64,3 +64,24 @@ class CreateArticleSerializer(serializers.ModelSerializer):
                 not self.context['request'].user.is_superuser:
             raise serializers.ValidationError('Invalid article author.')
         return attrs
+
+
+class AuthorDailyStatsSerializer(serializers.ModelSerializer):
+    private_articles = serializers.ReadOnlyField()
+
+    class Meta:
+        model = AuthorDailyStats
+        fields = [
+            'day', 'articles', 'public_articles', 'private_articles',
+            'subscribers_gained', 'subscribers_lost'
+        ]
+
+
+class RecommendationSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='other_id')
+    username = serializers.ReadOnlyField(source='other.username')
+    email = serializers.ReadOnlyField(source='other.email')
+
+    class Meta:
+        model = CoSubscription
+        fields = ['id', 'username', 'email', 'subscribers']
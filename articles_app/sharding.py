@@ -0,0 +1,249 @@
+"""
+Sharding of articles and subscriptions by author.
+
+With ARTICLES_SHARDS set, an author's articles, their popularity rows and
+the author's subscriber rows live on the shard database chosen by the
+author id, ShardRouter sends writes of those models there. Users stay in
+the default database and are copied to every shard as a reference table,
+so foreign keys hold on each shard. Reads that are not about one author
+scatter to all shards concurrently and gather the results. Article ids are
+allocated from a sequence on the default database, so that an id names one
+article of all shards.
+"""
+
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.db.models.signals import m2m_changed
+from articles_app.models import Article, CustomUser, PopularArticle, Sequence
+
+Subscription = CustomUser.subscribers.through
+
+SHARDED_MODELS = (Article, PopularArticle, Subscription)
+
+executor = None
+
+
+def is_sharded():
+    return bool(settings.ARTICLES_SHARDS)
+
+
+def get_shards():
+    return settings.ARTICLES_SHARDS or [DEFAULT_DB_ALIAS]
+
+
+def shard_for_author(author_id):
+    shards = get_shards()
+    return shards[author_id % len(shards)]
+
+
+def get_author_id(instance):
+    if isinstance(instance, Article):
+        return instance.author_id
+    if isinstance(instance, Subscription):
+        return instance.from_customuser_id
+    if isinstance(instance, CustomUser):
+        # Hint of the author.subscribers manager, writes through the reverse
+        # subscriber.subscriptions manager are refused by signals.
+        return instance.pk
+    return None
+
+
+class ShardRouter:
+    def db_for_write(self, model, instance=None, **hints):
+        if not is_sharded() or model not in SHARDED_MODELS or instance is None:
+            return None
+
+        author_id = get_author_id(instance)
+        if author_id is None:
+            # Rows already read from a shard are written back to it.
+            return instance._state.db
+        return shard_for_author(author_id)
+
+    db_for_read = db_for_write
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Users are in the default database and copied to every shard.
+        if is_sharded() and CustomUser in (type(obj1), type(obj2)):
+            return True
+        return None
+
+
+def get_executor():
+    global executor
+
+    if executor is None:
+        executor = ThreadPoolExecutor(settings.ARTICLES_SHARD_WORKERS, thread_name_prefix='shard')
+    return executor
+
+
+def run(queryset, evaluate=list):
+    try:
+        return evaluate(queryset)
+    finally:
+        # Worker threads own their connections.
+        connections[queryset.db].close()
+
+
+def evaluate_all(querysets, evaluate=list):
+    """
+    Evaluate querysets bound to different shards concurrently, one result each.
+    """
+    if len(querysets) == 1:
+        return [evaluate(querysets[0])]
+    return list(get_executor().map(lambda queryset: run(queryset, evaluate), querysets))
+
+
+def scatter(queryset):
+    """
+    Evaluate queryset on every shard concurrently, one result list per shard.
+    """
+    return evaluate_all([queryset.using(alias) for alias in get_shards()])
+
+
+def gather(queryset, key):
+    """
+    Rows of all shards merged by key, queryset must be ordered by key.
+    """
+    return list(heapq.merge(*scatter(queryset), key=key))
+
+
+class MergedResults:
+    """
+    Ordered querysets of the shards merged by key, counted and sliced like
+    one queryset so that paginators page through the merge. A slice reads
+    the rows up to its end from every shard.
+    """
+    def __init__(self, querysets, key):
+        self.querysets = querysets
+        self.key = key
+
+    def count(self):
+        return sum(evaluate_all(self.querysets, lambda queryset: queryset.count()))
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('Merged results support slices without a step only.')
+
+        querysets = self.querysets
+        if index.stop is not None:
+            querysets = [queryset[:index.stop] for queryset in querysets]
+        return list(heapq.merge(*evaluate_all(querysets), key=self.key))[index]
+
+
+def get_first(queryset):
+    for rows in scatter(queryset):
+        if rows:
+            return rows[0]
+    return None
+
+
+def allocate_article_ids(count):
+    """
+    Reserve count consecutive article ids on the default database. The
+    sequence starts after the largest article id of the shards.
+    """
+    sequences = Sequence.objects.using(DEFAULT_DB_ALIAS).filter(name='article')
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        if not sequences.update(value=F('value') + count):
+            last_ids = scatter(Article.objects.order_by('-pk').values_list('pk', flat=True)[:1])
+            Sequence.objects.using(DEFAULT_DB_ALIAS).get_or_create(
+                name='article', defaults={'value': max((pk for rows in last_ids for pk in rows), default=0)}
+            )
+            sequences.update(value=F('value') + count)
+        last = sequences.values_list('value', flat=True).get()
+    return range(last - count + 1, last + 1)
+
+
+def prefetch_by_author(users, *lookups):
+    """
+    prefetch_related_objects() for users whose related rows are on the shard
+    of each user, lookups are (name, queryset) pairs run on every shard of
+    the users.
+    """
+    groups = {}
+    for user in users:
+        groups.setdefault(shard_for_author(user.pk), []).append(user)
+    for alias, group in groups.items():
+        prefetch_related_objects(group, *[Prefetch(name, queryset=queryset.using(alias)) for name, queryset in lookups])
+
+
+def is_subscribed(author_id, subscriber_id):
+    return Subscription.objects.using(shard_for_author(author_id)).filter(
+        from_customuser_id=author_id, to_customuser_id=subscriber_id
+    ).exists()
+
+
+def send_subscription_changed(action, author_id, subscriber_id, alias):
+    # Receivers of author.subscribers changes count and invalidate as for add() and remove().
+    m2m_changed.send(
+        sender=Subscription, action=action, instance=CustomUser(pk=author_id), reverse=False,
+        model=CustomUser, pk_set={subscriber_id}, using=alias
+    )
+
+
+def subscribe(author_id, subscriber_id):
+    """
+    Insert the subscription in one statement, True if it did not exist.
+    Concurrent calls for the same pair insert it once.
+    """
+    alias = shard_for_author(author_id)
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    with transaction.atomic(using=alias, savepoint=False):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(Subscription._meta.db_table)} '
+                f'({quote("from_customuser_id")}, {quote("to_customuser_id")}) VALUES (%s, %s) '
+                f'ON CONFLICT DO NOTHING',
+                [author_id, subscriber_id]
+            )
+            created = cursor.rowcount == 1
+        if created:
+            send_subscription_changed('post_add', author_id, subscriber_id, alias)
+    return created
+
+
+def unsubscribe(author_id, subscriber_id):
+    """
+    Delete the subscription in one statement, True if it existed.
+    """
+    alias = shard_for_author(author_id)
+    with transaction.atomic(using=alias, savepoint=False):
+        deleted, _ = Subscription.objects.using(alias).filter(
+            from_customuser_id=author_id, to_customuser_id=subscriber_id
+        ).delete()
+        if deleted:
+            send_subscription_changed('post_remove', author_id, subscriber_id, alias)
+    return bool(deleted)
+
+
+def get_subscription_ids(subscriber_id):
+    queryset = Subscription.objects.filter(to_customuser_id=subscriber_id) \
+        .values_list('from_customuser_id', flat=True)
+    return frozenset(author_id for rows in scatter(queryset) for author_id in rows)
+
+
+def replicate_users(users):
+    if not is_sharded():
+        return
+
+    fields = CustomUser._meta.concrete_fields
+    for alias in get_shards():
+        # Copies, bulk_create binds the instances it is given to the shard.
+        copies = [
+            CustomUser(**{field.attname: getattr(user, field.attname) for field in fields})
+            for user in users
+        ]
+        CustomUser.objects.using(alias).bulk_create(
+            copies, update_conflicts=True, unique_fields=['id'],
+            update_fields=[field.name for field in fields if not field.primary_key]
+        )
+
+
+def delete_user_replicas(user_id):
+    for alias in settings.ARTICLES_SHARDS:
+        # Cascades to the user's articles and subscriptions on the shard.
+        CustomUser.objects.using(alias).filter(pk=user_id).delete()
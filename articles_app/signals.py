@@ -0,0 +1,134 @@
+from django.contrib.auth.signals import user_login_failed
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from articles_app.events import article_event, get_broker
+from articles_app.jobs import enqueue_on_commit
+from articles_app.models import Article, CustomUser
+from articles_app import caching, metrics, recommendations, sharding, stats
+
+
+@receiver(pre_save, sender=Article)
+def allocate_article_id(sender, instance, raw, **kwargs):
+    # Shards would each count ids from 1.
+    if instance.pk is None and not raw and sharding.is_sharded():
+        instance.pk = sharding.allocate_article_ids(1)[0]
+
+
+@receiver(post_save, sender=Article)
+def index_article(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'title', 'text'} & set(update_fields):
+        return
+
+    enqueue_on_commit('index_articles', article_id=instance.pk)
+
+
+@receiver(post_save, sender=Article)
+def publish_article(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    transaction.on_commit(lambda: get_broker().publish(article_event(instance)))
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def invalidate_article(sender, instance, **kwargs):
+    caching.invalidate_articles([instance.pk])
+
+
+@receiver(post_save, sender=Article)
+def count_article(sender, instance, created, **kwargs):
+    if created:
+        stats.record_article(instance, 1)
+    elif getattr(instance, '_loaded_public', None) not in (None, instance.public):
+        stats.record(
+            instance.author_id, timezone.localdate(instance.created_at),
+            public_articles=1 if instance.public else -1
+        )
+
+    instance._loaded_public = instance.public
+
+
+@receiver(post_delete, sender=Article)
+def uncount_article(sender, instance, **kwargs):
+    stats.record_article(instance, -1)
+
+
+@receiver(m2m_changed, sender=CustomUser.subscribers.through)
+def count_subscribers(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    field = 'subscribers_gained' if action == 'post_add' else 'subscribers_lost'
+    if reverse:
+        # Subscriber side, pk_set holds the authors.
+        for author_id in pk_set:
+            stats.record(author_id, **{field: 1})
+    else:
+        stats.record(instance.pk, **{field: len(pk_set)})
+
+
+@receiver(m2m_changed, sender=CustomUser.subscribers.through)
+def refuse_sharded_subscriptions_writes(sender, action, reverse, **kwargs):
+    # The router routes by the manager's instance, for subscriber.subscriptions
+    # that is the subscriber while the rows are on the shards of the authors.
+    if reverse and action.startswith('pre_') and sharding.is_sharded():
+        raise NotSupportedError(
+            'Subscriptions are sharded by author, change them with author.subscribers or sharding.subscribe().'
+        )
+
+
+@receiver(m2m_changed, sender=CustomUser.subscribers.through)
+def count_co_subscriptions(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+
+    sign = 1 if action == 'post_add' else -1
+    if reverse:
+        recommendations.record_subscriptions(instance.pk, pk_set, sign, using)
+    else:
+        for subscriber_id in pk_set:
+            recommendations.record_subscriptions(subscriber_id, [instance.pk], sign, using)
+
+
+@receiver(m2m_changed, sender=CustomUser.subscribers.through)
+def invalidate_subscriptions(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        # Subscribers are gone after the clear, pk_set is None then.
+        caching.invalidate_subscriptions(instance.subscribers.using(using).values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        caching.invalidate_subscriptions([instance.pk] if reverse else pk_set or ())
+
+
+@receiver(post_save, sender=CustomUser)
+def replicate_user(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS:
+        sharding.replicate_users([instance])
+
+
+@receiver(pre_delete, sender=CustomUser)
+def uncount_co_subscriptions(sender, instance, using, **kwargs):
+    # The collector removes subscriptions without m2m_changed.
+    if using == DEFAULT_DB_ALIAS:
+        recommendations.record(sharding.get_subscription_ids(instance.pk), (), -1)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def uncount_subscribers(sender, instance, using, **kwargs):
+    # The collector removes subscriptions without m2m_changed.
+    if using == DEFAULT_DB_ALIAS:
+        for author_id in sharding.get_subscription_ids(instance.pk):
+            stats.record(author_id, subscribers_lost=1)
+
+
+@receiver(post_delete, sender=CustomUser)
+def delete_user_replicas(sender, instance, using, **kwargs):
+    if using == DEFAULT_DB_ALIAS:
+        sharding.delete_user_replicas(instance.pk)
+
+
+@receiver(user_login_failed)
+def count_auth_failure(sender, **kwargs):
+    metrics.inc('auth_failures_total')
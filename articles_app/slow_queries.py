@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+import traceback
+from django.conf import settings
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?...)'),
+    (re.compile(r'\s+'), ' '),
+)
+IGNORED_FRAMES = ('articles_app/slow_queries.py', 'articles_app/middleware.py')
+
+
+def normalize(sql):
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def get_view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.path
+
+    view = match.func
+    actions = getattr(view, 'actions', None)
+    if actions and request.method.lower() in actions:
+        return f'{view.cls.__name__}.{actions[request.method.lower()]}'
+    return match.view_name
+
+
+def get_call_site():
+    """
+    Innermost frame of project code outside site-packages that ran the query.
+    """
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename \
+                and not frame.filename.endswith(IGNORED_FRAMES):
+            return f'{frame.filename[len(base) + 1:]}:{frame.lineno} {frame.name}'
+    return ''
+
+
+class SlowQueryLog:
+    """
+    Slow queries aggregated by fingerprint, with the views and call sites
+    that ran them and a sampled plan.
+    """
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.last_report = time.monotonic()
+
+    def record(self, sql, duration, view, call_site, explain=None):
+        key = fingerprint(sql)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= self.max_entries:
+                    return
+                entry = self.entries[key] = {
+                    'fingerprint': key, 'sql': normalize(sql), 'count': 0,
+                    'total': 0.0, 'max': 0.0, 'views': {}, 'call_sites': {}, 'explain': None
+                }
+            entry['count'] += 1
+            entry['total'] += duration
+            entry['max'] = max(entry['max'], duration)
+            entry['views'][view] = entry['views'].get(view, 0) + 1
+            if call_site:
+                entry['call_sites'][call_site] = entry['call_sites'].get(call_site, 0) + 1
+            if explain is not None:
+                entry['explain'] = explain
+
+    def top(self, limit=10):
+        with self.lock:
+            entries = sorted(self.entries.values(), key=lambda e: e['total'], reverse=True)
+            return [dict(entry) for entry in entries[:limit]]
+
+    def report_if_due(self):
+        if time.monotonic() - self.last_report < settings.ARTICLES_SLOW_QUERY_REPORT_INTERVAL:
+            return
+
+        self.last_report = time.monotonic()
+        for entry in self.top():
+            logger.warning(
+                'Slow query %s: %d times, %.1f ms total, %.1f ms max, views %s, call sites %s: %s',
+                entry['fingerprint'], entry['count'], entry['total'] * 1000, entry['max'] * 1000,
+                entry['views'], entry['call_sites'], entry['sql']
+            )
+
+
+slow_query_log = SlowQueryLog()
+explaining = threading.local()
+
+
+class SlowQueryWrapper:
+    """
+    connection.execute_wrapper that records queries slower than the threshold.
+    """
+    def __init__(self, request, connection):
+        self.request = request
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(explaining, 'active', False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+
+        if duration * 1000 >= settings.ARTICLES_SLOW_QUERY_THRESHOLD:
+            view = get_view_label(self.request)
+            logger.info('Slow query %.1f ms in %s: %s', duration * 1000, view, sql)
+            slow_query_log.record(sql, duration, view, get_call_site(), self.explain(sql, params, many))
+
+        return result
+
+    def explain(self, sql, params, many):
+        # ANALYZE runs the statement again, only plain reads are explained.
+        if many or self.connection.vendor != 'postgresql' or \
+                not sql.lstrip().upper().startswith('SELECT') or 'FOR UPDATE' in sql or \
+                random.random() >= settings.ARTICLES_SLOW_QUERY_EXPLAIN_RATE:
+            return None
+
+        explaining.active = True
+        try:
+            # A savepoint keeps a failed EXPLAIN from breaking the request transaction.
+            with transaction.atomic(using=self.connection.alias), self.connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+                return '\n'.join(row[0] for row in cursor.fetchall())
+        except Exception:
+            logger.exception('Could not explain slow query.')
+            return None
+        finally:
+            explaining.active = False
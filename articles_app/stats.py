@@ -0,0 +1,88 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from articles_app.jobs import enqueue_on_commit
+from articles_app.models import Article, AuthorDailyStats, CustomUser
+
+
+FIELDS = ('articles', 'public_articles', 'subscribers_gained', 'subscribers_lost')
+
+
+def record(author_id, day=None, **deltas):
+    day = day or timezone.localdate()
+    enqueue_on_commit('author_stats', author_id=author_id, day=day.isoformat(), **deltas)
+
+
+def record_article(article, sign):
+    record(
+        article.author_id, timezone.localdate(article.created_at),
+        articles=sign, public_articles=sign if article.public else 0
+    )
+
+
+def apply(payloads):
+    """
+    Sum the deltas per author and day, then apply each sum with one UPDATE.
+    """
+    totals = {}
+    for payload in payloads:
+        key = (payload['author_id'], payload['day'])
+        totals.setdefault(key, Counter()).update(
+            {field: payload.get(field, 0) for field in FIELDS}
+        )
+
+    existing = set(CustomUser.objects.filter(pk__in={a for a, _ in totals}).values_list('pk', flat=True))
+    totals = {key: deltas for key, deltas in totals.items() if key[0] in existing}
+    AuthorDailyStats.objects.bulk_create(
+        [AuthorDailyStats(author_id=author_id, day=day) for author_id, day in totals],
+        ignore_conflicts=True
+    )
+    for (author_id, day), deltas in totals.items():
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if changes:
+            AuthorDailyStats.objects.filter(author_id=author_id, day=day).update(**changes)
+
+
+def backfill(author_ids, subscribers=False):
+    """
+    Recompute article rollups of the given authors from the article table.
+    Subscription history is not stored, so current subscribers can be
+    recorded as gained today to set a baseline.
+    """
+    AuthorDailyStats.objects.filter(author__in=author_ids).update(articles=0, public_articles=0)
+    rows = Article.objects.filter(author__in=author_ids) \
+        .annotate(day=TruncDate('created_at')).values('author', 'day') \
+        .annotate(articles=Count('pk'), public_articles=Count('pk', filter=Q(public=True))) \
+        .order_by()
+    AuthorDailyStats.objects.bulk_create(
+        [
+            AuthorDailyStats(
+                author_id=row['author'], day=row['day'],
+                articles=row['articles'], public_articles=row['public_articles']
+            )
+            for row in rows
+        ],
+        update_conflicts=True, unique_fields=['author', 'day'],
+        update_fields=['articles', 'public_articles']
+    )
+
+    if subscribers:
+        counts = CustomUser.objects.filter(pk__in=author_ids) \
+            .annotate(total=Count('subscribers')).filter(total__gt=0).values_list('pk', 'total')
+        AuthorDailyStats.objects.bulk_create(
+            [
+                AuthorDailyStats(author_id=pk, day=timezone.localdate(), subscribers_gained=total)
+                for pk, total in counts
+            ],
+            update_conflicts=True, unique_fields=['author', 'day'],
+            update_fields=['subscribers_gained']
+        )
+
+
+def get_stats(author, days):
+    days = min(days, settings.ARTICLES_STATS_MAX_DAYS)
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return author.daily_stats.filter(day__gte=since).order_by('day')
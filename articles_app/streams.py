@@ -0,0 +1,153 @@
+import asyncio
+import base64
+import binascii
+import json
+import math
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import close_old_connections
+from articles_app.events import SubscriptionOverflow, get_broker
+
+
+def get_header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def get_credentials(scope):
+    header = get_header(scope, b'authorization')
+    if not header or not header.lower().startswith('basic '):
+        return None
+
+    try:
+        email, _, password = base64.b64decode(header[6:]).decode().partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return email, password
+
+
+def get_meta(scope):
+    # The headers the throttles read to tell clients apart.
+    meta = {'REMOTE_ADDR': scope['client'][0] if scope.get('client') else ''}
+    forwarded_for = get_header(scope, b'x-forwarded-for')
+    if forwarded_for is not None:
+        meta['HTTP_X_FORWARDED_FOR'] = forwarded_for
+    return meta
+
+
+def load_subscriber(credentials, last_event_id, meta):
+    """
+    Authenticate the subscriber and collect subscriptions and missed
+    articles in a single trip to the sync world. Failed logins are throttled
+    as for the API, the seconds to wait are returned for a throttled address.
+    """
+    from articles_app.events import article_event
+    from articles_app.models import Article
+    from articles_app.sharding import gather, get_subscription_ids
+    from articles_app.throttling import get_login_ident, take_login_failure
+
+    try:
+        ident = get_login_ident(meta)
+        delay = take_login_failure(ident, check_only=True)
+        if delay:
+            return None, None, [], delay
+
+        user = authenticate(None, username=credentials[0], password=credentials[1])
+        if user is None or not user.is_active:
+            take_login_failure(ident)
+            return None, None, [], 0
+
+        author_ids = list(get_subscription_ids(user.pk))
+        missed = []
+        if last_event_id is not None:
+            limit = settings.ARTICLES_STREAM_QUEUE_SIZE
+            articles = gather(
+                Article.objects.filter(author__in=author_ids, pk__gt=last_event_id).order_by('pk')[:limit],
+                key=lambda article: article.pk
+            )
+            missed = [article_event(article) for article in articles[:limit]]
+        return user, author_ids, missed, 0
+    finally:
+        close_old_connections()
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: article\ndata: {json.dumps(event)}\n\n".encode()
+
+
+async def send_status(send, status, headers=()):
+    await send({'type': 'http.response.start', 'status': status, 'headers': list(headers)})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def article_stream(scope, receive, send):
+    """
+    Server-Sent Events stream of new articles from the authors the user is
+    subscribed to. Served directly by ASGI, so an idle connection costs a
+    coroutine and a small queue instead of a worker thread.
+    """
+    broker = get_broker()
+    if len(broker) >= settings.ARTICLES_STREAM_MAX_CONNECTIONS:
+        await send_status(send, 503, [(b'retry-after', b'5')])
+        return
+
+    credentials = get_credentials(scope)
+    last_event_id = get_header(scope, b'last-event-id')
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    user, author_ids, missed, delay = (None, None, [], 0)
+    if credentials is not None:
+        user, author_ids, missed, delay = await sync_to_async(load_subscriber)(
+            credentials, last_event_id, get_meta(scope)
+        )
+
+    if delay:
+        await send_status(send, 429, [(b'retry-after', str(math.ceil(delay)).encode())])
+        return
+
+    if user is None:
+        await send_status(send, 401, [(b'www-authenticate', b'Basic realm="api"')])
+        return
+
+    subscription = broker.subscribe(author_ids)
+    disconnect = asyncio.ensure_future(receive())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        for event in missed:
+            await send({'type': 'http.response.body', 'body': format_event(event), 'more_body': True})
+
+        while True:
+            get_event = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {get_event, disconnect}, timeout=settings.ARTICLES_STREAM_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                get_event.cancel()
+                return
+
+            if get_event in done:
+                try:
+                    body = format_event(get_event.result())
+                except SubscriptionOverflow:
+                    break
+            else:
+                get_event.cancel()
+                body = b': keepalive\n\n'
+
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        broker.unsubscribe(subscription)
+        disconnect.cancel()
@@ -0,0 +1,35 @@
+from collections import Counter
+from articles_app import deletion, recommendations, stats
+from articles_app.counters import add_views
+from articles_app.jobs import job
+from articles_app.search import get_search_engine
+
+
+@job('index_articles', batch=True)
+def index_articles(payloads):
+    get_search_engine().index({payload['article_id'] for payload in payloads})
+
+
+@job('flush_views', batch=True)
+def flush_views(payloads):
+    counts = Counter()
+    for payload in payloads:
+        counts.update({int(pk): n for pk, n in payload['counts'].items()})
+
+    add_views(counts)
+
+
+# Commits per batch, running it again deletes what is left.
+@job('delete_user', atomic=False)
+def delete_user(user_id):
+    deletion.delete_user(user_id)
+
+
+@job('author_stats', batch=True)
+def author_stats(payloads):
+    stats.apply(payloads)
+
+
+@job('co_subscriptions', batch=True)
+def co_subscriptions(payloads):
+    recommendations.apply(payloads)
@@ -1,8 +1,44 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.http import StreamingHttpResponse
+from django.core.signals import request_started, request_finished
+from django.db import NotSupportedError, close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.core.cache import cache
+from django.utils import timezone
+from django.db.models import F
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from articles_app.models import Article
+from articles_app.events import get_broker
+from articles_app.models import Job, AuthorDailyStats, CoSubscription, PopularArticle
+from articles_app.pagination import EstimatedCountPaginator
+from articles_app.search import PostgresSearchEngine
+from articles_app import caching, compression, deletion, jobs, partitions
+from articles_app.checks import check_shared_cache
+from articles_app.deletion import get_status_token
+from articles_app.counters import ViewCounter, add_views, refresh_popular, view_counter
+from articles_app.middleware import CompressionMiddleware, db_latency
+from articles_app.throttling import cache_buckets, local_buckets
+from articles_app.sharding import Subscription, delete_user_replicas, shard_for_author, subscribe
+from articles_app.profiling import get_profile_store
+from articles_app.slow_queries import normalize, slow_query_log
+from liis_test_task.handlers import WSGIDispatcher
+from articles_app.streams import article_stream
+from articles_app.urls import urlpatterns
+from collections import Counter
+from datetime import timedelta
+import asyncio
+import io
+import json
 import base64
+import os
+import tempfile
+import gzip
+import threading
+import time
+import zlib
+from unittest import mock, skipUnless
 
 ## users
 # create
@@ -15,6 +51,7 @@ import base64
 #     always allowed
 # retrieve
 #     always allowed
+#     ?ids= on list returns several users and reports missing ids
 # update, partial_update
 #     update user can only himself
 #     user cannot update their role
@@ -22,16 +59,42 @@ import base64
 #     updated email and password must be valid
 # destroy
 #     user can delete only himself
+#     in batched mode user is deactivated and deleted by a background job
+#     deletion status can read only the user, with the token of the status URL, and admins
+# stats
+#     stats can read only the author himself
+#     stats are updated as articles and subscriptions change
+#     backfill recomputes article stats
+# recommendations
+#     authors are ranked by common subscribers, read by one query
+#     counts follow subscribe, unsubscribe and user deletion
+#     rebuild recomputes counts from subscriptions
 # subscribe
 #     subscribe can only authenticated user
 #     subscribe can only user with role "subscriber"
 #     subscribe can only to user with role "author"
 #     user can subscribe only to author not from user subscriptions
+#     concurrent requests subscribe once, the others are forbidden
 # unsubscribe
 #     unsubscribe can only subscribed user
 #     unsubscribe can only user with role "subscriber"
 #     unsubscribe can only from user with role "author"
 #     user can unsubscribe only from author that user already subscribe
+#     concurrent requests unsubscribe once, the others are forbidden
+# sharding
+#     articles and subscriptions are stored on the shard of their author
+#     list gathers articles of all shards in creation order
+#     article ids are unique across shards
+#     users list their articles and subscribers from their own shard
+#     search ranks and pages matches of all shards
+#     batched user deletion removes the rows of the shards
+# throttling
+#     every client draws from a token bucket, expensive actions cost more
+#     batch retrieval is charged per id
+#     failed logins drain the bucket of the address before passwords are hashed
+#     the stream throttles failed logins like the API
+#     contended shared buckets deny rather than allow
+#     overloaded workers shed requests with 503
 
 ## articles
 # create
@@ -40,20 +103,62 @@ import base64
 # retrieve, list
 #     not authenticated user can read only public articles
 #     authenticated users can read public articles and articles from subscriptions
+#     list can be bounded by creation time
+#     ?ids= returns the permitted articles and reports missing and forbidden ids
+#     retrieved articles and subscriptions are cached until they change
+#     values computed before an invalidation are not served after it
+#     warm_caches fills caches of top authors, recent articles and active feeds
 # update, partial_update
 #     update article can only article author
 #     article must be with correct author
+#     If-Match with an outdated ETag is rejected
+#     of concurrent updates of one version only the first succeeds
 # destroy
 #     delete article can only article author
+# compression
+#     long texts are stored compressed and read back unchanged
+#     texts are decompressed only when accessed
+#     repack converts stored texts when the setting changes
+# stream
+#     stream only for authenticated users
+#     missed articles from subscriptions are replayed after Last-Event-ID
+#     only new articles from subscriptions are pushed
+# popular
+#     retrieved articles are counted and ranked by views
+#     views of a quiet worker are flushed after one interval
+#     popular applies the same visibility rules as list
+#     a failed flush changes no view counts, its retry applies them once
+# search
+#     search query is required
+#     search applies the same visibility rules as list
+#     search results are ranked and paginated
+#     compressed texts are searched
+
+## performance
+#     every route keeps a constant query count as data grows
+#     response time grows at most linearly with data
+#     large responses are compressed in an encoding the client accepts
+#     streams are compressed chunk by chunk
+#     cached articles are compressed once
 
 
 User = get_user_model()
 
+def encode_credentials(email, password):
+    return f'Basic {base64.b64encode(f"{email}:{password}".encode()).decode()}'
+
 
 class ViewsTest(TestCase):
+    def tearDown(self):
+        # Views left in the process-wide counter would be flushed at exit.
+        view_counter.drain()
+        cache.clear()
+
     def encode_credentials(self, email, password):
-        return f'Basic {base64.b64encode(f"{email}:{password}".encode()).decode()}'
+        return encode_credentials(email, password)
 
+
+class UserViewsTest(ViewsTest):
     def test_users_create(self):
         client = Client()
 
@@ -136,8 +241,6 @@ class ViewsTest(TestCase):
         # created user with role "subscriber"
         self.assertEqual(User.objects.get(email=email_5).role, User.SUBSCRIBER)
 
-        User.objects.all().delete()
-
     def test_users_update(self):
         client = Client()
         password = 'testpassword123'
@@ -238,8 +341,6 @@ class ViewsTest(TestCase):
         # invalid email -> bad request
         self.assertEqual(response.status_code, 400)
 
-        User.objects.all().delete()
-
     def test_users_delete(self):
         client = Client()
         password = 'testpassword123'
@@ -278,8 +379,389 @@ class ViewsTest(TestCase):
         # delete himself -> no content
         self.assertEqual(response.status_code, 204)
 
-        User.objects.all().delete()
+    @override_settings(ARTICLES_USER_DELETION_MODE='batched', ARTICLES_DELETION_BATCH_SIZE=2)
+    def test_users_delete_batched(self):
+        client = Client()
+        password = 'testpassword123'
+
+        email = 'test@test.com'
+        user = User.objects.create(
+            email=email, password=password,
+            role=User.AUTHOR
+        )
+        email_1 = '1test@test.com'
+        user_1 = User.objects.create(
+            email=email_1, password=password,
+            role=User.AUTHOR
+        )
+        user.subscribers.add(user_1)
+        user_1.subscribers.add(user)
+        for _ in range(5):
+            Article.objects.create(
+                author=user, title='test_title',
+                text='test_text', public=True
+            )
+
+        ## batched deletion returns immediately
+        response = client.delete(
+            reverse('articles_app:users-detail', kwargs={'pk': user.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email, password)
+        )
+        # scheduled -> accepted, user deactivated
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(User.objects.get(pk=user.pk).is_active)
+        status_url = response.data['status']
+        response = client.get(status_url)
+        self.assertEqual(response.data['status'], 'pending')
+
+        ## deletion status can read only the user, with the token of the status URL, and admins
+        response = client.get(reverse('articles_app:users-deletion', kwargs={'pk': user.pk}))
+        # without token -> unauthorised
+        self.assertEqual(response.status_code, 401)
+        response = client.get(
+            reverse('articles_app:users-deletion', kwargs={'pk': user_1.pk}),
+            {'token': status_url.partition('token=')[2]}
+        )
+        # token of another user -> unauthorised
+        self.assertEqual(response.status_code, 401)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.work(batch_size=10)
+
+        ## background job removes user, articles and subscriptions
+        response = client.get(status_url)
+        self.assertEqual(response.data['status'], 'done')
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertFalse(Article.objects.filter(author_id=user.pk).exists())
+        self.assertFalse(user_1.subscribers.exists())
+        # removed subscription -> counted as lost by its author
+        jobs.work(batch_size=10)
+        self.assertEqual(AuthorDailyStats.objects.get(author=user_1).subscribers_lost, 1)
+
+        response = client.get(
+            reverse('articles_app:users-deletion', kwargs={'pk': user_1.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
+        )
+        # not scheduled -> not found
+        self.assertEqual(response.status_code, 404)
+
+    def test_users_password_upgrade(self):
+        client = Client()
+        password = 'testpassword123'
+
+        email = 'test@test.com'
+        user = User.objects.create(
+            email=email, password=password
+        )
+
+        ## hashes from other hashers are upgraded on successful login
+        with self.settings(
+            PASSWORD_HASHERS=[
+                'articles_app.hashers.PBKDF2PasswordHasher',
+                'django.contrib.auth.hashers.MD5PasswordHasher'
+            ],
+            PASSWORD_PBKDF2_ITERATIONS=1000
+        ):
+            response = client.get(
+                reverse('articles_app:users-detail', kwargs={'pk': user.pk}),
+                HTTP_AUTHORIZATION=self.encode_credentials(email, 'wrongpassword123')
+            )
+            # wrong password -> not upgraded
+            self.assertEqual(response.status_code, 401)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('md5$'))
+
+            response = client.get(
+                reverse('articles_app:users-detail', kwargs={'pk': user.pk}),
+                HTTP_AUTHORIZATION=self.encode_credentials(email, password)
+            )
+            # correct password -> upgraded to preferred hasher
+            self.assertEqual(response.status_code, 200)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+    @override_settings(ARTICLES_JOBS_EAGER=True)
+    def test_users_stats(self):
+        client = Client()
+        password = 'testpassword123'
+
+        email = 'test@test.com'
+        user = User.objects.create(
+            email=email, password=password,
+            role=User.AUTHOR
+        )
+        email_1 = '1test@test.com'
+        User.objects.create(
+            email=email_1, password=password
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Article.objects.create(
+                author=user, title='test_title',
+                text='test_text', public=True
+            )
+            article = Article.objects.create(
+                author=user, title='test_title',
+                text='test_text', public=True
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            article = Article.objects.get(pk=article.pk)
+            article.public = False
+            article.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            client.get(
+                reverse('articles_app:users-subscribe', kwargs={'pk': user.pk}),
+                HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
+            )
+
+        ## stats can read only the author himself
+        response = client.get(
+            reverse('articles_app:users-stats', kwargs={'pk': user.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
+        )
+        # other user -> forbidden
+        self.assertEqual(response.status_code, 403)
+
+        ## stats are updated as articles and subscriptions change
+        response = client.get(
+            reverse('articles_app:users-stats', kwargs={'pk': user.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email, password)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{
+            'day': timezone.localdate().isoformat(), 'articles': 2,
+            'public_articles': 1, 'private_articles': 1,
+            'subscribers_gained': 1, 'subscribers_lost': 0
+        }])
+
+        ## backfill recomputes article stats
+        AuthorDailyStats.objects.update(articles=0, public_articles=0)
+        call_command('backfill_author_stats', stdout=open(os.devnull, 'w'))
+        stats = AuthorDailyStats.objects.get(author=user)
+        self.assertEqual((stats.articles, stats.public_articles), (2, 1))
+
+    @override_settings(ARTICLES_JOBS_EAGER=True)
+    def test_users_recommendations(self):
+        client = Client()
+        password = 'testpassword123'
+
+        authors = [
+            User.objects.create(email=f'{i}author@test.com', password=password, role=User.AUTHOR)
+            for i in range(3)
+        ]
+        subscribers = [
+            User.objects.create(email=f'{i}subscriber@test.com', password=password)
+            for i in range(2)
+        ]
+
+        def call(name, author, subscriber):
+            with self.captureOnCommitCallbacks(execute=True):
+                return client.get(
+                    reverse(f'articles_app:users-{name}', kwargs={'pk': author.pk}),
+                    HTTP_AUTHORIZATION=self.encode_credentials(subscriber.email, password)
+                )
+
+        def recommendations(author):
+            with self.assertNumQueries(1):
+                response = client.get(
+                    reverse('articles_app:users-recommendations', kwargs={'pk': author.pk})
+                )
+            self.assertEqual(response.status_code, 200)
+            return [(item['id'], item['subscribers']) for item in response.data]
+
+        for author in authors:
+            call('subscribe', author, subscribers[0])
+        for author in authors[:2]:
+            call('subscribe', author, subscribers[1])
+
+        ## authors are ranked by common subscribers, read by one query
+        self.assertEqual(recommendations(authors[0]), [(authors[1].pk, 2), (authors[2].pk, 1)])
+        self.assertEqual(recommendations(authors[2]), [(authors[0].pk, 1), (authors[1].pk, 1)])
+
+        ## counts follow subscribe, unsubscribe and user deletion
+        call('unsubscribe', authors[1], subscribers[1])
+        # one common subscriber less
+        self.assertEqual(recommendations(authors[0]), [(authors[1].pk, 1), (authors[2].pk, 1)])
+
+        ## rebuild recomputes counts from subscriptions
+        CoSubscription.objects.update(subscribers=5)
+        call_command('rebuild_recommendations', stdout=open(os.devnull, 'w'))
+        self.assertEqual(recommendations(authors[0]), [(authors[1].pk, 1), (authors[2].pk, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subscribers[0].delete()
+        # last common subscriber deleted -> no recommendations
+        self.assertEqual(recommendations(authors[0]), [])
+        self.assertFalse(CoSubscription.objects.exists())
+
+    def test_subscribe(self):
+        client = Client()
+        password = 'testpassword123'
+
+        email = 'test@test.com'
+        email_1 = '1test@test.com'
+        user = User.objects.create(
+            email=email, password=password,
+            role=User.AUTHOR
+        )
+        user_1 = User.objects.create(
+            email=email_1, password=password,
+            role=User.SUBSCRIBER
+        )
+
+        ## subscribe only for authenticated users
+        response = client.get(
+            reverse('articles_app:users-subscribe', kwargs={'pk': user.pk}),
+        )
+        # without credentials -> unauthorised
+        self.assertEqual(response.status_code, 401)
+
+        response = client.get(
+            reverse('articles_app:users-subscribe', kwargs={'pk': user.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
+        )
+        # authenticated -> success
+        self.assertEqual(response.status_code, 200)
 
+        ## can subscribe user only with role "subscriber"
+        email_2 = '2test@test.com'
+        user_2 = User.objects.create(
+            email=email_2, password=password,
+            role=User.AUTHOR
+        )
+        response = client.get(
+            reverse('articles_app:users-subscribe', kwargs={'pk': user_2.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(user, password)
+        )
+        # user with role "subscriber" -> forbidden
+        self.assertEqual(response.status_code, 403)
+
+        ## can subscribe only to user with role "author"
+        email_3 = '3test@test.com'
+        user_3 = User.objects.create(
+            email=email_3, password=password,
+            role=User.SUBSCRIBER
+        )
+        response = client.get(
+            reverse('articles_app:users-subscribe', kwargs={'pk': user_1.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email_3, password)
+        )
+        # both users with role "subscriber" -> forbidden
+        self.assertEqual(response.status_code, 403)
+
+        ## can subscribe only if not subscribed yet
+        email_4 = '4test@test.com'
+        user_4 = User.objects.create(
+            email=email_4, password=password,
+            role=User.AUTHOR
+        )
+        email_5 = '5test@test.com'
+        user_5 = User.objects.create(
+            email=email_5, password=password,
+            role=User.SUBSCRIBER
+        )
+        user_4.subscribers.add(user_5)
+        response = client.get(
+            reverse('articles_app:users-subscribe', kwargs={'pk': user_4.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email_5, password)
+        )
+        # user already subscribed -> forbidden
+        self.assertEqual(response.status_code, 403)
+
+    def test_unsubscribe(self):
+        client = Client()
+        password = 'testpassword123'
+
+        email = 'test@test.com'
+        email_1 = '1test@test.com'
+        user = User.objects.create(
+            email=email, password=password,
+            role=User.AUTHOR
+        )
+        user_1 = User.objects.create(
+            email=email_1, password=password,
+            role=User.SUBSCRIBER
+        )
+        user.subscribers.add(user_1)
+
+        ## unsubscribe only for authenticated users / unsubscribe can only subscribed user
+        response = client.get(
+            reverse('articles_app:users-unsubscribe', kwargs={'pk': user.pk}),
+        )
+        # without credentials -> unauthorised
+        self.assertEqual(response.status_code, 401)
+
+        response = client.get(
+            reverse('articles_app:users-unsubscribe', kwargs={'pk': user.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
+        )
+        # authenticated / already subscribed -> success
+        self.assertEqual(response.status_code, 200)
+
+        response = client.get(
+            reverse('articles_app:users-unsubscribe', kwargs={'pk': user.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
+        )
+        # not subscribed already -> forbidden
+        self.assertEqual(response.status_code, 403)
+
+        ## cant unsubscribe from user whith role "subscriber"
+        email_2 = '2test@test.com'
+        user_2 = User.objects.create(
+            email=email_2, password=password,
+            role=User.SUBSCRIBER
+        )
+        email_3 = '3test@test.com'
+        user_3 = User.objects.create(
+            email=email_3, password=password,
+            role=User.SUBSCRIBER
+        )
+        response = client.get(
+            reverse('articles_app:users-unsubscribe', kwargs={'pk': user_2.pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email_3, password)
+        )
+        # both users with role "subscriber" -> forbidden
+        self.assertEqual(response.status_code, 403)
+
+        ## cant unsubscribe from user whith role "author"
+        email_4 = '4test@test.com'
+        user_5 = User.objects.create(
+            email=email_4, password=password,
+            role=User.AUTHOR
+        )
+        # user with role "author" -> forbidden
+        self.assertEqual(response.status_code, 403)
+
+    def test_users_batch_retrieve(self):
+        client = Client()
+        password = 'testpassword123'
+        users = [
+            User.objects.create(email=f'{i}test@test.com', password=password)
+            for i in range(3)
+        ]
+        missing = users[-1].pk + 1
+
+        response = client.get(
+            reverse('articles_app:users-list'),
+            data={'ids': f'{users[2].pk},{users[0].pk},{missing}'}
+        )
+        # found users in requested order, missing id reported
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['id'] for user in response.json()['results']], [users[2].pk, users[0].pk])
+        self.assertEqual(response.json()['missing'], [missing])
+        self.assertEqual(response.json()['forbidden'], [])
+
+        response = client.get(reverse('articles_app:users-list'), data={'ids': 'a,b'})
+        # not integers -> bad request
+        self.assertEqual(response.status_code, 400)
+
+        with self.settings(ARTICLES_BATCH_MAX_IDS=2):
+            response = client.get(reverse('articles_app:users-list'), data={'ids': '1,2,3'})
+        # too many ids -> bad request
+        self.assertEqual(response.status_code, 400)
+
+
+class ArticleViewsTest(ViewsTest):
     def test_articles_create(self):
         client = Client()
 
@@ -336,8 +818,6 @@ class ViewsTest(TestCase):
         )
         # wrong author -> bad request
         self.assertEqual(response.status_code, 400)
-
-        User.objects.all().delete()
         Article.objects.all().delete()
 
     def test_articles_read(self):
@@ -415,6 +895,19 @@ class ViewsTest(TestCase):
         # response articles equal correct articles
         self.assertSetEqual(response_articles, correct_articles)
 
+        ## list can be bounded by creation time
+        Article.objects.filter(pk=public_article_of_user.pk).update(created_at='2020-01-15T00:00:00Z')
+        response = client.get(
+            reverse('articles_app:articles-list'), data={'created_before': '2021-01-01'}
+        )
+        # only articles created before the bound
+        self.assertListEqual([article['id'] for article in response.data], [public_article_of_user.pk])
+        response = client.get(
+            reverse('articles_app:articles-list'), data={'created_after': 'yesterday'}
+        )
+        # invalid bound -> bad request
+        self.assertEqual(response.status_code, 400)
+
         response = client.get(
             reverse('articles_app:articles-detail', kwargs={'pk': private_article_of_user.pk}),
             HTTP_AUTHORIZATION=self.encode_credentials(email_2, password)
@@ -427,8 +920,6 @@ class ViewsTest(TestCase):
         self.assertEqual(response.status_code, 404)
         # article from subscriptions -> success
         self.assertEqual(response_1.status_code, 200)
-
-        User.objects.all().delete()
         Article.objects.all().delete()
 
     def test_articles_update(self):
@@ -470,7 +961,43 @@ class ViewsTest(TestCase):
         # wrong author -> bad request
         self.assertEqual(response.status_code, 400)
 
-        User.objects.all().delete()
+        ## If-Match with an outdated ETag is rejected
+        url = reverse('articles_app:articles-detail', kwargs={'pk': article.pk})
+        etag = client.get(url)['ETag']
+        response = client.patch(
+            url, HTTP_AUTHORIZATION=self.encode_credentials(email, password),
+            data={'title': 'new_title'}, content_type='application/json', HTTP_IF_MATCH=etag
+        )
+        # current version -> updated with a new ETag
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(client.get(url)['ETag'], response['ETag'])
+
+        response = client.patch(
+            url, HTTP_AUTHORIZATION=self.encode_credentials(email, password),
+            data={'title': 'other_title'}, content_type='application/json', HTTP_IF_MATCH=etag
+        )
+        # outdated version -> precondition failed, nothing changed
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Article.objects.get(pk=article.pk).title, 'new_title')
+
+        response = client.patch(
+            url, HTTP_AUTHORIZATION=self.encode_credentials(email, password),
+            data={'title': 'other_title'}, content_type='application/json',
+            HTTP_IF_MATCH=f'W/{client.get(url)["ETag"]}'
+        )
+        # weak form of the current version -> strong comparison fails
+        self.assertEqual(response.status_code, 412)
+
+        response = client.patch(
+            url, HTTP_AUTHORIZATION=self.encode_credentials(email, password),
+            data={'title': 'other_title'}, content_type='application/json',
+            HTTP_IF_MATCH=f'"0", {compression.encode_etag(client.get(url)["ETag"], "gzip")}'
+        )
+        # current version of a compressed response -> updated
+        self.assertEqual(response.status_code, 200)
+        view_counter.drain()
+        cache.clear()
         Article.objects.all().delete()
 
     def test_articles_delete(self):
@@ -510,140 +1037,1564 @@ class ViewsTest(TestCase):
         # correct author -> no content
         self.assertEqual(response.status_code, 204)
 
-    def test_subscribe(self):
+    @override_settings(ARTICLES_COMPRESS_TEXT=True, ARTICLES_COMPRESS_MIN_LENGTH=100)
+    def test_articles_compressed_text(self):
         client = Client()
         password = 'testpassword123'
 
         email = 'test@test.com'
-        email_1 = '1test@test.com'
+        User.objects.create(
+            email=email, password=password,
+            role=User.AUTHOR
+        )
+        author = User.objects.get(email=email)
+        text = ' '.join(['A long article body that repeats itself.'] * 50)
+
+        ## long texts are stored compressed and read back unchanged
+        response = client.post(
+            reverse('articles_app:articles-list'),
+            data={'author': author.pk, 'title': 'test_title', 'text': text, 'public': True},
+            HTTP_AUTHORIZATION=self.encode_credentials(email, password)
+        )
+        self.assertEqual(response.status_code, 201)
+        pk = response.data['id']
+        stored = Article.objects.filter(pk=pk).values('text', 'text_compressed').get()
+        # long text -> empty text column, smaller compressed copy
+        self.assertEqual(stored['text'], '')
+        self.assertLess(len(stored['text_compressed']), len(text) // 4)
+
+        response = client.get(reverse('articles_app:articles-detail', kwargs={'pk': pk}))
+        self.assertEqual(response.data['text'], text)
+        response = client.get(reverse('articles_app:articles-list'))
+        self.assertEqual(response.data[0]['text'], text)
+
+        response = client.patch(
+            reverse('articles_app:articles-detail', kwargs={'pk': pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email, password),
+            data={'title': 'new_title'}, content_type='application/json'
+        )
+        # other field updated -> text kept
+        self.assertEqual(response.data['text'], text)
+        self.assertEqual(Article.objects.get(pk=pk).text, text)
+
+        article = Article.objects.defer('text_compressed').get(pk=pk)
+        article.title = 'test_title'
+        article.save()
+        # saved with the compressed copy deferred -> text kept
+        self.assertEqual(Article.objects.get(pk=pk).text, text)
+
+        response = client.patch(
+            reverse('articles_app:articles-detail', kwargs={'pk': pk}),
+            HTTP_AUTHORIZATION=self.encode_credentials(email, password),
+            data={'text': 'short_text'}, content_type='application/json'
+        )
+        # short text -> stored raw
+        self.assertEqual(response.data['text'], 'short_text')
+        self.assertEqual(
+            Article.objects.filter(pk=pk).values_list('text', 'text_compressed').get(),
+            ('short_text', None)
+        )
+
+        ## texts are decompressed only when accessed
+        Article.objects.filter(pk=pk).update(text='', text_compressed=zlib.compress(text.encode()))
+        article = Article.objects.get(pk=pk)
+        self.assertEqual(article.__dict__['text'], '')
+        self.assertEqual(article.text, text)
+        self.assertEqual(article.__dict__['text'], text)
+
+        ## repack converts stored texts when the setting changes
+        with override_settings(ARTICLES_COMPRESS_TEXT=False):
+            call_command('repack_article_texts', stdout=open(os.devnull, 'w'))
+        self.assertEqual(
+            Article.objects.filter(pk=pk).values_list('text', 'text_compressed').get(),
+            (text, None)
+        )
+        call_command('repack_article_texts', stdout=open(os.devnull, 'w'))
+        self.assertEqual(Article.objects.filter(pk=pk).values_list('text', flat=True).get(), '')
+        self.assertEqual(Article.objects.get(pk=pk).text, text)
+
+    @override_settings(ARTICLES_VIEWS_FLUSH_INTERVAL=10)
+    def test_views_of_a_quiet_worker_are_flushed(self):
+        counter = ViewCounter()
+        with mock.patch('articles_app.counters.threading.Timer') as timer:
+            counter.increment(1)
+            counter.increment(1)
+        # one timer per interval, started by the first pending view
+        timer.assert_called_once()
+        interval, function = timer.call_args.args
+        self.assertEqual(interval, 10)
+
+        with mock.patch('articles_app.jobs.enqueue') as enqueue:
+            # no further requests -> flushed by the timer
+            function()
+        enqueue.assert_called_once_with('flush_views', counts={'1': 2})
+        self.assertIsNone(counter.timer)
+
+    @override_settings(
+        ARTICLES_JOBS_EAGER=True, ARTICLES_VIEWS_FLUSH_INTERVAL=0,
+        ARTICLES_POPULAR_SIZE=2
+    )
+    def test_articles_popular(self):
+        client = Client()
+
+        password = 'testpassword123'
+
+        email = 'test@test.com'
         user = User.objects.create(
             email=email, password=password,
             role=User.AUTHOR
         )
+        articles = [
+            Article.objects.create(
+                author=user, title='test_title',
+                text='test_text', public=True
+            )
+            for _ in range(3)
+        ]
+        private_article = Article.objects.create(
+            author=user, title='test_title',
+            text='test_text', public=False
+        )
+        email_1 = '1test@test.com'
         user_1 = User.objects.create(
-            email=email_1, password=password,
-            role=User.SUBSCRIBER
+            email=email_1, password=password
         )
+        user.subscribers.add(user_1)
 
-        ## subscribe only for authenticated users
-        response = client.get(
-            reverse('articles_app:users-subscribe', kwargs={'pk': user.pk}),
+        ## retrieved articles are counted and ranked by views
+        for article, views in zip(articles, (1, 3, 2)):
+            for _ in range(views):
+                client.get(reverse('articles_app:articles-detail', kwargs={'pk': article.pk}))
+        Article.objects.filter(pk=private_article.pk).update(views=10)
+        refresh_popular([private_article.pk])
+
+        self.assertEqual(Article.objects.get(pk=articles[1].pk).views, 3)
+        response = client.get(reverse('articles_app:articles-popular'))
+        # private article not from subscriptions excluded, least viewed out of the top
+        self.assertListEqual(
+            [article['id'] for article in response.data],
+            [articles[1].pk]
         )
-        # without credentials -> unauthorised
-        self.assertEqual(response.status_code, 401)
 
         response = client.get(
-            reverse('articles_app:users-subscribe', kwargs={'pk': user.pk}),
+            reverse('articles_app:articles-popular'),
             HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
         )
-        # authenticated -> success
-        self.assertEqual(response.status_code, 200)
+        # private article from subscriptions included
+        self.assertListEqual(
+            [article['id'] for article in response.data],
+            [private_article.pk, articles[1].pk]
+        )
 
-        ## can subscribe user only with role "subscriber"
-        email_2 = '2test@test.com'
-        user_2 = User.objects.create(
-            email=email_2, password=password,
+        ## a failed flush changes no view counts, its retry applies them once
+        with mock.patch('articles_app.counters.refresh_popular', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                add_views({articles[0].pk: 5})
+        self.assertEqual(Article.objects.get(pk=articles[0].pk).views, 1)
+        add_views({articles[0].pk: 5})
+        self.assertEqual(Article.objects.get(pk=articles[0].pk).views, 6)
+
+    def test_articles_search(self):
+        client = Client()
+
+        password = 'testpassword123'
+
+        email = 'test@test.com'
+        user = User.objects.create(
+            email=email, password=password,
             role=User.AUTHOR
         )
-        response = client.get(
-            reverse('articles_app:users-subscribe', kwargs={'pk': user_2.pk}),
-            HTTP_AUTHORIZATION=self.encode_credentials(user, password)
+        email_1 = '1test@test.com'
+        User.objects.create(
+            email=email_1, password=password
         )
-        # user with role "subscriber" -> forbidden
-        self.assertEqual(response.status_code, 403)
 
-        ## can subscribe only to user with role "author"
-        email_3 = '3test@test.com'
-        user_3 = User.objects.create(
-            email=email_3, password=password,
-            role=User.SUBSCRIBER
+        title_match = Article.objects.create(
+            author=user, title='python tips',
+            text='test_text', public=True
         )
-        response = client.get(
-            reverse('articles_app:users-subscribe', kwargs={'pk': user_1.pk}),
-            HTTP_AUTHORIZATION=self.encode_credentials(email_3, password)
+        text_match = Article.objects.create(
+            author=user, title='test_title',
+            text='notes about python', public=True
         )
-        # both users with role "subscriber" -> forbidden
-        self.assertEqual(response.status_code, 403)
-
-        ## can subscribe only if not subscribed yet
-        email_4 = '4test@test.com'
-        user_4 = User.objects.create(
-            email=email_4, password=password,
-            role=User.AUTHOR
+        private_match = Article.objects.create(
+            author=user, title='python secrets',
+            text='test_text', public=False
         )
-        email_5 = '5test@test.com'
-        user_5 = User.objects.create(
-            email=email_5, password=password,
-            role=User.SUBSCRIBER
+        Article.objects.create(
+            author=user, title='test_title',
+            text='test_text', public=True
         )
-        user_4.subscribers.add(user_5)
+
+        ## search query is required
+        response = client.get(reverse('articles_app:articles-search'))
+        # without query -> bad request
+        self.assertEqual(response.status_code, 400)
+
+        ## search applies visibility rules and ranks title matches first
         response = client.get(
-            reverse('articles_app:users-subscribe', kwargs={'pk': user_4.pk}),
-            HTTP_AUTHORIZATION=self.encode_credentials(email_5, password)
+            reverse('articles_app:articles-search'), data={'q': 'python'},
+            HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
         )
-        # user already subscribed -> forbidden
-        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        response_articles = [article['id'] for article in response.data['results']]
+        # private article not from subscriptions excluded, title match first
+        self.assertListEqual(response_articles, [title_match.pk, text_match.pk])
+        self.assertNotIn(private_match.pk, response_articles)
 
-    def test_unsubscribe(self):
+        ## search results are paginated
+        response = client.get(
+            reverse('articles_app:articles-search'),
+            data={'q': 'python', 'page_size': 1, 'page': 2}
+        )
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['id'], text_match.pk)
+
+        ## compressed texts are searched
+        with override_settings(ARTICLES_COMPRESS_TEXT=True, ARTICLES_COMPRESS_MIN_LENGTH=100):
+            compressed_match = Article.objects.create(
+                author=user, title='test_title',
+                text=' '.join(['test_text'] * 50) + ' Python', public=True
+            )
+        self.assertIsNotNone(Article.objects.get(pk=compressed_match.pk).text_compressed)
+        response = client.get(reverse('articles_app:articles-search'), data={'q': 'python'})
+        # matched in the decompressed text
+        self.assertListEqual(
+            [article['id'] for article in response.data['results']],
+            [title_match.pk, compressed_match.pk, text_match.pk]
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search of PostgreSQL')
+    @override_settings(ARTICLES_COMPRESS_TEXT=True, ARTICLES_COMPRESS_MIN_LENGTH=100)
+    def test_compressed_texts_are_indexed_in_chunks(self):
+        author = User.objects.create(email='test@test.com', password='!', role=User.AUTHOR)
+        articles = [
+            Article.objects.create(author=author, title='test_title', text=' '.join(['test_text'] * 50) + f' word{i}')
+            for i in range(3)
+        ]
+        engine = PostgresSearchEngine()
+
+        with CaptureQueriesContext(connection) as context, mock.patch.object(engine, 'CHUNK_SIZE', 2):
+            engine.index([article.pk for article in articles])
+        # plain texts -> one update, compressed texts -> one update per chunk
+        self.assertEqual(len([query for query in context.captured_queries if query['sql'].startswith('UPDATE')]), 3)
+        self.assertEqual(engine.search(Article.objects.all(), 'word1').get(), articles[1])
+
+    def test_articles_batch_retrieve(self):
         client = Client()
         password = 'testpassword123'
+        author = User.objects.create(email='test@test.com', password=password, role=User.AUTHOR)
+        other_author = User.objects.create(email='1test@test.com', password=password, role=User.AUTHOR)
+        subscriber = User.objects.create(email='2test@test.com', password=password)
+        author.subscribers.add(subscriber)
+        public = Article.objects.create(author=other_author, title='test_title', text='test_text')
+        subscribed = Article.objects.create(author=author, title='test_title', text='test_text', public=False)
+        forbidden = Article.objects.create(author=other_author, title='test_title', text='test_text', public=False)
+        missing = forbidden.pk + 1
+        ids = f'{public.pk},{subscribed.pk},{forbidden.pk},{missing}'
+
+        response = client.get(reverse('articles_app:articles-list'), data={'ids': ids})
+        # anonymous -> only public article
+        self.assertEqual([article['id'] for article in response.json()['results']], [public.pk])
+        self.assertEqual(response.json()['forbidden'], [subscribed.pk, forbidden.pk])
+        self.assertEqual(response.json()['missing'], [missing])
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(
+                reverse('articles_app:articles-list'), data={'ids': ids},
+                HTTP_AUTHORIZATION=self.encode_credentials(subscriber.email, password)
+            )
+        # subscriber -> public and subscribed articles
+        self.assertEqual(
+            [article['id'] for article in response.json()['results']], [public.pk, subscribed.pk]
+        )
+        self.assertEqual(response.json()['forbidden'], [forbidden.pk])
+        # authentication, subscriptions and articles -> three queries
+        self.assertEqual(len(context.captured_queries), 3)
+
+
+class ArticleStreamTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.password = 'testpassword123'
+        cls.author = User.objects.create(
+            email='test@test.com', password=cls.password,
+            role=User.AUTHOR
+        )
+        cls.other_author = User.objects.create(
+            email='1test@test.com', password=cls.password,
+            role=User.AUTHOR
+        )
+        cls.subscriber = User.objects.create(
+            email='2test@test.com', password=cls.password
+        )
+        cls.author.subscribers.add(cls.subscriber)
+        cls.article = Article.objects.create(
+            author=cls.author, title='test_title',
+            text='test_text', public=False
+        )
 
-        email = 'test@test.com'
-        email_1 = '1test@test.com'
-        user = User.objects.create(
-            email=email, password=password,
+    async def run_stream(self, headers, events=()):
+        disconnected = asyncio.Event()
+        messages = []
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'path': '/articles/stream/', 'headers': headers}
+        # The test's connection is in a transaction, the stream would close it.
+        with mock.patch('articles_app.streams.close_old_connections'):
+            stream = asyncio.ensure_future(article_stream(scope, receive, send))
+            for _ in range(50):
+                if messages:
+                    break
+                await asyncio.sleep(0.01)
+
+            for event in events:
+                get_broker().publish(event)
+            await asyncio.sleep(0.05)
+
+            disconnected.set()
+            await stream
+        return messages
+
+    async def test_article_stream(self):
+        ## stream only for authenticated users
+        messages = await self.run_stream([])
+        # without credentials -> unauthorised
+        self.assertEqual(messages[0]['status'], 401)
+
+        ## missed and new articles from subscriptions are pushed
+        credentials = base64.b64encode(f'{self.subscriber.email}:{self.password}'.encode())
+        messages = await self.run_stream(
+            [
+                (b'authorization', b'Basic ' + credentials),
+                (b'last-event-id', str(self.article.pk - 1).encode()),
+            ],
+            events=[
+                {'id': self.article.pk + 1, 'author': self.author.pk},
+                {'id': self.article.pk + 2, 'author': self.other_author.pk},
+            ]
+        )
+        self.assertEqual(messages[0]['status'], 200)
+        bodies = b''.join(message.get('body', b'') for message in messages[1:])
+        # missed article replayed, new article from subscription pushed
+        self.assertIn(f'id: {self.article.pk}\n'.encode(), bodies)
+        self.assertIn(f'id: {self.article.pk + 1}\n'.encode(), bodies)
+        # article from other author -> not pushed
+        self.assertNotIn(f'id: {self.article.pk + 2}\n'.encode(), bodies)
+        self.assertEqual(len(get_broker()), 0)
+
+    async def test_stream_failed_logins_are_throttled(self):
+        wrong = [(b'authorization', b'Basic ' + base64.b64encode(f'{self.subscriber.email}:wrong'.encode()))]
+        try:
+            with override_settings(
+                ARTICLES_THROTTLE_ENABLED=True, ARTICLES_THROTTLE_BURST=100,
+                ARTICLES_THROTTLE_RATE=1, ARTICLES_THROTTLE_COSTS={'login.failure': 40}
+            ):
+                for _ in range(2):
+                    messages = await self.run_stream(wrong)
+                    # failures within burst -> unauthorised
+                    self.assertEqual(messages[0]['status'], 401)
+
+                messages = await self.run_stream(wrong)
+                # bucket of the address drained -> too many requests
+                self.assertEqual(messages[0]['status'], 429)
+                self.assertIn(b'retry-after', dict(messages[0]['headers']))
+        finally:
+            local_buckets.clear()
+
+
+class JobsTest(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs.job('test_batch', batch=True, max_attempts=2)(self.calls.append)
+
+    def tearDown(self):
+        jobs.registry.pop('test_batch')
+
+    def test_like_jobs_run_in_one_batch(self):
+        jobs.enqueue('test_batch', value=1)
+        jobs.enqueue('test_batch', value=2)
+
+        self.assertEqual(jobs.work(batch_size=10), 2)
+        # like jobs -> single handler call with both payloads
+        self.assertEqual(self.calls, [[{'value': 1}, {'value': 2}]])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
+        # nothing left -> nothing claimed
+        self.assertEqual(jobs.work(batch_size=10), 0)
+
+    def test_failed_jobs_are_retried(self):
+        def fail(payloads):
+            raise RuntimeError('boom')
+
+        jobs.job('test_batch', batch=True, max_attempts=2)(fail)
+        job = jobs.enqueue('test_batch', value=1)
+
+        with self.assertLogs('articles_app.jobs', 'ERROR'):
+            jobs.work(batch_size=10)
+        job.refresh_from_db()
+        # first failure -> pending with a later run time
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(jobs.work(batch_size=10), 0)
+
+        Job.objects.update(run_at=job.created_at)
+        with self.assertLogs('articles_app.jobs', 'ERROR'):
+            jobs.work(batch_size=10)
+        job.refresh_from_db()
+        # attempts exhausted -> failed
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_failed_jobs_roll_back(self):
+        def fail(payloads):
+            User.objects.create(email='job@test.com', password='!')
+            raise RuntimeError('boom')
+
+        jobs.job('test_batch', batch=True, max_attempts=2)(fail)
+        jobs.enqueue('test_batch', value=1)
+
+        with self.assertLogs('articles_app.jobs', 'ERROR'):
+            jobs.work(batch_size=10)
+        # writes of the failed attempt -> rolled back, a retry starts over
+        self.assertFalse(User.objects.filter(email='job@test.com').exists())
+
+    def test_jobs_claimed_again_are_left_to_the_new_owner(self):
+        job = jobs.enqueue('test_batch', value=1)
+        claimed = jobs.claim(batch_size=10)
+        # lease expired and claimed by another worker meanwhile
+        Job.objects.update(attempts=F('attempts') + 1)
+
+        with self.assertLogs('articles_app.jobs', 'WARNING'):
+            jobs.run_jobs(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+
+    def test_done_jobs_are_purged(self):
+        for value in range(3):
+            jobs.enqueue('test_batch', value=value)
+        jobs.work(batch_size=2)
+        Job.objects.filter(status=Job.DONE).update(updated_at=timezone.now() - timedelta(days=8))
+
+        # done before retention -> deleted, pending kept
+        self.assertEqual(jobs.purge(timedelta(days=7), batch_size=1), 2)
+        self.assertEqual(list(Job.objects.values_list('status', flat=True)), [Job.PENDING])
+
+
+class MiddlewareDispatchTest(TestCase):
+    def call(self, application, path):
+        result = {}
+
+        def start_response(status, headers):
+            result['status'] = status
+            result['headers'] = dict(headers)
+
+        # As the test client does, keep the test transaction connection open.
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            response = application(RequestFactory().get(path).environ, start_response)
+            response.close()
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        return result
+
+    def test_api_paths_skip_admin_middleware(self):
+        application = WSGIDispatcher()
+
+        result = self.call(application, reverse('articles_app:users-list'))
+        # api -> lean middleware, no clickjacking header
+        self.assertTrue(result['status'].startswith('200'))
+        self.assertNotIn('X-Frame-Options', result['headers'])
+        # full middleware is loaded on the first admin request
+        self.assertNotIn('full_handler', vars(application))
+
+        result = self.call(application, reverse('admin:login'))
+        # admin -> full middleware
+        self.assertTrue(result['status'].startswith('200'))
+        self.assertIn('X-Frame-Options', result['headers'])
+
+
+class RecordingCursor:
+    """
+    Cursor that records statements instead of running them, results of
+    queries are taken from rows by statement prefix.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        self.result = next((rows for prefix, rows in self.rows.items() if sql.startswith(prefix)), [])
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+class PartitionsTest(TestCase):
+    def record(self, rows, func, *args):
+        cursor = RecordingCursor(rows)
+        postgres = mock.Mock(vendor='postgresql')
+        postgres.cursor.return_value = cursor
+        postgres.ops.quote_name = lambda name: f'"{name}"'
+        with mock.patch('articles_app.partitions.connection', postgres):
+            func(*args)
+        return cursor.statements
+
+    def test_convert_moves_old_names_out_of_the_way(self):
+        table = partitions.TABLE
+        month = timezone.now().date().replace(day=1)
+        statements = self.record({
+            'SELECT 1 FROM pg_partitioned_table': [],
+            'SELECT conrelid': [('articles_app_populararticle', 'populararticle_article_id_fk')],
+            'SELECT indexrelid': [(f'{table}_pkey',), (f'{table}_sv_gin',)],
+            'SELECT coalesce(max(id)': [(11, month)],
+        }, partitions.convert, 0)
+
+        # old sequence and indexes renamed before the new ones take their names
+        self.assertEqual(statements[2:11], [
+            'ALTER TABLE articles_app_populararticle DROP CONSTRAINT populararticle_article_id_fk',
+            f'ALTER TABLE {table} RENAME TO {table}_old',
+            f'ALTER TABLE {table}_old ALTER COLUMN id DROP IDENTITY IF EXISTS',
+            f'ALTER SEQUENCE IF EXISTS {table}_id_seq RENAME TO {table}_old_id_seq',
+            'SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass ORDER BY 1',
+            f'ALTER INDEX {table}_pkey RENAME TO {table}_old_0',
+            f'ALTER INDEX {table}_sv_gin RENAME TO {table}_old_1',
+            f'SELECT coalesce(max(id), 0) + 1, min(created_at)::date FROM {table}_old',
+            f'CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)',
+        ])
+        self.assertEqual(statements[11:], [
+            f'CREATE SEQUENCE {table}_id_seq START %s OWNED BY {table}.id',
+            f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')",
+            f'ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)',
+            f'ALTER TABLE {table} ADD CONSTRAINT {table}_author_id_fk FOREIGN KEY (author_id) '
+            'REFERENCES articles_app_customuser (id) DEFERRABLE INITIALLY DEFERRED',
+            f'CREATE INDEX {table}_author_id_idx ON {table} (author_id)',
+            f'CREATE INDEX {table}_created_at_idx ON {table} (created_at)',
+            f'CREATE INDEX {table}_sv_gin ON {table} USING gin (search_vector)',
+            f'CREATE TABLE IF NOT EXISTS {partitions.partition_name(month)} PARTITION OF {table} '
+            'FOR VALUES FROM (%s) TO (%s)',
+            f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT',
+            f'INSERT INTO {table} SELECT * FROM {table}_old',
+            f'DROP TABLE {table}_old',
+        ])
+
+    def test_archive_schema_is_quoted(self):
+        old = partitions.partition_name(partitions.add_months(timezone.now().date(), -3))
+        statements = self.record(
+            {'SELECT c.relname': [(old,)]}, partitions.detach_old_partitions, 1, 'archive; DROP TABLE x'
+        )
+        self.assertEqual(statements[0], 'CREATE SCHEMA IF NOT EXISTS "archive; DROP TABLE x"')
+        self.assertEqual(statements[-1], f'ALTER TABLE {old} SET SCHEMA "archive; DROP TABLE x"')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Partitioning is PostgreSQL only.')
+    def test_convert(self):
+        author = User.objects.create(email='author@test.com', password='!', role=User.AUTHOR)
+        article = Article.objects.create(author=author, title='test_title', text='test_text')
+        PopularArticle.objects.create(article=article, views=1)
+
+        self.assertTrue(partitions.convert())
+        # rows copied, new ids continue after the old ones
+        self.assertEqual(Article.objects.get().title, 'test_title')
+        self.assertGreater(Article.objects.create(author=author, title='new', text='new').pk, article.pk)
+        # estimate summed over partitions
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {partitions.TABLE}')
+        paginator = EstimatedCountPaginator(Article.objects.all(), 10)
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1):
+            self.assertEqual(paginator.count, 2)
+
+
+class AdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@test.com', username='admin', password='testpassword123'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def count_queries(self, url):
+        # Warm per-process caches such as content types.
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def create_articles(self, count):
+        author = User.objects.create(
+            email=f'{count}test@test.com', password='testpassword123',
             role=User.AUTHOR
         )
-        user_1 = User.objects.create(
-            email=email_1, password=password,
-            role=User.SUBSCRIBER
+        Article.objects.bulk_create([
+            Article(author=author, title='test_title', text='test_text')
+            for _ in range(count)
+        ])
+        return author
+
+    def test_article_changelist_query_count(self):
+        url = reverse('admin:articles_app_article_changelist')
+
+        self.create_articles(2)
+        queries = self.count_queries(url)
+        self.create_articles(20)
+        # authors are selected with articles -> query count does not grow
+        self.assertEqual(self.count_queries(url), queries)
+
+    def test_user_pages_query_count(self):
+        author = self.create_articles(1)
+        change_url = reverse('admin:articles_app_customuser_change', args=[author.pk])
+        changelist_url = reverse('admin:articles_app_customuser_changelist')
+
+        subscribers = [
+            User.objects.create(email=f'{i}subscriber@test.com', password='testpassword123')
+            for i in range(2)
+        ]
+        author.subscribers.add(*subscribers)
+        change_queries = self.count_queries(change_url)
+        changelist_queries = self.count_queries(changelist_url)
+
+        subscribers = [
+            User.objects.create(email=f'{i}subscriber@test.com', password='testpassword123')
+            for i in range(2, 20)
+        ]
+        author.subscribers.add(*subscribers)
+        # subscribers widget does not load every user -> query count does not grow
+        self.assertEqual(self.count_queries(change_url), change_queries)
+        self.assertEqual(self.count_queries(changelist_url), changelist_queries)
+
+        User.objects.create(email='other@test.com', password='testpassword123')
+        response = self.client.get(change_url)
+        # only selected subscribers are rendered
+        self.assertContains(response, '19subscriber@test.com')
+        self.assertNotContains(response, 'other@test.com')
+
+
+class ProfilingTest(TestCase):
+    @override_settings(ARTICLES_PROFILER_TOKEN='profiler-token')
+    def test_staff_requests_are_profiled(self):
+        client = Client()
+        password = 'testpassword123'
+        staff = User.objects.create_superuser(
+            email='admin@test.com', username='admin', password=password
+        )
+
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(ARTICLES_PROFILER_DIR=directory):
+            store = get_profile_store()
+
+            with mock.patch('cProfile.Profile') as profile:
+                response = client.get(reverse('articles_app:users-list'), HTTP_X_PROFILE='1')
+                response = client.get(
+                    reverse('articles_app:users-list'), data={'profile': 1},
+                    HTTP_AUTHORIZATION=encode_credentials(staff.email, password)
+                )
+            # wrong token, no staff session -> profiler not even started
+            self.assertFalse(profile.called)
+            self.assertNotIn('X-Profile-Id', response)
+            self.assertEqual(store.list(), [])
+
+            response = client.get(reverse('articles_app:users-list'), HTTP_X_PROFILE='profiler-token')
+            # token -> profile with queries stored
+            self.assertEqual(store.list(), [response['X-Profile-Id']])
+            meta, stats = store.load(response['X-Profile-Id'])
+            self.assertTrue(meta['queries'])
+            self.assertTrue(stats.total_calls)
+
+            client.force_login(staff)
+            response = client.get(reverse('articles_app:users-list'), data={'profile': 1})
+            # staff session -> profiled
+            self.assertIn(response['X-Profile-Id'], store.list())
+
+            out = io.StringIO()
+            call_command('profiles', response['X-Profile-Id'], stdout=out)
+            self.assertIn('queries, slowest first', out.getvalue())
+
+
+class SlowQueryLogTest(TestCase):
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE a = 'x' AND b IN (%s, %s,  %s) LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? AND b IN (?...) LIMIT ?'
+        )
+
+    @override_settings(ARTICLES_SLOW_QUERY_THRESHOLD=0)
+    def test_slow_queries_are_aggregated_by_view(self):
+        client = Client()
+        slow_query_log.entries.clear()
+        user = User.objects.create(email='test@test.com', password='testpassword123')
+
+        for _ in range(2):
+            with self.assertLogs('articles_app.slow_queries', 'INFO'):
+                client.get(
+                    reverse('articles_app:articles-list'),
+                    HTTP_AUTHORIZATION=encode_credentials(user.email, 'testpassword123')
+                )
+
+        entries = [
+            entry for entry in slow_query_log.top(limit=100)
+            if 'FROM "articles_app_article"' in entry['sql']
+        ]
+        # same list query from both requests -> one entry
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['count'], 2)
+        self.assertEqual(entries[0]['views'], {'ArticleViewSet.list': 2})
+
+
+class MetricsTest(TestCase):
+    def test_metrics(self):
+        client = Client()
+        client.get(reverse('articles_app:users-list'))
+        client.get(
+            reverse('articles_app:users-list'),
+            HTTP_AUTHORIZATION=encode_credentials('test@test.com', 'wrongpassword123')
+        )
+
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(ARTICLES_METRICS_DIR=directory, ARTICLES_METRICS_TOKEN='secret'):
+            response = client.get(reverse('articles_app:metrics'))
+            # without token -> forbidden
+            self.assertEqual(response.status_code, 403)
+
+            # snapshot of another worker process
+            with open(os.path.join(directory, '1.json'), 'w') as file:
+                json.dump({
+                    'counters': [['auth_failures_total', [], 1000]],
+                    'histograms': []
+                }, file)
+
+            response = client.get(reverse('articles_app:metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+            lines = response.content.decode().splitlines()
+
+        self.assertIn('http_requests_total{route="users/",method="GET",status="200"}', response.content.decode())
+        self.assertIn('http_request_duration_seconds_bucket{route="users/",method="GET",le="+Inf"}', response.content.decode())
+        auth_failures = [line for line in lines if line.startswith('auth_failures_total ')]
+        # failures of both processes are summed
+        self.assertGreaterEqual(int(auth_failures[0].split()[1]), 1001)
+
+
+@override_settings(ARTICLES_VIEWS_FLUSH_INTERVAL=3600)
+class QueryCountTest(TestCase):
+    """
+    Requests every route against growing datasets. Query counts must stay
+    constant and response time may grow at most linearly with the data.
+    """
+    SIZES = (10, 100, 1000)
+    # Allowed slack over linear growth of the smallest dataset timing.
+    TIME_TOLERANCE = 3
+    REPEAT = 3
+    # Subscription routes change state on GET, so they are requested once.
+    UNSAFE_ROUTES = ('users-subscribe', 'users-unsubscribe')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.password = 'testpassword123'
+        cls.author = User.objects.create(
+            email='author@test.com', password=cls.password, role=User.AUTHOR
+        )
+        cls.subscriber = User.objects.create(email='subscriber@test.com', password=cls.password)
+        # A finished deletion for the deletion status route.
+        Job.objects.create(name='delete_user', payload={'user_id': cls.author.pk}, status=Job.DONE)
+
+    def setUp(self):
+        self.client = Client()
+        self.seeded = 0
+
+    def tearDown(self):
+        view_counter.drain()
+        cache.clear()
+
+    def seed(self, size):
+        # The author gets articles and subscribers, the subscriber gets subscriptions.
+        through = User.subscribers.through
+        authors = User.objects.bulk_create([
+            User(email=f'{i}author@test.com', username=f'{i}author', password='!', role=User.AUTHOR)
+            for i in range(self.seeded, size)
+        ])
+        subscribers = User.objects.bulk_create([
+            User(email=f'{i}subscriber@test.com', username=f'{i}subscriber', password='!')
+            for i in range(self.seeded, size)
+        ])
+        articles = Article.objects.bulk_create([
+            Article(author=author, title='test_title', text='test_text', public=i % 2 == 0)
+            for i in range(self.seeded, size)
+            for author in (self.author, authors[i - self.seeded])
+        ])
+        through.objects.bulk_create(
+            [through(from_customuser=self.author, to_customuser=user) for user in subscribers] +
+            [through(from_customuser=author, to_customuser=self.subscriber) for author in authors]
+        )
+        refresh_popular([article.pk for article in articles])
+        self.seeded = size
+
+    def requests(self):
+        """
+        One (route, method, url, data, user) per request made at every size.
+        """
+        article = Article.objects.filter(author=self.author, public=True).first()
+        other_article = Article.objects.exclude(author=self.author).filter(public=False).first()
+        new_author = User.objects.create(
+            email=f'new{self.seeded}author@test.com', password=self.password, role=User.AUTHOR
+        )
+        subscribed_author = User.objects.create(
+            email=f'subscribed{self.seeded}author@test.com', password=self.password, role=User.AUTHOR
+        )
+        subscribed_author.subscribers.add(self.subscriber)
+        deleted_user = User.objects.create(email=f'deleted{self.seeded}@test.com', password=self.password)
+        deleted_article = Article.objects.create(author=self.author, title='test_title', text='test_text')
+        batch_ids = ','.join(
+            str(pk) for pk in Article.objects.exclude(author=self.author).values_list('pk', flat=True)[:20]
+        )
+
+        return [
+            ('users-list', 'get', reverse('articles_app:users-list'), None, None),
+            ('users-list', 'get', reverse('articles_app:users-list'), {'ids': batch_ids}, None),
+            ('users-list', 'post', reverse('articles_app:users-list'),
+             {'email': f'created{self.seeded}@test.com', 'password': self.password}, None),
+            ('users-detail', 'get', reverse('articles_app:users-detail', args=[self.author.pk]), None, None),
+            ('users-detail', 'patch', reverse('articles_app:users-detail', args=[self.author.pk]),
+             {'username': f'author{self.seeded}'}, self.author),
+            ('users-detail', 'delete', reverse('articles_app:users-detail', args=[deleted_user.pk]),
+             None, deleted_user),
+            ('users-deletion', 'get', reverse('articles_app:users-deletion', args=[self.author.pk]),
+             {'token': get_status_token(self.author.pk)}, None),
+            ('users-stats', 'get', reverse('articles_app:users-stats', args=[self.author.pk]), None, self.author),
+            ('users-recommendations', 'get', reverse('articles_app:users-recommendations', args=[self.author.pk]),
+             None, None),
+            ('users-subscribe', 'get', reverse('articles_app:users-subscribe', args=[new_author.pk]),
+             None, self.subscriber),
+            ('users-unsubscribe', 'get', reverse('articles_app:users-unsubscribe', args=[subscribed_author.pk]),
+             None, self.subscriber),
+            ('articles-list', 'get', reverse('articles_app:articles-list'), None, self.subscriber),
+            ('articles-list', 'get', reverse('articles_app:articles-list'), {'ids': batch_ids}, self.subscriber),
+            ('articles-list', 'post', reverse('articles_app:articles-list'),
+             {'author': self.author.pk, 'title': 'test_title', 'text': 'test_text'}, self.author),
+            ('articles-popular', 'get', reverse('articles_app:articles-popular'), None, self.subscriber),
+            ('articles-search', 'get', reverse('articles_app:articles-search'), {'q': 'test'}, self.subscriber),
+            ('articles-detail', 'get', reverse('articles_app:articles-detail', args=[other_article.pk]),
+             None, self.subscriber),
+            ('articles-detail', 'patch', reverse('articles_app:articles-detail', args=[article.pk]),
+             {'title': 'new_title'}, self.author),
+            ('articles-detail', 'delete', reverse('articles_app:articles-detail', args=[deleted_article.pk]),
+             None, self.author),
+            ('metrics', 'get', reverse('articles_app:metrics'), None, None),
+        ]
+
+    def call(self, method, url, data, user):
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = encode_credentials(user.email, self.password)
+        if method == 'patch':
+            return getattr(self.client, method)(url, data=data, content_type='application/json', **headers)
+        return getattr(self.client, method)(url, data=data, **headers)
+
+    def measure(self):
+        results = {}
+        for route, method, url, data, user in self.requests():
+            safe = method == 'get' and route not in self.UNSAFE_ROUTES
+            # Warm per-process caches such as content types.
+            if safe:
+                self.call(method, url, data, user)
+
+            elapsed = []
+            for _ in range(self.REPEAT if safe else 1):
+                # The query log is bounded, a full log would hide captured queries.
+                connection.queries_log.clear()
+                # Uncached reads are the ones that grow with data.
+                cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    response = self.call(method, url, data, user)
+                    elapsed.append(time.perf_counter() - start)
+            self.assertLess(response.status_code, 300, f'{method.upper()} {url}: {response.status_code}')
+            params = ','.join(sorted(data)) if method == 'get' and data else ''
+            results[route, method, params] = (context.captured_queries, min(elapsed))
+        return results
+
+    def growth(self, small, large):
+        counts = Counter(normalize(query['sql']) for query in large)
+        counts.subtract(normalize(query['sql']) for query in small)
+        return '\n'.join(
+            f'{count:+d} x {sql}' for sql, count in counts.most_common() if count
+        )
+
+    def test_queries_do_not_grow_with_data(self):
+        results = {}
+        for size in self.SIZES:
+            self.seed(size)
+            results[size] = self.measure()
+
+        # every route is covered
+        self.assertEqual(
+            {route for route, method, params in results[self.SIZES[0]]},
+            {pattern.name for pattern in urlpatterns}
+        )
+
+        smallest = self.SIZES[0]
+        for route, method, params in results[smallest]:
+            queries, elapsed = results[smallest][route, method, params]
+            for size in self.SIZES[1:]:
+                with self.subTest(route=route, method=method, params=params, size=size):
+                    size_queries, size_elapsed = results[size][route, method, params]
+                    # more rows -> same queries
+                    self.assertEqual(
+                        len(size_queries), len(queries),
+                        f'{len(queries)} queries at {smallest} rows, '
+                        f'{len(size_queries)} at {size} rows:\n{self.growth(queries, size_queries)}'
+                    )
+                    # more rows -> at most linearly slower
+                    self.assertLessEqual(
+                        size_elapsed, elapsed * size / smallest * self.TIME_TOLERANCE,
+                        f'{elapsed * 1000:.1f} ms at {smallest} rows, {size_elapsed * 1000:.1f} ms at {size} rows'
+                    )
+
+
+class CachingTest(TestCase):
+    def tearDown(self):
+        view_counter.drain()
+        cache.clear()
+
+    def test_concurrent_misses_share_one_computation(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(caching.flights.do('key', compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # five concurrent callers -> one computation, shared result
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    @override_settings(ARTICLES_CACHE_TTL=0)
+    def test_stale_entries_are_refreshed_by_one_request(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        # miss -> computed
+        self.assertEqual(caching.get_or_compute('test', 'key', compute), 1)
+        # stale -> refreshed
+        self.assertEqual(caching.get_or_compute('test', 'key', compute), 2)
+
+        caching.acquire('key')
+        # stale while another request refreshes -> stale value served
+        self.assertEqual(caching.get_or_compute('test', 'key', compute), 2)
+        self.assertEqual(len(calls), 2)
+
+    @override_settings(ARTICLES_CACHE_SHARED_LOCK=True)
+    def test_misses_wait_for_other_processes(self):
+        caching.acquire('key')
+        # another process fills the entry while holding the lock
+        threading.Timer(0.05, caching.store, args=('key', 'value')).start()
+
+        # lock held -> entry of the other process, nothing computed
+        self.assertEqual(caching.get_or_compute('test', 'key', lambda: 'computed'), 'value')
+
+    def test_values_computed_before_invalidation_are_ignored(self):
+        def compute():
+            # invalidated by a write while the old value is being computed
+            caching.invalidate(['key'])
+            return 'old'
+
+        self.assertEqual(caching.get_or_compute('test', 'key', compute), 'old')
+        # entry of the older generation -> computed again
+        self.assertEqual(caching.get_or_compute('test', 'key', lambda: 'new'), 'new')
+        self.assertEqual(caching.get_or_compute('test', 'key', lambda: 'newer'), 'new')
+
+        author = User.objects.create(email='test@test.com', password='!', role=User.AUTHOR)
+        article = Article.objects.create(author=author, title='test_title', text='test_text')
+        scatter = caching.sharding.scatter
+
+        def scatter_then_invalidate(queryset):
+            rows = scatter(queryset)
+            caching.invalidate_articles([article.pk])
+            return rows
+
+        with mock.patch('articles_app.caching.sharding.scatter', scatter_then_invalidate):
+            self.assertEqual(caching.warm_articles([article.pk]), 1)
+        # warmed under the older generation -> not served
+        with CaptureQueriesContext(connection) as context:
+            caching.get_article_data(article.pk)
+        self.assertEqual(len(context.captured_queries), 1)
+
+    @override_settings(ARTICLES_CACHE_ALLOW_LOCAL=False)
+    def test_local_cache_holds_no_changing_values(self):
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)
+
+        # per process cache -> invalidation would not reach other workers, nothing cached
+        self.assertEqual(caching.get_or_compute('test', 'key', compute), 1)
+        self.assertEqual(caching.get_or_compute('test', 'key', compute), 2)
+        self.assertEqual([message.id for message in check_shared_cache(None)], ['articles_app.W001'])
+        # content keyed values never change -> cached
+        self.assertEqual(caching.get_or_compute('test', 'immutable', compute, immutable=True), 3)
+        self.assertEqual(caching.get_or_compute('test', 'immutable', compute, immutable=True), 3)
+
+    def test_article_retrieve_is_cached(self):
+        client = Client()
+        password = 'testpassword123'
+        author = User.objects.create(email='test@test.com', password=password, role=User.AUTHOR)
+        subscriber = User.objects.create(email='1test@test.com', password=password)
+        author.subscribers.add(subscriber)
+        article = Article.objects.create(author=author, title='test_title', text='test_text', public=False)
+        url = reverse('articles_app:articles-detail', kwargs={'pk': article.pk})
+        credentials = encode_credentials(subscriber.email, password)
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, HTTP_AUTHORIZATION=credentials)
+        self.assertEqual(response.status_code, 200)
+        misses = len(context.captured_queries)
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, HTTP_AUTHORIZATION=credentials)
+        # cached article and subscriptions -> only authentication queries
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(context.captured_queries), misses - 2)
+
+        article.title = 'new_title'
+        article.save()
+        response = client.get(url, HTTP_AUTHORIZATION=credentials)
+        # changed article -> fresh data
+        self.assertEqual(response.json()['title'], 'new_title')
+
+        author.subscribers.remove(subscriber)
+        response = client.get(url, HTTP_AUTHORIZATION=credentials)
+        # unsubscribed -> private article not found
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    ARTICLES_THROTTLE_ENABLED=True, ARTICLES_THROTTLE_BURST=100,
+    ARTICLES_THROTTLE_RATE=1, ARTICLES_THROTTLE_COSTS={'users.create': 50}
+)
+class ThrottlingTest(TestCase):
+    def tearDown(self):
+        local_buckets.clear()
+        cache.clear()
+        db_latency.value = 0.0
+
+    def test_expensive_actions_drain_the_bucket(self):
+        client = Client()
+
+        for i in range(2):
+            response = client.post(
+                reverse('articles_app:users-list'),
+                data={'email': f'{i}test@test.com', 'password': 'testpassword123'}
+            )
+            # within burst -> created
+            self.assertEqual(response.status_code, 201)
+
+        response = client.post(
+            reverse('articles_app:users-list'),
+            data={'email': '2test@test.com', 'password': 'testpassword123'}
         )
-        user.subscribers.add(user_1)
+        # bucket drained by two creates -> too many requests
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_batch_retrieval_is_charged_per_id(self):
+        client = Client()
+        url = reverse('articles_app:users-list')
+
+        response = client.get(url, data={'ids': ','.join(str(pk) for pk in range(1, 81))})
+        # 80 ids within burst -> served
+        self.assertEqual(response.status_code, 200)
+        response = client.get(url, data={'ids': ','.join(str(pk) for pk in range(1, 41))})
+        # 40 ids with 20 tokens left -> too many requests
+        self.assertEqual(response.status_code, 429)
+        response = client.get(url, data={'ids': '1'})
+        # single id -> served
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ARTICLES_THROTTLE_COSTS={'login.failure': 40})
+    def test_failed_logins_are_throttled(self):
+        User.objects.create(email='test@test.com', password='testpassword123')
+        client = Client()
+        url = reverse('articles_app:users-list')
+        wrong = encode_credentials('test@test.com', 'wrongpassword')
+
+        for i in range(2):
+            response = client.get(url, HTTP_AUTHORIZATION=wrong, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}')
+            # failures within burst -> unauthorized
+            self.assertEqual(response.status_code, 401)
+
+        with mock.patch('django.contrib.auth.hashers.MD5PasswordHasher.verify') as verify:
+            response = client.get(url, HTTP_AUTHORIZATION=wrong, HTTP_X_FORWARDED_FOR='10.0.0.2')
+        # bucket of the address drained, forwarded address not trusted -> too many requests, not hashed
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        verify.assert_not_called()
+
+    def test_shared_buckets(self):
+        now = time.time()
+
+        # another worker takes tokens -> taken from the same bucket
+        self.assertEqual(cache_buckets.take('key', 60, 1, 100, now), 0)
+        self.assertEqual(cache_buckets.take('key', 60, 1, 100, now), 20)
+        # refilled over time -> allowed
+        self.assertEqual(cache_buckets.take('key', 60, 1, 100, now + 20), 0)
+
+    def test_contended_shared_buckets_fail_closed(self):
+        now = time.time()
+
+        with mock.patch.object(cache_buckets, 'LOCK_WAIT', 0):
+            cache.add('key:lock', 1, 1)
+            # lock held by another worker -> denied until the cost refills
+            self.assertEqual(cache_buckets.take('key', 60, 1, 100, now), 60)
+            cache.delete('key:lock')
+
+            results = []
+            threads = [
+                threading.Thread(target=lambda: results.append(cache_buckets.take('key', 20, 1, 100, now)))
+                for _ in range(20)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        # concurrent burst -> no more allowed than the bucket holds
+        self.assertEqual(len(results), 20)
+        self.assertLessEqual(results.count(0), 5)
+
+    @override_settings(ARTICLES_SHED_QUEUE_TIME=1000, ARTICLES_SHED_DB_LATENCY=100)
+    def test_load_shedding(self):
+        client = Client()
 
-        ## unsubscribe only for authenticated users / unsubscribe can only subscribed user
         response = client.get(
-            reverse('articles_app:users-unsubscribe', kwargs={'pk': user.pk}),
+            reverse('articles_app:users-list'),
+            HTTP_X_REQUEST_START=f't={time.time() - 2:.3f}'
         )
-        # without credentials -> unauthorised
-        self.assertEqual(response.status_code, 401)
+        # queued longer than allowed -> service unavailable
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
 
         response = client.get(
-            reverse('articles_app:users-unsubscribe', kwargs={'pk': user.pk}),
-            HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
+            reverse('articles_app:users-list'),
+            HTTP_X_REQUEST_START=str(int(time.time() * 1000))
         )
-        # authenticated / already subscribed -> success
+        # fresh request -> served
         self.assertEqual(response.status_code, 200)
 
-        response = client.get(
-            reverse('articles_app:users-unsubscribe', kwargs={'pk': user.pk}),
-            HTTP_AUTHORIZATION=self.encode_credentials(email_1, password)
-        )
-        # not subscribed already -> forbidden
-        self.assertEqual(response.status_code, 403)
+        db_latency.value = 0.5
+        with mock.patch('articles_app.middleware.random.random', return_value=0.5):
+            response = client.get(reverse('articles_app:users-list'))
+            # slow database -> shed
+            self.assertEqual(response.status_code, 503)
 
-        ## cant unsubscribe from user whith role "subscriber"
-        email_2 = '2test@test.com'
-        user_2 = User.objects.create(
-            email=email_2, password=password,
-            role=User.SUBSCRIBER
+            response = client.get(reverse('articles_app:metrics'))
+            # metrics are exempt -> served
+            self.assertEqual(response.status_code, 200)
+
+        with mock.patch('articles_app.middleware.random.random', return_value=0.95):
+            response = client.get(reverse('articles_app:users-list'))
+            # some requests are always admitted -> served, latency measured again
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(db_latency.value, 0.5)
+
+
+@override_settings(ARTICLES_SHARDS=['shard_0', 'shard_1'])
+class ShardingTest(TransactionTestCase):
+    databases = {'default', 'shard_0', 'shard_1'}
+
+    def tearDown(self):
+        view_counter.drain()
+        cache.clear()
+
+    def test_articles_are_sharded_by_author(self):
+        client = Client()
+        password = 'testpassword123'
+        authors = [
+            User.objects.create(email=f'{i}test@test.com', password=password, role=User.AUTHOR)
+            for i in range(2)
+        ]
+        subscriber = User.objects.create(email='subscriber@test.com', password=password)
+        credentials = encode_credentials(subscriber.email, password)
+        # users are copied to every shard
+        self.assertEqual(User.objects.using('shard_1').filter(pk=subscriber.pk).count(), 1)
+
+        articles = [
+            Article.objects.create(author=authors[i % 2], title=f'title_{i}', text='test_text', public=i != 3)
+            for i in range(4)
+        ]
+        shards = [shard_for_author(author.pk) for author in authors]
+        # authors on different shards, articles only on their author's shard
+        self.assertNotEqual(shards[0], shards[1])
+        self.assertEqual(Article.objects.using(shards[0]).filter(author=authors[0]).count(), 2)
+        self.assertEqual(Article.objects.using(shards[1]).filter(author=authors[0]).count(), 0)
+        self.assertEqual(Article.objects.count(), 0)
+
+        response = client.get(
+            reverse('articles_app:users-subscribe', kwargs={'pk': authors[1].pk}),
+            HTTP_AUTHORIZATION=credentials
         )
-        email_3 = '3test@test.com'
-        user_3 = User.objects.create(
-            email=email_3, password=password,
-            role=User.SUBSCRIBER
+        # subscription stored on the author's shard
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            Subscription.objects.using(shards[1])
+            .filter(from_customuser=authors[1], to_customuser=subscriber).exists()
         )
+
+        response = client.get(reverse('articles_app:articles-list'), HTTP_AUTHORIZATION=credentials)
+        # articles of both shards merged in creation order, private one of subscription included
+        self.assertEqual([article['id'] for article in response.json()], [article.pk for article in articles])
+
         response = client.get(
-            reverse('articles_app:users-unsubscribe', kwargs={'pk': user_2.pk}),
-            HTTP_AUTHORIZATION=self.encode_credentials(email_3, password)
+            reverse('articles_app:articles-detail', kwargs={'pk': articles[3].pk}),
+            HTTP_AUTHORIZATION=credentials
         )
-        # both users with role "subscriber" -> forbidden
-        self.assertEqual(response.status_code, 403)
+        # private article of subscription -> found on its shard
+        self.assertEqual(response.status_code, 200)
 
-        ## cant unsubscribe from user whith role "author"
-        email_4 = '4test@test.com'
-        user_5 = User.objects.create(
-            email=email_4, password=password,
-            role=User.AUTHOR
+        response = client.patch(
+            reverse('articles_app:articles-detail', kwargs={'pk': articles[2].pk}),
+            HTTP_AUTHORIZATION=encode_credentials(authors[0].email, password),
+            data={'title': 'new_title'}, content_type='application/json'
         )
-        # user with role "author" -> forbidden
-        self.assertEqual(response.status_code, 403)
+        # updated on its shard
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Article.objects.using(shards[0]).get(pk=articles[2].pk).title, 'new_title')
+
+        with self.assertRaises(NotSupportedError):
+            # subscriber's manager would write to the subscriber's shard -> refused
+            subscriber.subscriptions.add(authors[0])
+
+        authors[0].delete()
+        # deleted author -> replicas and articles removed from the shards
+        self.assertFalse(Article.objects.using(shards[0]).exists())
+        self.assertFalse(User.objects.using(shards[1]).filter(pk=authors[0].pk).exists())
+
+
+    def test_users_list_articles_and_subscribers_of_their_shards(self):
+        client = Client()
+        authors = [
+            User.objects.create(email=f'{i}test@test.com', password='!', role=User.AUTHOR)
+            for i in range(2)
+        ]
+        subscriber = User.objects.create(email='subscriber@test.com', password='!')
+        articles = [Article.objects.create(author=author, title='test_title', text='test_text') for author in authors]
+        for author in authors:
+            subscribe(author.pk, subscriber.pk)
+        self.assertNotEqual(shard_for_author(authors[0].pk), shard_for_author(authors[1].pk))
+
+        response = client.get(reverse('articles_app:users-list'))
+        users = {user['id']: user for user in response.json()}
+        # related ids of each user read from the user's own shard
+        for author, article in zip(authors, articles):
+            self.assertEqual(users[author.pk]['articles'], [article.pk])
+            self.assertEqual(users[author.pk]['subscribers'], [subscriber.pk])
+
+        response = client.get(reverse('articles_app:users-detail', kwargs={'pk': authors[1].pk}))
+        self.assertEqual(response.json()['articles'], [articles[1].pk])
+
+        response = client.get(reverse('articles_app:users-list'), data={'ids': f'{authors[0].pk},{authors[1].pk}'})
+        self.assertEqual([user['articles'] for user in response.json()['results']], [[articles[0].pk], [articles[1].pk]])
+
+    @override_settings(ARTICLES_DELETION_BATCH_SIZE=2)
+    def test_batched_deletion_removes_rows_of_the_shards(self):
+        authors = [
+            User.objects.create(email=f'{i}test@test.com', password='!', role=User.AUTHOR)
+            for i in range(2)
+        ]
+        subscriber = User.objects.create(email='subscriber@test.com', password='!')
+        shards = [shard_for_author(author.pk) for author in authors]
+        for _ in range(3):
+            Article.objects.create(author=authors[0], title='test_title', text='test_text')
+        subscribe(authors[0].pk, subscriber.pk)
+        subscribe(authors[1].pk, subscriber.pk)
+        subscribe(authors[1].pk, authors[0].pk)
+
+        def delete_replicas(user_id):
+            # batches done first -> the replica cascade finds no rows
+            self.assertFalse(Article.objects.using(shards[0]).exists())
+            self.assertFalse(Subscription.objects.using(shards[1]).filter(to_customuser_id=user_id).exists())
+            delete_user_replicas(user_id)
+
+        with mock.patch('articles_app.sharding.delete_user_replicas', side_effect=delete_replicas) as replicas:
+            deletion.delete_user(authors[0].pk)
+        # articles and subscribers on the user's shard, subscriptions on the author's shard -> deleted
+        self.assertFalse(Article.objects.using(shards[0]).exists())
+        self.assertFalse(Subscription.objects.using(shards[0]).exists())
+        self.assertEqual(
+            list(Subscription.objects.using(shards[1]).values_list('from_customuser_id', 'to_customuser_id')),
+            [(authors[1].pk, subscriber.pk)]
+        )
+        replicas.assert_called_once_with(authors[0].pk)
+        self.assertFalse(User.objects.using(shards[1]).filter(pk=authors[0].pk).exists())
+
+    def test_search_reads_all_shards(self):
+        client = Client()
+        authors = [
+            User.objects.create(email=f'{i}test@test.com', password='!', role=User.AUTHOR)
+            for i in range(2)
+        ]
+        matches = [
+            Article.objects.create(author=author, title='python tips', text='test_text', public=True)
+            for author in authors
+        ]
+        Article.objects.create(author=authors[1], title='test_title', text='test_text', public=True)
+        Article.objects.create(author=authors[1], title='python secrets', text='test_text', public=False)
+        url = reverse('articles_app:articles-search')
+
+        response = client.get(url, data={'q': 'python'})
+        # public matches of both shards, none in the default database
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([article['id'] for article in response.data['results']], [matches[1].pk, matches[0].pk])
+
+        response = client.get(url, data={'q': 'python', 'page_size': 1, 'page': 2})
+        # pages cut from the merge of the shards
+        self.assertEqual([article['id'] for article in response.data['results']], [matches[0].pk])
+
+    def test_article_ids_are_unique_across_shards(self):
+        client = Client()
+        authors = [
+            User.objects.create(email=f'{i}test@test.com', password='!', role=User.AUTHOR)
+            for i in range(2)
+        ]
+        shards = [shard_for_author(author.pk) for author in authors]
+        # article stored before ids were allocated
+        Article.objects.using(shards[1]).bulk_create([
+            Article(pk=10, author=authors[1], title='title_10', text='test_text', public=True)
+        ])
+
+        articles = [
+            Article.objects.create(author=authors[i % 2], title=f'title_{i}', text='test_text', public=True)
+            for i in range(4)
+        ]
+        # allocated after the largest id of the shards, each id used once
+        self.assertEqual([article.pk for article in articles], [11, 12, 13, 14])
+        self.assertFalse(Article.objects.using(shards[1]).filter(pk=articles[0].pk).exists())
+
+        for article in articles:
+            response = client.get(reverse('articles_app:articles-detail', kwargs={'pk': article.pk}))
+            # the article of its author's shard
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['title'], article.title)
+            self.assertEqual(response.json()['author'], article.author_id)
+
+
+class CompressionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(email='author@test.com', password='!', role=User.AUTHOR)
+        cls.article = Article.objects.create(
+            author=author, title='test_title', text=' '.join(['test_text'] * 500)
+        )
+        User.objects.bulk_create([
+            User(email=f'{i}test@test.com', username=f'{i}test', password='!') for i in range(50)
+        ])
+
+    def tearDown(self):
+        view_counter.drain()
+        cache.clear()
+
+    def test_negotiate(self):
+        # unknown or refused encodings -> identity
+        self.assertIsNone(compression.negotiate(''))
+        self.assertIsNone(compression.negotiate('identity, deflate'))
+        self.assertIsNone(compression.negotiate('gzip;q=0, *;q=0'))
+        # accepted by name or wildcard -> gzip
+        self.assertEqual(compression.negotiate('deflate, GZIP;q=0.5'), 'gzip')
+        self.assertEqual(compression.negotiate('*'), 'gzip')
+        with override_settings(ARTICLES_COMPRESSION_ENCODINGS=['missing', 'gzip']):
+            # preferred encoding not installed -> next one
+            self.assertEqual(compression.negotiate('missing, gzip'), 'gzip')
+
+    def test_large_responses_are_compressed(self):
+        client = Client()
+        url = reverse('articles_app:users-list')
+        content = client.get(url).content
+
+        ## large responses are compressed in an encoding the client accepts
+        response = client.get(url, HTTP_ACCEPT_ENCODING='br;q=0.9, gzip;q=0.8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), content)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+        response = client.get(url, HTTP_ACCEPT_ENCODING='identity')
+        # no accepted encoding -> sent as is
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, content)
+
+        with override_settings(ARTICLES_COMPRESSION_MIN_LENGTH=len(content) + 1):
+            response = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        # below threshold -> sent as is
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streams_are_compressed_incrementally(self):
+        produced = []
+
+        def chunks():
+            for i in range(3):
+                produced.append(i)
+                yield json.dumps({'chunk': i}).encode()
+
+        middleware = CompressionMiddleware(
+            lambda request: StreamingHttpResponse(chunks(), content_type='application/json')
+        )
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        ## streams are compressed chunk by chunk
+        stream = iter(response.streaming_content)
+        body = [next(stream)]
+        # first compressed chunk sent -> after the first chunk produced
+        self.assertEqual(produced, [0])
+        body.extend(stream)
+        self.assertEqual(gzip.decompress(b''.join(body)), b'{"chunk": 0}{"chunk": 1}{"chunk": 2}')
+
+    def test_cached_articles_are_compressed_once(self):
+        client = Client()
+        url = reverse('articles_app:articles-detail', kwargs={'pk': self.article.pk})
+
+        ## cached articles are compressed once
+        with mock.patch.object(compression, 'compress', wraps=compression.compress) as compress:
+            responses = [client.get(url, HTTP_ACCEPT_ENCODING='gzip') for _ in range(3)]
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(
+            json.loads(gzip.decompress(responses[-1].content))['text'], self.article.text
+        )
+        # strong validator of the gzip body, distinct from the identity body's
+        etag = client.get(url)['ETag']
+        self.assertEqual(responses[-1]['ETag'], f'{etag[:-1]}-gzip"')
+
+
+class WarmCachesTest(TestCase):
+    def tearDown(self):
+        cache.clear()
+
+    def test_warm_caches(self):
+        authors = [
+            User.objects.create(email=f'{i}author@test.com', password='!', role=User.AUTHOR)
+            for i in range(3)
+        ]
+        subscriber = User.objects.create(email='subscriber@test.com', password='!')
+        authors[0].subscribers.add(subscriber)
+        private = Article.objects.create(author=authors[0], title='test_title', text='test_text', public=False)
+        public = [
+            Article.objects.create(author=author, title='test_title', text='test_text')
+            for author in authors
+        ]
+
+        ## warm_caches fills caches of top authors, recent articles and active feeds
+        output = io.StringIO()
+        clock = mock.Mock(now=0.0)
+        clock.time.side_effect = lambda: clock.now
+        clock.sleep.side_effect = lambda delay: setattr(clock, 'now', clock.now + delay)
+        with mock.patch('articles_app.warming.time', clock):
+            call_command('warm_caches', workers=1, max_qps=1, per_feed=1, stdout=output)
+        # recent public articles, the top author's latest and the subscriber's feed
+        for article in public:
+            self.assertEqual(cache.get(caching.article_key(article.pk))[0]['id'], article.pk)
+        self.assertIsNone(cache.get(caching.article_key(private.pk)))
+        self.assertEqual(cache.get(caching.subscriptions_key(subscriber.pk))[0], {authors[0].pk})
+        # 3 public articles, 1 article of the author, 1 subscription list and 1 article of the feed
+        self.assertIn('Warmed 6 keys in 3 tasks', output.getvalue())
+        with self.assertNumQueries(0):
+            # warmed articles and subscriptions -> served from the cache
+            self.assertEqual(caching.get_article_data(public[0].pk)['id'], public[0].pk)
+            self.assertEqual(caching.get_subscription_ids(subscriber), {authors[0].pk})
+        # each task over max_qps -> waits for the bucket to refill
+        self.assertGreaterEqual(clock.now, 2)
+
+
+@override_settings(ARTICLES_JOBS_EAGER=True)
+class ConcurrencyTest(TransactionTestCase):
+    THREADS = 8
+
+    def tearDown(self):
+        view_counter.drain()
+        cache.clear()
+
+    def run_concurrently(self, request):
+        barrier = threading.Barrier(self.THREADS)
+        codes = []
+
+        def run():
+            try:
+                barrier.wait()
+                codes.append(request(Client()).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return Counter(codes)
+
+    def test_concurrent_subscriptions(self):
+        password = 'testpassword123'
+        author = User.objects.create(email='author@test.com', password=password, role=User.AUTHOR)
+        subscriber = User.objects.create(email='subscriber@test.com', password=password)
+        credentials = encode_credentials(subscriber.email, password)
+
+        ## concurrent requests subscribe once, the others are forbidden
+        codes = self.run_concurrently(lambda client: client.get(
+            reverse('articles_app:users-subscribe', kwargs={'pk': author.pk}), HTTP_AUTHORIZATION=credentials
+        ))
+        self.assertEqual(codes, {200: 1, 403: self.THREADS - 1})
+        self.assertEqual(Subscription.objects.filter(from_customuser=author).count(), 1)
+        # side effects ran once
+        self.assertEqual(AuthorDailyStats.objects.get(author=author).subscribers_gained, 1)
+
+        ## concurrent requests unsubscribe once, the others are forbidden
+        codes = self.run_concurrently(lambda client: client.get(
+            reverse('articles_app:users-unsubscribe', kwargs={'pk': author.pk}), HTTP_AUTHORIZATION=credentials
+        ))
+        self.assertEqual(codes, {200: 1, 403: self.THREADS - 1})
+        self.assertFalse(Subscription.objects.filter(from_customuser=author).exists())
+        self.assertEqual(AuthorDailyStats.objects.get(author=author).subscribers_lost, 1)
+
+    def test_concurrent_updates(self):
+        password = 'testpassword123'
+        author = User.objects.create(email='author@test.com', password=password, role=User.AUTHOR)
+        article = Article.objects.create(author=author, title='test_title', text='test_text', public=True)
+        url = reverse('articles_app:articles-detail', kwargs={'pk': article.pk})
+        etag = Client().get(url)['ETag']
+        titles = iter(range(self.THREADS))
+
+        ## of concurrent updates of one version only the first succeeds
+        codes = self.run_concurrently(lambda client: client.patch(
+            url, HTTP_AUTHORIZATION=encode_credentials(author.email, password),
+            data={'title': f'title_{next(titles)}'}, content_type='application/json', HTTP_IF_MATCH=etag
+        ))
+        self.assertEqual(codes, {200: 1, 412: self.THREADS - 1})
+        # no lost update -> the stored version is the one that succeeded
+        self.assertNotEqual(Client().get(url)['ETag'], etag)
@@ -0,0 +1,209 @@
+"""
+Token bucket throttling with per-action costs.
+
+Every client, a user or an anonymous address, owns one bucket of
+ARTICLES_THROTTLE_BURST tokens refilled at ARTICLES_THROTTLE_RATE tokens
+per second. A request takes the cost of its action from
+ARTICLES_THROTTLE_COSTS, so expensive actions drain the bucket faster,
+a batch retrieval pays the cost once per requested id. Failed logins
+drain a separate bucket per address, see ThrottledBasicAuthentication.
+Buckets live in the process, or in the shared cache with
+ARTICLES_THROTTLE_SHARED set so that all workers draw from the same bucket.
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.throttling import BaseThrottle
+from articles_app import metrics
+
+
+def refill(tokens, updated, now, rate, burst):
+    return min(burst, tokens + max(now - updated, 0) * rate)
+
+
+class LocalBuckets:
+    # Full buckets carry no state, they are dropped once this many are kept.
+    MAX_BUCKETS = 10000
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, cost, rate, burst, now):
+        """
+        Take cost tokens and return 0, or the seconds until they are available.
+        """
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = refill(tokens, updated, now, rate, burst)
+            if tokens < cost:
+                self.buckets[key] = (tokens, now)
+                return (cost - tokens) / rate
+
+            self.buckets[key] = (tokens - cost, now)
+            if len(self.buckets) > self.MAX_BUCKETS:
+                self.prune(now, rate, burst)
+            return 0
+
+    def wait(self, key, cost, rate, burst, now):
+        """
+        Return 0 when cost tokens are available, or the seconds until they are.
+        """
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+        tokens = refill(tokens, updated, now, rate, burst)
+        return (cost - tokens) / rate if tokens < cost else 0
+
+    def prune(self, now, rate, burst):
+        self.buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self.buckets.items()
+            if refill(tokens, updated, now, rate, burst) < burst
+        }
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBuckets:
+    """
+    Buckets in the shared cache. Updates are serialized per bucket with an
+    atomic cache.add lock. A client whose lock stays taken is rejected for
+    at least the time its cost takes to refill rather than stalling the
+    worker, the lock is only contended by a burst of that client.
+    """
+    LOCK_WAIT = 0.05
+
+    def take(self, key, cost, rate, burst, now):
+        deadline = time.monotonic() + self.LOCK_WAIT
+        while not cache.add(f'{key}:lock', 1, 1):
+            if time.monotonic() >= deadline:
+                return max(self.wait(key, cost, rate, burst, now), cost / rate)
+            time.sleep(0.001)
+
+        try:
+            tokens, updated = cache.get(key, (burst, now))
+            tokens = refill(tokens, updated, now, rate, burst)
+            delay = (cost - tokens) / rate if tokens < cost else 0
+            if not delay:
+                tokens -= cost
+            # The bucket is full again after this many seconds.
+            cache.set(key, (tokens, now), int((burst - tokens) / rate) + 1)
+            return delay
+        finally:
+            cache.delete(f'{key}:lock')
+
+    def wait(self, key, cost, rate, burst, now):
+        tokens, updated = cache.get(key, (burst, now))
+        tokens = refill(tokens, updated, now, rate, burst)
+        return (cost - tokens) / rate if tokens < cost else 0
+
+    def clear(self):
+        pass
+
+
+local_buckets = LocalBuckets()
+cache_buckets = CacheBuckets()
+
+
+def get_buckets():
+    return cache_buckets if settings.ARTICLES_THROTTLE_SHARED else local_buckets
+
+
+def count_ids(request):
+    # Ids are validated by the view after throttling, larger batches are rejected there.
+    ids = [pk for pk in request.query_params.get('ids', '').split(',') if pk.strip()]
+    return min(max(len(ids), 1), settings.ARTICLES_BATCH_MAX_IDS)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Charges the cost of the view's throttle_scope and action,
+    e.g. "users.create", 1 token for actions without a cost.
+    Batch retrievals are charged per id.
+    """
+    def allow_request(self, request, view):
+        self.delay = 0
+        if not settings.ARTICLES_THROTTLE_ENABLED:
+            return True
+
+        action = f'{getattr(view, "throttle_scope", view.__class__.__name__)}.{view.action}'
+        burst = settings.ARTICLES_THROTTLE_BURST
+        cost = settings.ARTICLES_THROTTLE_COSTS.get(action, 1)
+        if view.action == 'batch_retrieve':
+            cost *= count_ids(request)
+        cost = min(cost, burst)
+        if request.user.is_authenticated:
+            client = f'user:{request.user.pk}'
+        else:
+            client = f'address:{self.get_ident(request)}'
+
+        self.delay = get_buckets().take(
+            f'articles:throttle:{client}', cost,
+            settings.ARTICLES_THROTTLE_RATE, burst, time.time()
+        )
+        if self.delay:
+            metrics.inc('requests_throttled_total', (('action', action),))
+
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+def take_login_failure(ident, check_only=False):
+    """
+    Charge a failed login to the bucket of the address ident, or with
+    check_only only tell whether one more may be charged. Returns 0 or the
+    seconds until the address may try to log in again.
+    """
+    if not settings.ARTICLES_THROTTLE_ENABLED:
+        return 0
+
+    key = f'articles:throttle:login:{ident}'
+    rate = settings.ARTICLES_THROTTLE_RATE
+    burst = settings.ARTICLES_THROTTLE_BURST
+    cost = min(settings.ARTICLES_THROTTLE_COSTS.get('login.failure', 1), burst)
+    buckets = get_buckets()
+    if not check_only:
+        return buckets.take(key, cost, rate, burst, time.time())
+
+    delay = buckets.wait(key, cost, rate, burst, time.time())
+    if delay:
+        metrics.inc('requests_throttled_total', (('action', 'login.failure'),))
+    return delay
+
+
+def get_login_ident(meta):
+    """
+    Address of the client of request headers in WSGI form, as told apart by
+    the throttles.
+    """
+    return BaseThrottle().get_ident(SimpleNamespace(META=meta))
+
+
+class ThrottledBasicAuthentication(BasicAuthentication):
+    """
+    Basic authentication that charges the "login.failure" cost to the
+    address of every failed login. Once the bucket of an address is empty
+    its credentials are rejected with 429 before the password is hashed.
+    """
+    def authenticate_credentials(self, userid, password, request=None):
+        if request is None:
+            return super().authenticate_credentials(userid, password, request)
+
+        ident = get_login_ident(request.META)
+        delay = take_login_failure(ident, check_only=True)
+        if delay:
+            raise Throttled(delay)
+
+        try:
+            return super().authenticate_credentials(userid, password, request)
+        except AuthenticationFailed:
+            take_login_failure(ident)
+            raise
@@ -1,5 +1,5 @@
 from django.urls import path
-from articles_app.views import UserViewSet, ArticleViewSet
+from articles_app.views import UserViewSet, ArticleViewSet, metrics_view
 
 
 app_name = 'articles_app'
@@ -12,8 +12,17 @@ pk_methods = {'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}
 urlpatterns = [
     path('users/', UserViewSet.as_view(methods), name='users-list'),
     path('users/<int:pk>/', UserViewSet.as_view(pk_methods), name='users-detail'),
+    path('users/<int:pk>/deletion/', UserViewSet.as_view({'get': 'deletion'}), name='users-deletion'),
+    path('users/<int:pk>/stats/', UserViewSet.as_view({'get': 'stats'}), name='users-stats'),
+    path(
+        'users/<int:pk>/recommendations/', UserViewSet.as_view({'get': 'recommendations'}),
+        name='users-recommendations'
+    ),
     path('users/subscribe/<int:pk>/', UserViewSet.as_view({'get': 'subscribe'}), name='users-subscribe'),
     path('users/unsubscribe/<int:pk>/', UserViewSet.as_view({'get': 'unsubscribe'}), name='users-unsubscribe'),
     path('articles/', ArticleViewSet.as_view(methods), name='articles-list'),
-    path('articles/<int:pk>/', ArticleViewSet.as_view(pk_methods), name='articles-detail')
+    path('articles/popular/', ArticleViewSet.as_view({'get': 'popular'}), name='articles-popular'),
+    path('articles/search/', ArticleViewSet.as_view({'get': 'search'}), name='articles-search'),
+    path('articles/<int:pk>/', ArticleViewSet.as_view(pk_methods), name='articles-detail'),
+    path('metrics', metrics_view, name='metrics')
 ]
@@ -1,19 +1,103 @@
+from datetime import datetime, time
 from rest_framework import viewsets, status
-from rest_framework.authentication import BasicAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound, ValidationError
 from rest_framework.response import Response
-from django.db.models import Q
-from articles_app.models import CustomUser, Article
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.db import transaction
+from django.db.models import F, Prefetch, Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags, quote_etag
+from articles_app.models import CustomUser, Article, Job
 from articles_app.serializers import (
     CreateUserSerializer, UpdateUserSerializer, UserSerializer,
-    ArticleSerializer, CreateArticleSerializer
+    ArticleSerializer, CreateArticleSerializer, AuthorDailyStatsSerializer,
+    RecommendationSerializer
 )
 from articles_app.permissions import UserPermission, ArticlePermission
+from articles_app.throttling import ThrottledBasicAuthentication, TokenBucketThrottle
+from articles_app.pagination import ArticleSearchPagination
+from articles_app.search import get_search_engine
+from articles_app.counters import view_counter
+from articles_app.caching import get_article_data, get_subscription_ids
+from articles_app.compression import get_encoded_etags
+from articles_app.sharding import (
+    MergedResults, gather, get_first, get_shards, is_sharded, prefetch_by_author, scatter,
+    subscribe, unsubscribe
+)
+from articles_app.jobs import enqueue
+from articles_app.deletion import get_status_token
+from articles_app import metrics
+from articles_app.stats import get_stats
+from articles_app.recommendations import get_recommendations
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Article was changed, reload it and retry.'
+    default_code = 'precondition_failed'
+
+
+def get_article_etag(updated_at):
+    # Version of an article, microseconds of its last update.
+    return quote_etag(str(round(updated_at.timestamp() * 1_000_000)))
+
+
+class BatchRetrieveMixin:
+    """
+    GET on the list route with ?ids=1,2,3 returns the objects of those ids
+    read by one query, keeping only those the user may see, and reports
+    the ids that are missing or forbidden.
+    """
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'list' and 'ids' in request.GET:
+            self.action = 'batch_retrieve'
+
+        return request
+
+    def list(self, request, *args, **kwargs):
+        if self.action != 'batch_retrieve':
+            return super().list(request, *args, **kwargs)
+
+        ids = self.get_batch_ids()
+        objects = self.get_batch_objects(ids)
+        visible = {pk for pk, obj in objects.items() if self.is_batch_visible(obj)}
+        missing = [pk for pk in ids if pk not in objects]
+        forbidden = [pk for pk in ids if pk in objects and pk not in visible]
+        permitted = [objects[pk] for pk in ids if pk in visible]
 
+        return Response({
+            'results': self.get_serializer(permitted, many=True).data,
+            'missing': missing,
+            'forbidden': forbidden
+        })
 
-class UserViewSet(viewsets.ModelViewSet):
-    authentication_classes = [BasicAuthentication]
+    def get_batch_ids(self):
+        try:
+            ids = [int(pk) for pk in self.request.query_params['ids'].split(',') if pk.strip()]
+        except ValueError:
+            raise ValidationError({'ids': 'Enter comma separated integer ids.'})
+        if not ids or len(ids) > settings.ARTICLES_BATCH_MAX_IDS:
+            raise ValidationError({'ids': f'Enter 1 to {settings.ARTICLES_BATCH_MAX_IDS} ids.'})
+
+        return list(dict.fromkeys(ids))
+
+    def get_batch_objects(self, ids):
+        return self.get_queryset().in_bulk(ids)
+
+    def is_batch_visible(self, obj):
+        return True
+
+
+class UserViewSet(BatchRetrieveMixin, viewsets.ModelViewSet):
+    authentication_classes = [ThrottledBasicAuthentication]
     permission_classes = [UserPermission]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'users'
     serializer_class = UserSerializer
     queryset = CustomUser.objects.all()
 
@@ -25,12 +109,94 @@ class UserViewSet(viewsets.ModelViewSet):
 
         return self.serializer_class
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'batch_retrieve') and not is_sharded():
+            # UserSerializer lists article and subscriber ids of every user.
+            queryset = queryset.prefetch_related(
+                *[Prefetch(name, queryset=related) for name, related in self.get_related()]
+            )
+
+        return queryset
+
+    def get_related(self):
+        return [
+            ('articles', Article.objects.only('id', 'author_id')),
+            ('subscribers', CustomUser.objects.only('id')),
+        ]
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.action in ('list', 'retrieve', 'batch_retrieve') and is_sharded():
+            # A prefetch of the queryset would read the shard of its first user only.
+            users = list(args[0]) if kwargs.get('many') else [args[0]]
+            prefetch_by_author(users, *self.get_related())
+            args = (users if kwargs.get('many') else users[0], *args[1:])
+
+        return super().get_serializer(*args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        if settings.ARTICLES_USER_DELETION_MODE != 'batched':
+            return super().destroy(request, *args, **kwargs)
+
+        user = self.get_object()
+        CustomUser.objects.filter(pk=user.pk).update(is_active=False)
+        enqueue('delete_user', user_id=user.pk)
+        status_url = reverse('articles_app:users-deletion', kwargs={'pk': user.pk})
+
+        return Response(
+            status=status.HTTP_202_ACCEPTED,
+            data={
+                'detail': 'Deletion scheduled.',
+                'status': f'{status_url}?token={get_status_token(user.pk)}'
+            }
+        )
+
+    @action(detail=True, methods=['get'])
+    def deletion(self, request, pk=None):
+        job = Job.objects.filter(name='delete_user', payload__user_id=int(pk)).order_by('-pk').first()
+        if job is None:
+            return Response(
+                status=status.HTTP_404_NOT_FOUND,
+                data={'detail': 'Deletion is not scheduled.'}
+            )
+
+        return Response(
+            status=status.HTTP_200_OK,
+            data={'status': job.get_status_display().lower()}
+        )
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        author = self.get_object()
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            days = 0
+        if days < 1:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'detail': 'Days must be a positive integer.'}
+            )
+
+        serializer = AuthorDailyStatsSerializer(get_stats(author, days), many=True)
+
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def recommendations(self, request, pk=None):
+        # One indexed read, an unknown author has no recommendations.
+        serializer = RecommendationSerializer(get_recommendations(pk), many=True)
+
+        return Response(serializer.data)
+
     @action(detail=True, methods=['get'])
     def subscribe(self, request, pk=None):
         author = self.get_object()
         subscriber = self.request.user
 
-        author.subscribers.add(subscriber)
+        if not subscribe(author.pk, subscriber.pk):
+            # Already subscribed, possibly by a concurrent request.
+            self.permission_denied(request)
 
         return Response(
             status=status.HTTP_200_OK,
@@ -42,7 +208,8 @@ class UserViewSet(viewsets.ModelViewSet):
         author = self.get_object()
         subscriber = self.request.user
 
-        author.subscribers.remove(subscriber)
+        if not unsubscribe(author.pk, subscriber.pk):
+            self.permission_denied(request)
 
         return Response(
             status=status.HTTP_200_OK,
@@ -50,21 +217,192 @@ class UserViewSet(viewsets.ModelViewSet):
         )
 
 
-class ArticleViewSet(viewsets.ModelViewSet):
-    authentication_classes = [BasicAuthentication]
+class ArticleViewSet(BatchRetrieveMixin, viewsets.ModelViewSet):
+    authentication_classes = [ThrottledBasicAuthentication]
     permission_classes = [ArticlePermission]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'articles'
     serializer_class = ArticleSerializer
 
     def get_queryset(self):
-        if self.request.user.is_authenticated:
-            return Article.objects.filter(
+        if self.action == 'batch_retrieve':
+            # Visibility is checked per article to tell forbidden from missing ids.
+            return Article.objects.all()
+
+        if self.request.user.is_authenticated and is_sharded():
+            # Subscriptions are spread over the shards, a subquery cannot span them.
+            queryset = Article.objects.filter(
+                Q(public=True) | Q(author__in=get_subscription_ids(self.request.user))
+            )
+        elif self.request.user.is_authenticated:
+            queryset = Article.objects.filter(
                 Q(public=True) | Q(author__in=self.request.user.subscriptions.all())
             )
+        else:
+            queryset = Article.objects.filter(public=True)
+
+        if self.action in ('list', 'search'):
+            queryset = self.filter_created_range(queryset)
+
+        return queryset
+
+    def filter_created_range(self, queryset):
+        # Bounded created_at ranges let PostgreSQL prune article partitions.
+        for param, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')):
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+
+            try:
+                moment = parse_datetime(value)
+                if moment is None and parse_date(value) is not None:
+                    moment = datetime.combine(parse_date(value), time())
+            except ValueError:
+                moment = None
+            if moment is None:
+                raise ValidationError({param: 'Enter a valid date or datetime.'})
+
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            queryset = queryset.filter(**{lookup: moment})
 
-        return Article.objects.filter(public=True)
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return CreateArticleSerializer
 
         return self.serializer_class
+
+    def retrieve(self, request, *args, **kwargs):
+        # Served from the article cache, a burst of reads costs one query.
+        data = get_article_data(int(kwargs['pk']))
+        if data is None or not self.is_visible(data['public'], data['author']):
+            raise NotFound()
+        view_counter.increment(data['id'])
+
+        response = Response(data)
+        response['ETag'] = get_article_etag(parse_datetime(data['updated_at']))
+        # The same body is served until the article changes.
+        response.compress_cached = True
+        return response
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = get_article_etag(parse_datetime(response.data['updated_at']))
+        return response
+
+    def perform_update(self, serializer):
+        if_match = self.request.headers.get('If-Match')
+        if if_match is None:
+            return super().perform_update(serializer)
+
+        # Strong comparison, compressed responses carry the version with
+        # their encoding appended, weak tags never match.
+        etags = parse_etags(if_match)
+        article = serializer.instance
+        if '*' not in etags and not get_encoded_etags(get_article_etag(article.updated_at)) & set(etags):
+            raise PreconditionFailed()
+
+        # Compare and set, of concurrent updates of one version only the first
+        # matches, the others wait for its commit and match no row.
+        with transaction.atomic(using=article._state.db):
+            if not Article.objects.using(article._state.db) \
+                    .filter(pk=article.pk, updated_at=article.updated_at) \
+                    .update(updated_at=F('updated_at')):
+                raise PreconditionFailed()
+            serializer.save()
+
+    def get_object(self):
+        if not is_sharded():
+            return super().get_object()
+
+        article = get_first(self.get_queryset().filter(pk=self.kwargs['pk']))
+        if article is None:
+            raise NotFound()
+        self.check_object_permissions(self.request, article)
+
+        return article
+
+    def list(self, request, *args, **kwargs):
+        if self.action == 'list' and is_sharded():
+            articles = gather(
+                self.get_queryset().order_by('created_at', 'id'),
+                key=lambda article: (article.created_at, article.pk)
+            )
+            return Response(self.get_serializer(articles, many=True).data)
+
+        response = super().list(request, *args, **kwargs)
+        if self.action == 'batch_retrieve':
+            for article in response.data['results']:
+                view_counter.increment(article['id'])
+
+        return response
+
+    def is_visible(self, public, author_id):
+        if public:
+            return True
+
+        return self.request.user.is_authenticated and \
+            author_id in get_subscription_ids(self.request.user)
+
+    def get_batch_objects(self, ids):
+        return {article.pk: article for rows in scatter(self.get_queryset().filter(pk__in=ids)) for article in rows}
+
+    def is_batch_visible(self, article):
+        return self.is_visible(article.public, article.author_id)
+
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), settings.ARTICLES_POPULAR_SIZE)
+        except ValueError:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'detail': 'Limit must be an integer.'}
+            )
+
+        queryset = self.get_queryset().filter(popularity__isnull=False) \
+            .order_by('-popularity__views', '-id')
+        if is_sharded():
+            # Every shard ranks its own articles, the top is the merge of theirs.
+            queryset = gather(
+                queryset.select_related('popularity')[:max(limit, 0)],
+                key=lambda article: (-article.popularity.views, -article.pk)
+            )
+        queryset = queryset[:max(limit, 0)]
+        serializer = self.get_serializer(queryset, many=True)
+
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'detail': 'Search query is required.'}
+            )
+
+        engine = get_search_engine()
+        if is_sharded():
+            # Every shard ranks its own matches, pages are cut from their merge.
+            queryset = MergedResults(
+                [engine.search(self.get_queryset().using(alias), query) for alias in get_shards()],
+                key=lambda article: (-article.rank, -article.pk)
+            )
+        else:
+            queryset = engine.search(self.get_queryset(), query)
+        paginator = ArticleSearchPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+
+        return paginator.get_paginated_response(serializer.data)
+
+
+def metrics_view(request):
+    token = settings.ARTICLES_METRICS_TOKEN
+    if token and request.META.get('HTTP_AUTHORIZATION') != f'Bearer {token}':
+        return HttpResponseForbidden()
+
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,118 @@
+"""
+Cache warming after a deploy or a cache flush.
+
+Fills the article and subscription caches for the reads that arrive
+first: the most subscribed authors, recent public articles and the feeds
+of recently active users. Warming runs as tasks of a few queries each on
+a bounded thread pool, paced to a number of queries per second so that
+it does not compete with live traffic for the database.
+"""
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import timedelta
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+from articles_app.caching import refresh, subscriptions_key, warm_articles
+from articles_app.middleware import QueryCounter
+from articles_app.models import Article, CustomUser
+from articles_app.sharding import Subscription, get_subscription_ids, scatter, shard_for_author
+from articles_app.throttling import LocalBuckets
+
+
+def latest(queryset, limit):
+    """
+    Ids of the limit latest articles of queryset across all shards.
+    """
+    queryset = queryset.order_by('-created_at', '-id').values_list('created_at', 'id')[:limit]
+    rows = sorted((row for rows in scatter(queryset) for row in rows), reverse=True)[:limit]
+    return [pk for _, pk in rows]
+
+
+def get_top_author_ids(limit):
+    # An author's subscriptions are all on its shard, shard tops merge exactly.
+    queryset = Subscription.objects.values_list('from_customuser_id') \
+        .annotate(subscribers=Count('id')).order_by('-subscribers', 'from_customuser_id')[:limit]
+    counts = Counter(dict(row for rows in scatter(queryset) for row in rows))
+    return [author_id for author_id, _ in counts.most_common(limit)]
+
+
+def get_active_user_ids(limit, days):
+    """
+    Users who subscribed most recently or logged in within days.
+    """
+    queryset = Subscription.objects.order_by('-id').values_list('to_customuser_id', flat=True)[:limit]
+    user_ids = dict.fromkeys(user_id for rows in scatter(queryset) for user_id in rows)
+    user_ids.update(dict.fromkeys(
+        CustomUser.objects.filter(last_login__gte=timezone.now() - timedelta(days=days))
+        .order_by('-last_login').values_list('pk', flat=True)[:limit]
+    ))
+    return list(user_ids)[:limit]
+
+
+def warm_recent_articles(limit):
+    return warm_articles(latest(Article.objects.filter(public=True), limit))
+
+
+def warm_author(author_id, limit):
+    article_ids = Article.objects.using(shard_for_author(author_id)).filter(author_id=author_id) \
+        .order_by('-created_at', '-id').values_list('id', flat=True)[:limit]
+    return warm_articles(list(article_ids))
+
+
+def warm_feed(user_id, limit):
+    author_ids = refresh(subscriptions_key(user_id), lambda: get_subscription_ids(user_id))
+    return 1 + warm_articles(latest(Article.objects.filter(author__in=author_ids), limit))
+
+
+class Warmer:
+    """
+    Runs warming tasks, each returning the number of keys it warmed, on
+    up to workers threads, one runs them in the calling thread. After each
+    task its queries are taken from a token bucket refilled at max_qps,
+    workers wait while it is empty. Shard queries that scatter runs on its
+    own threads are not counted.
+    """
+    def __init__(self, workers, max_qps):
+        self.workers = workers
+        self.max_qps = max_qps
+        self.buckets = LocalBuckets()
+        self.lock = threading.Lock()
+        self.keys = 0
+        self.queries = 0
+
+    def run_task(self, task):
+        counter = QueryCounter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(counter))
+                keys = task()
+        finally:
+            if self.workers > 1:
+                # Worker threads own their connections.
+                connections.close_all()
+
+        with self.lock:
+            self.keys += keys
+            self.queries += counter.count
+        cost = min(max(counter.count, 1), self.max_qps)
+        while True:
+            delay = self.buckets.take('warm', cost, self.max_qps, self.max_qps, time.time())
+            if not delay:
+                break
+            time.sleep(delay)
+
+    def run(self, tasks):
+        if self.workers <= 1:
+            for task in tasks:
+                self.run_task(task)
+            return
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='warm') as executor:
+            for future in [executor.submit(self.run_task, task) for task in tasks]:
+                future.result()
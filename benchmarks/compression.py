@@ -0,0 +1,128 @@
+"""
+Storage size and read latency of article texts stored raw and compressed.
+
+    python benchmarks/compression.py --articles 20000
+
+Seeds a throwaway test database with prose-like articles of log-normally
+distributed length, then measures with texts stored raw and after
+`repack_article_texts` with ARTICLES_COMPRESS_TEXT enabled. PostgreSQL
+already compresses values over about 2 kB in TOAST, the table size shows
+what zlib adds on top of that.
+"""
+import argparse
+import itertools
+import math
+import random
+import time
+
+from utils import benchmark_database, measure, report, setup_django
+
+# Zipf distributed vocabulary, close to the word frequencies of prose.
+VOCABULARY = [
+    ''.join(random.Random(i).choice('etaoinshrdlcumwfgypbvkjxqz') for _ in range(2 + i % 9))
+    for i in range(5000)
+]
+CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def random_text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        sentence = rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=rng.randint(5, 25))
+        sentence[0] = sentence[0].capitalize()
+        words.append(' '.join(sentence) + '.')
+        size += len(words[-1]) + 1
+        if rng.random() < 0.15:
+            words.append('\n\n')
+    return ' '.join(words)[:length].strip()
+
+
+def seed(count, batch_size, median_length, rng):
+    from articles_app.models import Article, CustomUser
+
+    authors = CustomUser.objects.bulk_create([
+        CustomUser(email=f'author{i}@bench.com', password='!', role=CustomUser.AUTHOR)
+        for i in range(100)
+    ])
+    for offset in range(0, count, batch_size):
+        Article.objects.bulk_create([
+            Article(
+                author=rng.choice(authors),
+                title=random_text(rng, 60),
+                text=random_text(rng, int(rng.lognormvariate(math.log(median_length), 1))),
+            )
+            for _ in range(min(batch_size, count - offset))
+        ])
+
+
+def storage(connection):
+    from django.db.models import Sum
+    from django.db.models.functions import Coalesce, Length
+    from articles_app.models import Article
+
+    # Length of a text is in characters, close to bytes for this corpus.
+    columns = Article.objects.aggregate(
+        text=Coalesce(Sum(Length('text')), 0),
+        compressed=Coalesce(Sum(Length('text_compressed')), 0),
+    )
+    sizes = {'column bytes': columns['text'] + columns['compressed']}
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM FULL articles_app_article')
+            cursor.execute("SELECT pg_total_relation_size('articles_app_article')")
+            sizes['table bytes'] = cursor.fetchone()[0]
+    return sizes
+
+
+def run(label, connection, ids, repeat, rng):
+    from articles_app.models import Article
+    from articles_app.serializers import ArticleSerializer
+
+    print(f'{label}: ' + ', '.join(f'{name} {size / 2 ** 20:.1f} MiB' for name, size in storage(connection).items()))
+    report(
+        f'{label} detail',
+        measure(lambda: ArticleSerializer(Article.objects.get(pk=rng.choice(ids))).data, repeat)
+    )
+    report(
+        f'{label} page of 20',
+        measure(lambda: ArticleSerializer(Article.objects.order_by('-id')[:20], many=True).data, repeat)
+    )
+    report(
+        f'{label} 100 titles',
+        measure(lambda: [article.title for article in Article.objects.order_by('-id')[:100]], repeat)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--median-length', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from articles_app.models import Article
+
+    rng = random.Random(0)
+    with benchmark_database() as connection:
+        settings.ARTICLES_COMPRESS_TEXT = False
+        start = time.perf_counter()
+        seed(args.articles, args.batch_size, args.median_length, rng)
+        print(f'Seeded {args.articles} articles in {time.perf_counter() - start:.1f} s')
+        ids = list(Article.objects.values_list('pk', flat=True))
+        run('raw', connection, ids, args.repeat, rng)
+
+        settings.ARTICLES_COMPRESS_TEXT = True
+        start = time.perf_counter()
+        call_command('repack_article_texts', batch_size=args.batch_size)
+        print(f'Compressed in {time.perf_counter() - start:.1f} s')
+        run('compressed', connection, ids, args.repeat, rng)
+
+
+if __name__ == '__main__':
+    main()
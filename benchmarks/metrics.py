@@ -0,0 +1,73 @@
+"""
+Overhead of metrics collection.
+
+    python benchmarks/metrics.py --requests 2000
+
+Compares API handlers with and without MetricsMiddleware on the same
+requests against a throwaway test database, and times the raw registry.
+"""
+import argparse
+import timeit
+
+from utils import benchmark_database, measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.test import RequestFactory
+    from articles_app import metrics
+    from articles_app.models import Article, CustomUser
+    from liis_test_task.handlers import APIWSGIHandler
+
+    settings.ALLOWED_HOSTS = ['testserver']
+    middleware = settings.API_MIDDLEWARE
+    handlers = {'with metrics': APIWSGIHandler()}
+    settings.API_MIDDLEWARE = [m for m in middleware if m != 'articles_app.middleware.MetricsMiddleware']
+    handlers['without metrics'] = APIWSGIHandler()
+    settings.API_MIDDLEWARE = middleware
+
+    with benchmark_database():
+        author = CustomUser.objects.create(email='author@bench.com', password='!', role=CustomUser.AUTHOR)
+        article = Article.objects.create(author=author, title='title', text='text')
+
+        def start_response(status, headers):
+            pass
+
+        factory = RequestFactory()
+        path = f'/articles/{article.pk}/'
+        calls = {
+            name: (lambda handler=handler: handler(factory.get(path).environ, start_response).close())
+            for name, handler in handlers.items()
+        }
+        results = {name: [] for name in handlers}
+        # Interleave rounds so drift affects both handlers alike.
+        for _ in range(10):
+            for name, call in calls.items():
+                results[name].append(measure(call, max(args.requests // 10, 1)))
+
+        for name in handlers:
+            results[name] = {
+                key: sorted(round_[key] for round_ in results[name])[len(results[name]) // 2]
+                for key in ('p50', 'p95', 'max')
+            }
+            report(f'{name:<16} GET {path}', results[name])
+
+        print(f"overhead per request: {results['with metrics']['p50'] - results['without metrics']['p50']:.3f} ms (p50)")
+
+    labels = (('route', 'articles/<int:pk>/'), ('method', 'GET'))
+    count = 100000
+    for name, func in (
+        ('registry inc', lambda: metrics.inc('http_requests_total', labels)),
+        ('registry observe', lambda: metrics.observe('http_request_duration_seconds', labels, 0.01)),
+    ):
+        print(f'{name:<20} {timeit.timeit(func, number=count) / count * 1e6:.2f} us per call')
+
+
+if __name__ == '__main__':
+    main()
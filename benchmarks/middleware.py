@@ -0,0 +1,51 @@
+"""
+Per-request overhead of the full middleware stack against API_MIDDLEWARE.
+
+    python benchmarks/middleware.py --requests 2000
+
+Calls both WSGI handlers directly with the same API requests against a
+throwaway test database, so the difference is the middleware cost.
+"""
+import argparse
+
+from utils import benchmark_database, measure, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import RequestFactory
+    from articles_app.models import Article, CustomUser
+    from liis_test_task.handlers import APIWSGIHandler
+
+    settings.ALLOWED_HOSTS = ['testserver']
+
+    with benchmark_database():
+        author = CustomUser.objects.create(email='author@bench.com', password='!', role=CustomUser.AUTHOR)
+        article = Article.objects.create(author=author, title='title', text='text')
+
+        def start_response(status, headers):
+            pass
+
+        factory = RequestFactory()
+        for path in (f'/articles/{article.pk}/', f'/users/{author.pk}/'):
+            results = {}
+            for name, handler in (('full', WSGIHandler()), ('api', APIWSGIHandler())):
+                def call():
+                    handler(factory.get(path).environ, start_response).close()
+
+                measure(call, 100)
+                results[name] = measure(call, args.requests)
+                report(f'{name:<5} GET {path}', results[name])
+
+            print(f"{'':<6}saved per request: {results['full']['p50'] - results['api']['p50']:.3f} ms (p50)")
+
+
+if __name__ == '__main__':
+    main()
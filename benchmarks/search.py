@@ -0,0 +1,80 @@
+"""
+Article search latency at scale.
+
+    python benchmarks/search.py --articles 1000000
+
+Seeds a throwaway test database with random articles, builds the search
+index and reports latency of ranked, paginated search queries.
+"""
+import argparse
+import random
+import time
+
+from utils import benchmark_database, measure, report, setup_django
+
+WORDS = (
+    'python django postgres index query cache worker article author feed '
+    'subscriber search vector rank latency partition shard replica batch '
+    'stream event queue metric profile compress throttle token bucket'
+).split()
+
+
+def random_text(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def seed(count, batch_size, rng):
+    from articles_app.models import Article, CustomUser
+
+    authors = CustomUser.objects.bulk_create([
+        CustomUser(email=f'author{i}@bench.com', password='!', role=CustomUser.AUTHOR)
+        for i in range(100)
+    ])
+    for offset in range(0, count, batch_size):
+        Article.objects.bulk_create([
+            Article(
+                author=rng.choice(authors),
+                title=random_text(rng, 6),
+                text=random_text(rng, 200),
+                public=rng.random() < 0.8
+            )
+            for _ in range(min(batch_size, count - offset))
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.management import call_command
+    from articles_app.models import Article
+    from articles_app.search import get_search_engine
+
+    rng = random.Random(0)
+    with benchmark_database():
+        start = time.perf_counter()
+        seed(args.articles, args.batch_size, rng)
+        call_command('rebuild_search_index', batch_size=args.batch_size)
+        print(f'Seeded and indexed {args.articles} articles in {time.perf_counter() - start:.1f} s')
+
+        engine = get_search_engine()
+        queryset = Article.objects.filter(public=True)
+        print(f'Engine: {type(engine).__name__}')
+        for query in ('python', 'postgres index', 'stream -queue', 'missingword'):
+            report(
+                f'search {query!r} first page',
+                measure(lambda: list(engine.search(queryset, query)[:20]), args.repeat)
+            )
+            report(
+                f'search {query!r} count',
+                measure(lambda: engine.search(queryset, query).count(), max(args.repeat // 5, 1))
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Cold start of a worker process: time until the WSGI application is built
+and until its first response, for each settings module.
+
+    python benchmarks/startup.py --runs 20
+    python benchmarks/startup.py --settings liis_test_task.api_settings --imports 25
+
+Every run is a fresh interpreter. The first request goes to /metrics, which
+resolves the URLconf and passes the middleware without touching the
+database. With --imports the slowest imports reported by
+python -X importtime are listed for the last settings module.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from utils import BASE_DIR
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+from liis_test_task.wsgi import application
+ready = time.perf_counter()
+from django.conf import settings
+settings.ALLOWED_HOSTS = ['*']
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/metrics', 'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80', 'wsgi.url_scheme': 'http', 'wsgi.input': sys.stdin.buffer,
+}
+statuses = []
+application(environ, lambda status, headers: statuses.append(status)).close()
+first = time.perf_counter()
+print(json.dumps({
+    'status': statuses[0], 'ready': (ready - start) * 1000, 'first': (first - start) * 1000,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def run(settings_module, *flags):
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': settings_module,
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'benchmark'),
+        'PYTHONPATH': str(BASE_DIR),
+    }
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *flags, '-c', CHILD], cwd=BASE_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    wall = (time.perf_counter() - start) * 1000
+    return {**json.loads(result.stdout.splitlines()[-1]), 'wall': wall}, result.stderr
+
+
+def slowest_imports(stderr, limit):
+    """
+    Imports by cumulative time from the python -X importtime output.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((int(cumulative) / 1000, depth, name.strip()))
+    return sorted(imports, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--settings', nargs='+', default=['liis_test_task.settings', 'liis_test_task.api_settings'])
+    parser.add_argument('--imports', type=int, default=0)
+    args = parser.parse_args()
+
+    for settings_module in args.settings:
+        # Warm the file system cache and bytecode.
+        run(settings_module)
+        runs = [run(settings_module)[0] for _ in range(args.runs)]
+        print(f"{settings_module} ({runs[0]['modules']} modules, first response {runs[0]['status']})")
+        for key, label in (('ready', 'application ready'), ('first', 'first response'), ('wall', 'process wall')):
+            timings = sorted(run[key] for run in runs)
+            print(f'  {label:<20} p50 {statistics.median(timings):8.1f} ms  min {timings[0]:8.1f} ms')
+
+    if args.imports:
+        _, stderr = run(args.settings[-1], '-X', 'importtime')
+        print(f'slowest imports of {args.settings[-1]} (cumulative):')
+        for cumulative, depth, name in slowest_imports(stderr, args.imports):
+            print(f"  {cumulative:8.1f} ms  {'  ' * depth}{name}")
+
+
+if __name__ == '__main__':
+    main()
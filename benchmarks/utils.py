@@ -0,0 +1,50 @@
+import contextlib
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'liis_test_task.settings')
+
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database():
+    """
+    Run the benchmark against a throwaway test database, never the configured one.
+    """
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        'p50': statistics.median(timings),
+        'p95': timings[max(int(len(timings) * 0.95) - 1, 0)],
+        'max': timings[-1],
+    }
+
+
+def report(name, result):
+    print(f"{name:<40} p50 {result['p50']:8.2f} ms  p95 {result['p95']:8.2f} ms  max {result['max']:8.2f} ms")
@@ -0,0 +1,44 @@
+"""
+Django settings for API-only worker processes.
+
+Select with DJANGO_SETTINGS_MODULE=liis_test_task.api_settings for workers
+behind a proxy that sends /admin/ to workers on the full settings. Leaves
+out the admin and the session, messages and static files apps it needs,
+so none of them is imported or checked at worker boot.
+"""
+
+from liis_test_task.settings import *  # noqa: F401,F403
+from liis_test_task.settings import API_MIDDLEWARE, INSTALLED_APPS, REST_FRAMEWORK, TEMPLATES
+
+ADMIN_APPS = [
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ADMIN_APPS]
+
+MIDDLEWARE = API_MIDDLEWARE
+
+FULL_MIDDLEWARE_PATHS = []
+
+ARTICLES_SHED_EXEMPT_PATHS = ['/metrics']
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    # The browsable API renders templates with the session based login.
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer'
+    ],
+}
+
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'OPTIONS': {
+        'context_processors': [
+            processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+            if processor != 'django.contrib.messages.context_processors.messages'
+        ],
+    },
+}]
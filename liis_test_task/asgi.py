@@ -9,8 +9,19 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from liis_test_task.handlers import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'liis_test_task.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from articles_app.streams import article_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Event streams are long lived, serve them without Django's request cycle.
+    if scope['type'] == 'http' and scope['path'] == settings.ARTICLES_STREAM_PATH:
+        await article_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,75 @@
+"""
+Request handlers that serve API routes through settings.API_MIDDLEWARE,
+while paths from settings.FULL_MIDDLEWARE_PATHS keep settings.MIDDLEWARE.
+The full handler is built on the first such request, workers that serve
+only the API never load its middleware.
+"""
+
+import django
+from django.conf import settings
+from django.utils.functional import cached_property
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+
+class APIMiddlewareMixin:
+    def load_middleware(self, is_async=False):
+        # The middleware chain is built once per handler at startup,
+        # BaseHandler only reads it from settings.MIDDLEWARE.
+        middleware = settings.MIDDLEWARE
+        settings.MIDDLEWARE = settings.API_MIDDLEWARE
+        try:
+            super().load_middleware(is_async)
+        finally:
+            settings.MIDDLEWARE = middleware
+
+
+class APIWSGIHandler(APIMiddlewareMixin, WSGIHandler):
+    pass
+
+
+class APIASGIHandler(APIMiddlewareMixin, ASGIHandler):
+    pass
+
+
+def uses_full_middleware(path):
+    return path.startswith(tuple(settings.FULL_MIDDLEWARE_PATHS))
+
+
+class WSGIDispatcher:
+    def __init__(self):
+        self.api_handler = APIWSGIHandler()
+
+    @cached_property
+    def full_handler(self):
+        return WSGIHandler()
+
+    def __call__(self, environ, start_response):
+        if uses_full_middleware(environ.get('PATH_INFO', '')):
+            return self.full_handler(environ, start_response)
+        return self.api_handler(environ, start_response)
+
+
+class ASGIDispatcher:
+    def __init__(self):
+        self.api_handler = APIASGIHandler()
+
+    @cached_property
+    def full_handler(self):
+        return ASGIHandler()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and not uses_full_middleware(scope['path']):
+            await self.api_handler(scope, receive, send)
+        else:
+            await self.full_handler(scope, receive, send)
+
+
+def get_wsgi_application():
+    django.setup(set_prefix=False)
+    return WSGIDispatcher()
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ASGIDispatcher()
@@ -10,15 +10,19 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
-from dotenv import load_dotenv
 import os
 
-load_dotenv()
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Deployments configure the environment directly and skip importing dotenv.
+if (BASE_DIR / '.env').exists():
+    from dotenv import load_dotenv
+
+    load_dotenv(BASE_DIR / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
@@ -48,6 +52,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'articles_app.middleware.MetricsMiddleware',
+    'articles_app.middleware.LoadSheddingMiddleware',
+    'articles_app.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,14 +62,34 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'articles_app.middleware.SlowQueryMiddleware',
+    'articles_app.middleware.ProfilingMiddleware',
+]
+
+# API requests are Basic authenticated JSON calls that need none of the
+# session, CSRF, messages or clickjacking middleware, see liis_test_task.handlers.
+
+API_MIDDLEWARE = [
+    'articles_app.middleware.MetricsMiddleware',
+    'articles_app.middleware.LoadSheddingMiddleware',
+    'articles_app.middleware.CompressionMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'articles_app.middleware.SlowQueryMiddleware',
+    'articles_app.middleware.ProfilingMiddleware',
 ]
 
+FULL_MIDDLEWARE_PATHS = ['/admin/']
+
 AUTH_USER_MODEL = 'articles_app.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication'
-    ]
+        'articles_app.throttling.ThrottledBasicAuthentication'
+    ],
+    # Proxies in front of the workers, the client address is read from
+    # X-Forwarded-For only behind them, otherwise a client could pick its own.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
 }
 
 ROOT_URLCONF = 'liis_test_task.urls'
@@ -101,6 +128,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# The default local memory cache is per process, use a shared backend such as
+# django.core.cache.backends.redis.RedisCache with several worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -123,6 +163,29 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/4.1/topics/auth/passwords/
+# The first hasher is used for new passwords, hashes made by the others or
+# with other work factors are upgraded on the next successful login.
+
+PASSWORD_HASHERS = [
+    hasher for hasher in os.getenv('PASSWORD_HASHERS', '').split(',') if hasher
+] or [
+    *(['articles_app.hashers.Argon2PasswordHasher'] if find_spec('argon2') else []),
+    'articles_app.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 390000))
+
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', 2))
+
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', 19456))
+
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', 1))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -144,3 +207,233 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Article search
+# Dotted path to the search engine, chosen by database vendor when empty.
+
+ARTICLES_SEARCH_ENGINE = os.getenv('ARTICLES_SEARCH_ENGINE') or None
+
+ARTICLES_SEARCH_CONFIG = os.getenv('ARTICLES_SEARCH_CONFIG', 'english')
+
+
+# Article event stream
+# Served by liis_test_task.asgi, the broker can be swapped for a shared one.
+
+ARTICLES_EVENT_BROKER = os.getenv('ARTICLES_EVENT_BROKER', 'articles_app.events.InProcessBroker')
+
+ARTICLES_STREAM_PATH = '/articles/stream/'
+
+ARTICLES_STREAM_QUEUE_SIZE = int(os.getenv('ARTICLES_STREAM_QUEUE_SIZE', 100))
+
+ARTICLES_STREAM_MAX_CONNECTIONS = int(os.getenv('ARTICLES_STREAM_MAX_CONNECTIONS', 10000))
+
+ARTICLES_STREAM_HEARTBEAT = 15
+
+
+# Background jobs
+# Run with `python manage.py run_worker`, eager mode runs jobs inline.
+
+ARTICLES_JOBS_EAGER = os.getenv('ARTICLES_JOBS_EAGER') == '1'
+
+ARTICLES_JOBS_MAX_ATTEMPTS = 5
+
+ARTICLES_JOBS_RETRY_DELAY = 10
+
+ARTICLES_JOBS_TIMEOUT = 600
+
+# Running jobs renew their lease this often, well within the timeout.
+ARTICLES_JOBS_HEARTBEAT = 60
+
+# Done jobs are purged by run_worker after this many days.
+ARTICLES_JOBS_RETENTION_DAYS = int(os.getenv('ARTICLES_JOBS_RETENTION_DAYS', 7))
+
+
+# Article views
+# Views are counted in memory and flushed by a background job at most this
+# many seconds after they were counted, a killed worker loses the views of
+# the last interval at most.
+
+ARTICLES_VIEWS_FLUSH_INTERVAL = int(os.getenv('ARTICLES_VIEWS_FLUSH_INTERVAL', 10))
+
+ARTICLES_POPULAR_SIZE = 100
+
+
+# Admin
+# Unfiltered changelists of larger tables show the planner row estimate.
+
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+# Article partitioning
+# Partition the article table by month of created_at on migrate, PostgreSQL
+# only, see `python manage.py manage_article_partitions`.
+
+ARTICLES_PARTITION_BY_CREATED_AT = os.getenv('ARTICLES_PARTITION_BY_CREATED_AT') == '1'
+
+
+# User deletion
+# In batched mode DELETE users/<pk>/ deactivates the user and removes their
+# data in a background job, progress is polled at users/<pk>/deletion/.
+
+ARTICLES_USER_DELETION_MODE = os.getenv('ARTICLES_USER_DELETION_MODE', 'immediate')
+
+ARTICLES_DELETION_BATCH_SIZE = 1000
+
+
+# Author statistics
+
+ARTICLES_STATS_MAX_DAYS = 365
+
+
+# Request profiler
+# Triggered by an X-Profile header holding the token, or by a profile query
+# parameter from a staff admin session, browse profiles with
+# `python manage.py profiles`.
+
+ARTICLES_PROFILER_ENABLED = os.getenv('ARTICLES_PROFILER_ENABLED', '1') == '1'
+
+# Without a token only staff sessions can profile.
+ARTICLES_PROFILER_TOKEN = os.getenv('ARTICLES_PROFILER_TOKEN')
+
+ARTICLES_PROFILER_DIR = os.getenv('ARTICLES_PROFILER_DIR', BASE_DIR / 'profiles')
+
+ARTICLES_PROFILER_MAX_PROFILES = 100
+
+
+# Slow query log
+# Queries slower than the threshold in milliseconds are logged and aggregated
+# by fingerprint, a sample of slow reads is explained on PostgreSQL.
+
+ARTICLES_SLOW_QUERY_THRESHOLD = float(os.getenv('ARTICLES_SLOW_QUERY_THRESHOLD', 100))
+
+ARTICLES_SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('ARTICLES_SLOW_QUERY_EXPLAIN_RATE', 0))
+
+ARTICLES_SLOW_QUERY_REPORT_INTERVAL = 300
+
+
+# Metrics
+# Exposed at /metrics, processes of a multi-process deployment share
+# snapshots through ARTICLES_METRICS_DIR, which must be emptied on deploy.
+
+ARTICLES_METRICS_DIR = os.getenv('ARTICLES_METRICS_DIR')
+
+ARTICLES_METRICS_WRITE_INTERVAL = 5
+
+ARTICLES_METRICS_TOKEN = os.getenv('ARTICLES_METRICS_TOKEN')
+
+
+# Article cache
+# Seconds a cached article or subscription list is fresh, and how long after
+# that it is still served while a single request refreshes it.
+
+ARTICLES_CACHE_TTL = int(os.getenv('ARTICLES_CACHE_TTL', 60))
+
+ARTICLES_CACHE_STALE_TTL = int(os.getenv('ARTICLES_CACHE_STALE_TTL', 300))
+
+# Invalidation cannot reach the memory of other processes, with the local
+# memory cache articles and subscriptions are only cached when this is set
+# for a deployment of a single worker process.
+ARTICLES_CACHE_ALLOW_LOCAL = os.getenv('ARTICLES_CACHE_ALLOW_LOCAL') == '1'
+
+# Also coalesce misses of other worker processes through a lock in the
+# shared cache, useful only with a shared cache backend.
+ARTICLES_CACHE_SHARED_LOCK = os.getenv('ARTICLES_CACHE_SHARED_LOCK') == '1'
+
+ARTICLES_CACHE_LOCK_TIMEOUT = 5
+
+
+# Batch retrieval
+# Most ids accepted by ?ids= on the users and articles lists.
+
+ARTICLES_BATCH_MAX_IDS = 100
+
+
+# Throttling
+# Token bucket per user or anonymous address: burst size, refill in tokens
+# per second and the cost of expensive actions, other actions cost 1 token.
+# Batch retrievals cost their action's cost per id and failed logins take
+# "login.failure" from a separate bucket of the client address.
+# With ARTICLES_THROTTLE_SHARED the buckets are kept in the shared cache.
+
+ARTICLES_THROTTLE_ENABLED = os.getenv('ARTICLES_THROTTLE_ENABLED', '1') == '1'
+
+ARTICLES_THROTTLE_BURST = float(os.getenv('ARTICLES_THROTTLE_BURST', 200))
+
+ARTICLES_THROTTLE_RATE = float(os.getenv('ARTICLES_THROTTLE_RATE', 20))
+
+ARTICLES_THROTTLE_COSTS = {
+    'users.create': 50,
+    'articles.list': 20,
+    'articles.search': 5,
+    'login.failure': 40,
+}
+
+ARTICLES_THROTTLE_SHARED = os.getenv('ARTICLES_THROTTLE_SHARED') == '1'
+
+
+# Load shedding
+# Milliseconds a request may wait in front of the worker, read from the
+# X-Request-Start header of the proxy, and average database query latency
+# above which requests are shed, 0 disables either check.
+
+ARTICLES_SHED_QUEUE_TIME = float(os.getenv('ARTICLES_SHED_QUEUE_TIME', 2000))
+
+ARTICLES_SHED_DB_LATENCY = float(os.getenv('ARTICLES_SHED_DB_LATENCY', 200))
+
+ARTICLES_SHED_RETRY_AFTER = 5
+
+ARTICLES_SHED_EXEMPT_PATHS = ['/metrics', '/admin/']
+
+
+# Article sharding
+# Database aliases that hold articles and subscriptions by author id, each
+# configured by <ALIAS>_DATABASE_NAME and <ALIAS>_DATABASE_HOST on the
+# credentials of the default database. Empty keeps everything in default.
+
+ARTICLES_SHARDS = [alias for alias in os.getenv('ARTICLES_SHARDS', '').split(',') if alias]
+
+for alias in ARTICLES_SHARDS:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.getenv(f'{alias.upper()}_DATABASE_NAME', f"{DATABASES['default']['NAME']}_{alias}"),
+        'HOST': os.getenv(f'{alias.upper()}_DATABASE_HOST', DATABASES['default']['HOST']),
+    }
+
+DATABASE_ROUTERS = ['articles_app.sharding.ShardRouter']
+
+# Threads querying shards concurrently.
+ARTICLES_SHARD_WORKERS = int(os.getenv('ARTICLES_SHARD_WORKERS', 8))
+
+
+# Author recommendations
+# Authors listed at users/<pk>/recommendations/, and subscribers whose
+# subscriptions are read at once by `python manage.py rebuild_recommendations`.
+
+ARTICLES_RECOMMENDATIONS_SIZE = 10
+
+ARTICLES_RECOMMENDATIONS_CHUNK_SIZE = 1000
+
+
+# Article text compression
+# Store article texts of at least ARTICLES_COMPRESS_MIN_LENGTH bytes zlib
+# compressed, convert existing rows with `python manage.py repack_article_texts`.
+
+ARTICLES_COMPRESS_TEXT = os.getenv('ARTICLES_COMPRESS_TEXT') == '1'
+
+ARTICLES_COMPRESS_MIN_LENGTH = int(os.getenv('ARTICLES_COMPRESS_MIN_LENGTH', 2048))
+
+ARTICLES_COMPRESS_LEVEL = 6
+
+
+# Response compression
+# Encodings in order of preference, br and zstd need the brotli and
+# zstandard packages. Smaller bodies are sent uncompressed.
+
+ARTICLES_COMPRESSION_ENCODINGS = [
+    encoding for encoding in os.getenv('ARTICLES_COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',') if encoding
+]
+
+ARTICLES_COMPRESSION_MIN_LENGTH = int(os.getenv('ARTICLES_COMPRESSION_MIN_LENGTH', 1024))
+
+ARTICLES_COMPRESSION_CONTENT_TYPES = ['application/json', 'text/plain']
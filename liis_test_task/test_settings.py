@@ -0,0 +1,58 @@
+"""
+Django settings for running the test suite.
+
+Selected by manage.py for the test command. Set TEST_DATABASE=sqlite to run
+without a PostgreSQL server, PostgreSQL specific indexes and search are then
+replaced by their portable fallbacks.
+"""
+
+from liis_test_task.settings import *  # noqa: F401,F403
+from liis_test_task.settings import BASE_DIR, DATABASES, SECRET_KEY
+import atexit
+import os
+import shutil
+import tempfile
+
+SECRET_KEY = SECRET_KEY or 'test-secret-key'
+
+if os.getenv('TEST_DATABASE') == 'sqlite':
+    # Files, not the default in-memory database, so that requests on several
+    # threads wait for each other's locks. A directory of their own per run,
+    # files left by an interrupted run would make the runner prompt.
+    TEST_DATABASE_DIR = tempfile.mkdtemp(prefix='liis_test_task_')
+    atexit.register(shutil.rmtree, TEST_DATABASE_DIR, ignore_errors=True)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'test.sqlite3',
+            'TEST': {'NAME': os.path.join(TEST_DATABASE_DIR, 'test.sqlite3')},
+        }
+    }
+
+# Shards for the sharding tests, only created when those tests run.
+for alias in ('shard_0', 'shard_1'):
+    test_name = DATABASES['default'].get('TEST', {}).get('NAME')
+    DATABASES.setdefault(alias, {
+        **DATABASES['default'],
+        'NAME': f"{DATABASES['default']['NAME']}_{alias}",
+        'TEST': {'NAME': f'{test_name}_{alias}'} if test_name else {},
+    })
+
+# Production work factors dominate the suite, tests needing them opt in.
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# The suite runs in one process.
+ARTICLES_CACHE_ALLOW_LOCAL = True
+
+# Keep worker snapshots of a local deployment out of test scrapes.
+ARTICLES_METRICS_DIR = None
+
+# The suite sends requests far faster than any client, tests of throttling
+# enable it themselves.
+ARTICLES_THROTTLE_ENABLED = False
@@ -1,8 +1,13 @@
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
 
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('', include('articles_app.urls', namespace='articles_app')),
 ]
+
+# API-only workers, see liis_test_task.api_settings, run without the admin.
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))